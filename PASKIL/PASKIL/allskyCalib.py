@@ -69,6 +69,7 @@ from . import stats
 from . import misc  # imports from PASKIL
 import datetime
 import calendar  # imports from other python modules
+import numpy
 from pylab import figure, title, xlabel, ylabel, plot
 # Functions
 
@@ -135,43 +136,36 @@ def fromImages(dataset):
     Returns a calibration object created by finding the median intensities at different angles from vertical
     of a set of "flat field images" stored in the specified dataset object. These are images in which the
     sky is approximately evenly lit. These images should be chosen by looking for time periods with a low 
-    variance using the variance class. For each image in the dataset, this function takes slices through 
-    the center of the image between 0-359 degrees from North at 1 degree resolution. It then records the 
-    values of the intensities at angles 0-90 from the center. When this has been done for all images the 
-    median values of intensity for each angle from the centre are calculated. These are then normalised.
+    variance using the variance class. For each image in the dataset, this function records the values of
+    the intensities of all the pixels at angles 0-90 from the center (to the nearest degree). When this has 
+    been done for all images the mean values of intensity for each angle from the centre are calculated. 
+    These are then normalised.
     """
 
-# Using the images in the time period found using the above functions, this function takes slices through the
-# centre of the image at 1 degree resolution. It then records the values of the intensities at angles 0-fov_angle from
-# the centre. When this has been done for all images the median values of intensity for each angle from the centre are
-# calculated. These are then normalised.
-    _sum = [0] * 91
-    count = [0] * 91
-    results = []
+# For each image, the pixels within 90 degrees of the zenith are binned by their angle from the zenith (to the
+# nearest degree) using the zenith angle map of the image geometry, and the intensities in each bin are summed. When
+# this has been done for all images the mean values of intensity for each angle from the centre are calculated.
+# These are then normalised.
+    _sum = numpy.zeros(91)
+    count = numpy.zeros(91)
 
-    for image in dataset:
+    for image in dataset.iter():
 
         # Apply binary mask to all images at 90 degree field of view
         image = image.binaryMask(90)
 
         image = image.centerImage()
 
-        x_center = image.getInfo()['camera']['x_center']
+        angles = image.getGeometry().getZenithAngles()
+        in_range = angles < 90.5  # (false for NaN angles)
+        angles_from_zenith = (angles[in_range] + 0.5).astype(int)
 
-        for angle in range(180):
-            # take a vertical slice of the image 1 pixel wide
-            strip = image.getStrip(angle, 1)[0]
-
-            for y in range(len(strip)):
-                angle_from_zenith = int(image.xy2angle(x_center, y) + 0.5)
-                _sum[angle_from_zenith] += strip[y]
-                count[angle_from_zenith] += 1
+        pixels = image.getArray()[:, :, 0][in_range].astype(float)
+        _sum += numpy.bincount(angles_from_zenith, weights=pixels, minlength=91)
+        count += numpy.bincount(angles_from_zenith, minlength=91)
 
     # find mean values of calibration factors at different angles
-    for angle in range(91):
-        ff_factor = (_sum[angle] / float(count[angle])) / \
-            (_sum[0] / float(count[0]))
-        results.append(ff_factor)
+    results = ((_sum / count) / (_sum[0] / count[0])).tolist()
 
     return calibration(results)  # return calibration object
 
@@ -337,6 +337,26 @@ class basicColourTable:
     def __init__(self, colour_table):
         self.colour_table = colour_table
 
+        # numpy version of the colour table, see getLookupTable()
+        self.__lookup_table = None
+        self.__lookup_table_source = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # the lookup table can be large, and is quick to recreate
+        state['_basicColourTable__lookup_table'] = None
+        state['_basicColourTable__lookup_table_source'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        if '_basicColourTable__lookup_table' not in state:
+            self.__lookup_table = None
+            self.__lookup_table_source = None
+
     def __eq__(self, x):
         if not isinstance(x, basicColourTable):
             return NotImplemented
@@ -368,6 +388,27 @@ class basicColourTable:
 
         #######################################################################
 
+    def getLookupTable(self):
+        """
+        Returns the colour table data as a read-only (N, 3) numpy array of uint8, where N is the number
+        of entries in the colour table. Indexing the array with an array of pixel values gives an array
+        of their RGB values. The array is only created the first time it is needed (or if colour_table
+        has been set to a different list since then). Changes made to the colour_table list in place are
+        not picked up.
+        """
+        # compare by identity, comparing the lists themselves would cost as
+        # much as recreating the array
+        if (self.__lookup_table is None or
+                self.__lookup_table_source is not self.colour_table):
+            lookup_table = numpy.array(self.colour_table, dtype=numpy.uint8).reshape((-1, 3))
+            lookup_table.flags.writeable = False
+            self.__lookup_table_source = self.colour_table
+            self.__lookup_table = lookup_table
+
+        return self.__lookup_table
+
+        #######################################################################
+
     def saveColourTable(self, filename):
         """
         Saves a quicklook image of the colour_table. The file type should be specified in the filename 
@@ -26,8 +26,11 @@ Introduction:
 Concepts:
     
     The allskyData module contains a dataset class. This is essentially five 
-    ordered lists. One of filenames, one of times, one of filenames for site
-    information files, one of radii and one of fields of view. A dataset object
+    ordered columns. One of filenames, one of times, one of filenames for site
+    information files, one of radii and one of fields of view. These are stored
+    as read-only numpy arrays (with each different site information filename 
+    only stored once), so that even datasets of millions of images are compact
+    and can be searched and split quickly. A dataset object
     is created by indexing the images in a directory structure. A dataset can 
     only contain images of the same Wavelength and mode (see PIL handbook for 
     description of mode). However, datasets containing different image file 
@@ -46,7 +49,14 @@ Concepts:
     allows the same dataset to be loaded rapidly in the future. However, no 
     checks are made to ensure that the dataset object still matches the actual 
     data (although if image files contained in the dataset are deleted or 
-    renamed, then an exception will be raised when the dataset is reloaded).
+    renamed, then an exception will be raised when the dataset tries to open
+    them, or when it is reloaded if full validation is requested, see load()).
+
+    Creating a dataset requires the header of every image to be read. To avoid
+    doing this again each time the same archive is indexed, a headerCatalog 
+    can be used (see the catalog option of new() and fromList()). This is an 
+    SQLite file which stores the header fields needed by the dataset for each 
+    image, so that only new or modified images have to be opened.
     
     The images in a dataset can be iterated over using standard Python syntax
     (see example below).
@@ -90,14 +100,36 @@ Example:
 
 ###############################################################################
 
-import glob
+import ast
+import collections
+import copy
 import datetime
+import hashlib
+import itertools
+import multiprocessing
 import pickle
 import os
 import os.path
+import sqlite3
 import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
-from PASKIL import allskyImage, allskyColour, misc
+import numpy
+
+from PASKIL import allskyImage, allskyImagePlugins, allskyColour, misc
+
+# version number of the npz dataset file format written by dataset.save()
+DATASET_FILE_VERSION = 1
+
+# number of files dealt with at a time when reading image headers
+CLASSIFY_CHUNK_SIZE = 1000
+
+# margin (in seconds) used by dataset.refresh() when comparing file
+# modification times to the time of the last scan, to allow for filesystems
+# which only store modification times to the nearest second or two
+MTIME_MARGIN = 2.0
 
 # Functions:
 
@@ -130,37 +162,112 @@ def combine(datasets):
 
             raise ValueError("Incompatible datasets")
 
-    # create tuple list from dataset data
-    tuple_list = []
+    # join the data columns of the datasets together
     filetypes = []
+    site_info_names = []
+    columns = []
 
     for d in datasets:
         filetypes += d.getFiletypes()
 
-        tuple_list += list(zip(d.getTimes(), d.getFilenames(),
-                               d.getSite_info_files(), d._getRadiiList(),
-                               d._getFov_anglesList()))
-
-    # sort the list into chronological order and remove duplicate entries
-    tuple_list = list(set(tuple_list))
-    tuple_list.sort(misc.tupleCompare)
+        times, filenames, names, indices, radii, fov_angles = d._getColumns()
+
+        # site info indices need to refer to the combined list of names
+        columns.append((times, filenames, indices + len(site_info_names),
+                        radii, fov_angles))
+        site_info_names += list(names)
+
+    times, filenames, indices, radii, fov_angles = [
+        numpy.concatenate(c) for c in zip(*columns)]
+    site_info_names, name_indices = _internSiteInfoFiles(site_info_names)
+    indices = name_indices[indices]
+
+    # sort into chronological order
+    order = numpy.argsort(times, kind="mergesort")
+    times = times[order]
+    filenames = filenames[order]
+    indices = indices[order]
+    radii = radii[order]
+    fov_angles = fov_angles[order]
+
+    # remove duplicate entries, these will be next to each other since
+    # entries with the same time must be the same
+    duplicate = ((times[1:] == times[:-1]) &
+                 (filenames[1:] == filenames[:-1]) &
+                 (indices[1:] == indices[:-1]) &
+                 (radii[1:] == radii[:-1]) &
+                 (fov_angles[1:] == fov_angles[:-1]))
+    keep = numpy.concatenate(([True], ~duplicate))
 
     # remove duplicate entries from filetypes list
     filetypes = list(set(filetypes))
 
-    return dataset(tuple_list, wavelength, filetypes, mode, colour_table,
-                   calib_factor, lens_proj)
+    new_dataset = _fromColumns((times[keep], filenames[keep], site_info_names,
+                                indices[keep], radii[keep], fov_angles[keep]),
+                               wavelength, filetypes, mode, colour_table,
+                               calib_factor, lens_proj)
+
+    if len(new_dataset.getTimesArray()) != len(
+            numpy.unique(new_dataset.getTimesArray())):
+        raise ValueError("Datasets cannot contain different images with "
+                         "the same capture time")
+
+    return new_dataset
 
 ###############################################################################
 
 
-def fromList(file_names, wavelength, filetype, site_info_file=None):
+def _fromColumns(columns, wavelength, filetypes, mode, colour_table,
+                 calib_factor, lens_projection):
+    """
+    Returns a dataset object containing the data in columns, which should be a
+    tuple of chronologically ordered arrays as returned by 
+    dataset._getColumns().
+    """
+    # create an empty dataset and then put the data into it
+    new_dataset = dataset([], wavelength, filetypes, mode, colour_table,
+                          calib_factor, lens_projection)
+    new_dataset._setColumns(*columns)
+
+    return new_dataset
+
+
+###############################################################################
+
+def _internSiteInfoFiles(site_info_files):
+    """
+    Returns a tuple (site_info_names, site_info_indices) where 
+    site_info_names is a tuple of the different filenames (or None) in the 
+    site_info_files list and site_info_indices is a numpy array of indices into
+    site_info_names, one for each entry in the list. This means that each site
+    info filename is only stored once in a dataset.
+    """
+    names = {}
+    indices = numpy.empty(len(site_info_files), dtype=numpy.int32)
+
+    for i, name in enumerate(site_info_files):
+        try:
+            indices[i] = names[name]
+        except KeyError:
+            indices[i] = names[name] = len(names)
+
+    site_info_names = [None] * len(names)
+    for name, index in names.items():
+        site_info_names[index] = name
+
+    return tuple(site_info_names), indices
+
+###############################################################################
+
+
+def fromList(file_names, wavelength, filetype, site_info_file=None,
+             catalog=None, workers=None):
     """
     Creates a dataset from a list of filenames. The file_names argument should 
-    be a list of strings specifying the filenames of the files to be included. 
-    The wavelength argument should be a string that matches the value of the 
-    'Wavelength' field in the image metadata see allskyImagePlugins module for 
-    details. The site_info_file option should be the filename of the site 
+    be a list (or other iterable) of strings specifying the filenames of the 
+    files to be included. The wavelength argument should be a string that 
+    matches the value of the 'Wavelength' field in the image metadata see 
+    allskyImagePlugins module for details. The site_info_file option should be the filename of the site 
     information file (if one is required). The filetype argument is a list of 
     filetypes (e.g. ["png","jpg"]), so a dataset spanning many filetypes can be 
     prodcued using this function (if only a single filetype is desired then it 
@@ -170,81 +277,129 @@ def fromList(file_names, wavelength, filetype, site_info_file=None):
     supplied which do not conform to the dataset's parameters will be ignored. 
     If no images are found that can be added to the dataset then ValueError is
     raised.
-    """
-    data = []
-    mode = None
-    found_wavelengths = set([])  # set of wavelengths found during the search
 
+    The catalog option can be used to avoid re-reading images which have been
+    seen before. It should be either a headerCatalog object or the filename of
+    a catalog file (which will be created if it does not exist). Only images 
+    which are not in the catalog, or which have been modified since they were
+    catalogued, are opened. The default is None, no catalog.
+
+    The workers option allows the images to be read by a pool of worker 
+    processes rather than one after another, which can significantly speed up 
+    creating datasets from large numbers of images. It should be the number of 
+    processes to use, or "AUTO" to use one per CPU. The default is None, which 
+    reads the images in the current process. Note that any plugins used must be
+    importable by the worker processes. The resulting dataset does not depend 
+    on the number of workers used.
+    """
     # check that filetypes argument is a list - this is a common user error!
     if type(filetype) is not list:
         raise TypeError("Filetype argument should be a list.")
 
-    for filename in file_names:
-        # check if file is of correct type
-        if not filename.endswith(tuple(filetype)):
-            continue  # if not then skip it
+    data, properties, found_wavelengths = _classifyFiles(
+        file_names, wavelength, filetype, site_info_file, catalog, workers,
+        None, "allskyData.fromList()")
 
-        # attempt to create an allskyImage object, if there is no plugin for it,
-        # then skip this file
-        try:
-            current_image = allskyImage.new(filename, site_info_file)
+    # check to make sure the dataset is not empty
+    if len(data) == 0:
+        raise ValueError("No images were compatible with the dataset format,"
+                         " ensure you have imported the required plugins,that the wavelength "
+                         "string matches that in the image header, and that you have specified "
+                         "any relevant site info files. Images with the following wavelengths "
+                         "were found " + str(found_wavelengths))
+
+    # sort the list into chronological order
+    if sys.version_info[0] > 2:
+        data.sort()
+    else:
+        data.sort(misc.tupleCompare)
 
-        except TypeError:
-            continue  # skip file if PASKIL cannot open it
-        except IOError:
-            continue  # skip file if PIL cannot decode the image
+    mode, colour_table, calib_factor, lens_projection = properties
 
-        # get the image info
-        info = current_image.getInfo()
+    # return a dataset object
+    return dataset(data, wavelength, filetype, mode, colour_table,
+                   calib_factor, lens_projection)
+
+
+###############################################################################
+
+def _classifyFiles(file_names, wavelength, filetype, site_info_file, catalog,
+                   workers, properties, caller):
+    """
+    Reads the headers of the files (see fromList for details of the arguments)
+    and returns a tuple (data, properties, found_wavelengths). The data list 
+    contains a (time, filename, site_info_file, radius, fov_angle) tuple for 
+    each of the files that can be put into a dataset with the specified 
+    wavelength and properties. The properties argument should be a tuple 
+    (mode, colour_table, calib_factor, lens_projection) of the dataset, or 
+    None, in which case they are defined by the first compatible file (and 
+    returned, or None if there were no compatible files). found_wavelengths is
+    a set of the other wavelengths that were found. The caller argument is the
+    name of the calling function used in warning messages.
+    """
+    data = []
+    found_wavelengths = set([])  # set of wavelengths found during the search
+
+    if properties is None:
+        mode = None
+    else:
+        mode, colour_table, calib_factor, lens_projection = properties
+
+    # open the catalog if we have been given a filename
+    close_catalog = False
+    if catalog is not None and not isinstance(catalog, headerCatalog):
+        catalog = headerCatalog(catalog)
+        close_catalog = True
+
+    # only consider files of the correct type
+    file_names = (f for f in file_names if f.endswith(tuple(filetype)))
+
+    # check the images in the order they were given, so that the first
+    # compatible image defines the mode, colour table etc. of the dataset
+    for filename, record in _iterRecords(file_names, site_info_file, catalog,
+                                         workers):
+
+        # skip file if PASKIL cannot open it
+        if record is None:
+            continue
+
+        (time_str, current_image_wavelength, current_mode,
+         current_colour_table, current_calib_factor,
+         current_lens_projection, radius, fov_angle) = record
 
         # check if the image has the correct wavelength
-        current_image_wavelength = info['header']['Wavelength']
         if current_image_wavelength.find(wavelength) == -1:
             found_wavelengths.add(current_image_wavelength)
             continue  # if image has wrong wavelength then skip it
 
         # check the image has the correct mode, calib factor and colour table
-        try:
-            current_colour_table = info['processing']['applyColourTable']
-        except KeyError:
-            current_colour_table = None
-
-        try:
-            current_calib_factor = info['processing']['absoluteCalibration']
-        except KeyError:
-            current_calib_factor = None
-
-        current_lens_projection = info['camera']['lens_projection']
-
         if mode == None:
-            mode = current_image.getMode()
+            mode = current_mode
             colour_table = current_colour_table
             calib_factor = current_calib_factor
             lens_projection = current_lens_projection
 
-        if current_image.getMode() != mode:
-            print(("Warning! allskyData.fromList(): Skipping file " + filename +
+        if current_mode != mode:
+            print(("Warning! " + caller + ": Skipping file " + filename +
                    ". Incorrect image mode."))
             continue
 
         if current_colour_table != colour_table:
-            print(("Warning! allskyData.fromList(): Skipping file " + filename +
+            print(("Warning! " + caller + ": Skipping file " + filename +
                    ". Incorrect colour table."))
             continue
 
         if current_calib_factor != calib_factor:
-            print(("Warning! allskyData.fromList(): Skipping file " + filename +
+            print(("Warning! " + caller + ": Skipping file " + filename +
                    ". Incorrect absolute calibration factor."))
             continue
 
         if current_lens_projection != lens_projection:
-            print(("Warning! allskyData.fromList(): Skipping file " + filename +
+            print(("Warning! " + caller + ": Skipping file " + filename +
                    ". Incorrect lens projection."))
             continue
-        # read creation time from header
-        time_str = info['header']['Creation Time']
 
-        # convert to datetime object
+        # convert creation time to datetime object
         try:
             time = datetime.datetime.strptime(time_str,
                                               "%d %b %Y %H:%M:%S %Z")
@@ -253,46 +408,150 @@ def fromList(file_names, wavelength, filetype, site_info_file=None):
                                               "%d %b %Y %H:%M:%S %Z")
 
         # store data associated with this image in the data list as a tuple
-        data.append((time, filename, site_info_file,
-                     float(info['camera']['Radius']),
-                     float(info['camera']['fov_angle'])))
+        data.append((time, filename, site_info_file, float(radius),
+                     float(fov_angle)))
 
-    # check to make sure the dataset is not empty
-    if len(data) == 0:
-        raise ValueError("No images were compatible with the dataset format,"
-                         " ensure you have imported the required plugins,that the wavelength "
-                         "string matches that in the image header, and that you have specified "
-                         "any relevant site info files. Images with the following wavelengths "
-                         "were found " + str(found_wavelengths))
+    if catalog is not None:
+        catalog.commit()
+        if close_catalog:
+            catalog.close()
 
-    # sort the list into chronological order
-    if sys.version_info[0] > 2:
-        data.sort()
-    else:
-        data.sort(misc.tupleCompare)
+    if mode is not None:
+        properties = (mode, colour_table, calib_factor, lens_projection)
 
-    # return a dataset object
-    return dataset(data, wavelength, filetype, mode, colour_table,
-                   calib_factor, lens_projection)
+    return data, properties, found_wavelengths
+
+
+###############################################################################
+
+
+def _iterRecords(file_names, site_info_file, catalog, workers):
+    """
+    Generator function which yields a (filename, record) tuple for each of the
+    files in file_names (which may be an iterator), in the same order, where 
+    record is as returned by _readRecord. Records are read from the catalog 
+    where possible, and new records are stored in it. The files are dealt with 
+    in chunks, so that if worker processes are being used (see fromList) the 
+    files in one chunk are read while the next chunk is being found.
+    """
+    if workers == "AUTO":
+        workers = multiprocessing.cpu_count()
+
+    processing_pool = None
+    pending = None  # chunk currently being read by the workers
+    file_names = iter(file_names)
+    finished = False
+
+    try:
+        while True:
+            chunk = list(itertools.islice(file_names, CLASSIFY_CHUNK_SIZE))
+
+            # read the header fields of the images, from the catalog if
+            # possible
+            records = {}
+            unread_files = []
+            for filename in chunk:
+                try:
+                    if catalog is None:
+                        raise KeyError
+                    records[filename] = catalog.lookup(filename,
+                                                       site_info_file)
+                except KeyError:
+                    unread_files.append(filename)
+
+            arg_tuples = [(f, site_info_file) for f in unread_files]
+
+            if workers is None or workers < 2 or len(arg_tuples) < 2:
+                new_records = [_readRecordWrapper(x) for x in arg_tuples]
+            else:
+                if processing_pool is None:
+                    processing_pool = multiprocessing.Pool(
+                        processes=min(workers, len(arg_tuples)))
+
+                # map returns the records in the same order as the files
+                new_records = processing_pool.map_async(_readRecordWrapper,
+                                                        arg_tuples)
+
+            # deal with the previous chunk while this one is being read
+            if pending is not None:
+                for item in _finishChunk(pending, site_info_file, catalog):
+                    yield item
+
+            pending = (chunk, records, unread_files, new_records)
+
+            if len(chunk) < CLASSIFY_CHUNK_SIZE:
+                break
+
+        for item in _finishChunk(pending, site_info_file, catalog):
+            yield item
 
+        finished = True
+
+    finally:
+        if processing_pool is not None:
+            if finished:
+                processing_pool.close()
+                processing_pool.join()
+            else:
+                # if anything goes wrong (or the caller stops iterating
+                # before the end), kill the child processes
+                processing_pool.terminate()
 
 ###############################################################################
 
-def load(filename):
+
+def _finishChunk(pending, site_info_file, catalog):
+    """
+    Returns a list of (filename, record) tuples for a chunk of files being 
+    dealt with by _iterRecords, waiting for the worker processes to finish 
+    reading them if necessary.
+    """
+    chunk, records, unread_files, new_records = pending
+
+    if not isinstance(new_records, list):
+        new_records = new_records.get()
+
+    for filename, record in zip(unread_files, new_records):
+        records[filename] = record
+        if catalog is not None:
+            catalog.store(filename, site_info_file, record)
+
+    return [(filename, records[filename]) for filename in chunk]
+
+###############################################################################
+
+def load(filename, validate="lazy"):
     """
     Loads a dataset object from a file. Dataset files can be produced using the
-    save() method. Note that no checks are made to ensure that the images in 
-    the loaded dataset still have the same properties that they had when 
-    the dataset was first created. If the images have been modified in some way
-    then this might lead to unexpected behavior.
+    save() method, both the npz and the (older) pickle formats can be loaded.
+    Note that no checks are made to ensure that the images in the loaded 
+    dataset still have the same properties that they had when the dataset was
+    first created. If the images have been modified in some way then this 
+    might lead to unexpected behavior.
+
+    The validate option controls checking that the image files in the dataset
+    still exist. It can be "full", all the files are checked when the dataset
+    is loaded, "lazy" (the default), each file is checked when the dataset 
+    opens it, or "none", no checks are made. In both "full" and "lazy" modes,
+    IOError is raised if a file no longer exists. For large datasets stored on
+    slow filesystems, "full" validation can take a long time.
     """
     with open(filename, "rb") as f:
-        dataset = pickle.load(f)
+        is_npz = (f.read(4) == b"PK\x03\x04")  # npz files are zip archives
 
-    # check that the all the files stored in the dataset still exist.
-    for image_filename in dataset.getFilenames():
-        if not os.path.exists(image_filename):
-            raise IOError("allskyData.load(): The file \"" + image_filename +
+    if is_npz:
+        dataset = _loadNpz(filename)
+    else:
+        with open(filename, "rb") as f:
+            dataset = pickle.load(f)
+
+    dataset._setValidate(validate)
+
+    if validate == "full":
+        # check that the all the files stored in the dataset still exist.
+        missing_files = _findMissingFiles(dataset.getFilenames())
+        if len(missing_files) > 0:
+            raise IOError("allskyData.load(): The file \"" + missing_files[0] +
                           "\" no longer exists. The dataset \"" +
                           filename + "\" is therefore"
                           " not valid!")
@@ -302,7 +561,119 @@ def load(filename):
 ###############################################################################
 
 
-def new(directory, wavelength, filetype, site_info_file=None, recursive=False):
+def _loadNpz(filename):
+    """
+    Returns a dataset object loaded from an npz format dataset file (see
+    dataset.save()).
+    """
+    with numpy.load(filename, allow_pickle=False) as npz_file:
+        version = int(npz_file['version'])
+        if version > DATASET_FILE_VERSION:
+            raise IOError("allskyData.load(): The dataset file \"" + filename +
+                          "\" was created by a newer version of PASKIL.")
+
+        header = ast.literal_eval(npz_file['header'].tobytes().decode("utf-8"))
+
+        times = npz_file['times']
+        if len(times) > 0:
+            filenames = npz_file['filenames'].tobytes().decode(
+                "utf-8", "surrogateescape").split("\0")
+        else:
+            filenames = []
+
+        columns = (times, numpy.array(filenames, dtype=object),
+                   header['site_info_names'], npz_file['site_info_indices'],
+                   npz_file['radii'], npz_file['fov_angles'])
+
+    loaded_dataset = _fromColumns(columns, header['wavelength'],
+                                  header['filetypes'], header['mode'],
+                                  header['colour_table'],
+                                  header['calib_factor'],
+                                  header['lens_projection'])
+    loaded_dataset._setLastScan(header.get('last_scan', None))
+
+    return loaded_dataset
+
+###############################################################################
+
+
+def _toBytesArray(string):
+    """
+    Returns a numpy uint8 array of the UTF-8 encoding of the string, for 
+    storing strings in npz files without pickling them.
+    """
+    return numpy.frombuffer(string.encode("utf-8", "surrogateescape"),
+                            dtype=numpy.uint8)
+
+###############################################################################
+
+
+def _checkExists(filename):
+    """
+    Raises IOError if the file does not exist. Used by datasets which are 
+    lazily validated (see load()).
+    """
+    if not os.path.exists(filename):
+        raise IOError("allskyData: The file \"" + filename +
+                      "\" no longer exists. The dataset is therefore"
+                      " not valid!")
+
+###############################################################################
+
+
+def _loadImage(filename, site_info_file, validate, decode=True):
+    """
+    Returns an allskyImage object of the image, checking that it still exists
+    first if validate is "lazy". If decode is True then the image data is read
+    from the file straight away rather than when it is first used. Used by 
+    datasetIterator.
+    """
+    if validate == "lazy":
+        _checkExists(filename)
+
+    im = allskyImage.new(filename, site_info_file)
+
+    if decode:
+        im.load()
+
+    return im
+
+###############################################################################
+
+
+def _findMissingFiles(filenames):
+    """
+    Returns a list of the filenames in the list which do not exist. Rather than
+    checking each file individually, the contents of each directory are listed
+    once, which is much faster on network filesystems.
+    """
+    directory_contents = {}
+    missing_files = []
+
+    for filename in filenames:
+        directory, name = os.path.split(filename)
+
+        try:
+            contents = directory_contents[directory]
+        except KeyError:
+            try:
+                contents = set(os.listdir(directory or os.curdir))
+            except OSError:
+                contents = set()
+            directory_contents[directory] = contents
+
+        # the listing may not match the filename exactly (e.g. on case
+        # insensitive filesystems), so check these files individually
+        if name not in contents and not os.path.exists(filename):
+            missing_files.append(filename)
+
+    return missing_files
+
+###############################################################################
+
+
+def new(directory, wavelength, filetype, site_info_file=None, recursive=False,
+        catalog=None, workers=None, start_time=None, end_time=None):
     """
     Returns a dataset object containing images of type filetype, taken at a 
     wavelength of wavelength (needs to be the same value as in the image header
@@ -320,15 +691,71 @@ def new(directory, wavelength, filetype, site_info_file=None, recursive=False):
     must have the same mode, the same lens projection and the same colour 
     table. Note that images in the directory supplied which do not conform to 
     the dataset's parameters will be ignored.
-    """
 
-    search_list = []
+    The catalog option allows the image headers to be cached on disk, so that
+    subsequent calls only need to open images which are new or have changed. 
+    It may be a headerCatalog object, the filename of a catalog file, or 
+    "AUTO" in which case a catalog file called "paskil_catalog.db" is kept in
+    the search directory. The default is None, no catalog.
+
+    The workers option sets the number of processes used to read the images, 
+    see fromList for details.
+
+    The start_time and end_time options (datetime objects) can be used to 
+    only include images captured within a time range. When searching 
+    recursively, subdirectories which are named after dates (e.g. 
+    "YYYY/MM/DD" or "YYYYMMDD" structures) outside of the time range are not
+    searched, which can make creating datasets from large archives much 
+    faster. See misc.iterFiles for details. The default is None, no limit.
+    """
 
     # check that filetypes argument is a list - this is a common user error!
     if type(filetype) != type(list()):
         raise TypeError("Incorrect type for filetype argument. "
                         "Expecting list.")
 
+    directory, site_info_file = _checkSearchArgs(directory, site_info_file)
+
+    # files modified after this time will be found by dataset.refresh()
+    scan_time = time.time()
+
+    # the files are read as they are found, rather than searching the whole
+    # directory tree first
+    search_list = misc.iterFiles(directory, filetype, recursive, start_time,
+                                 end_time)
+
+    # check that some files with the specified extensions were found
+    try:
+        first_file = next(search_list)
+    except StopIteration:
+        raise ValueError("Unable to locate any files with extensions: " +
+                         str(filetype))
+
+    search_list = itertools.chain([first_file], search_list)
+
+    if catalog == "AUTO":
+        catalog = os.path.join(directory, "paskil_catalog.db")
+
+    new_dataset = fromList(search_list, wavelength, filetype, site_info_file,
+                           catalog=catalog, workers=workers)
+
+    if start_time is not None or end_time is not None:
+        new_dataset = new_dataset.crop(
+            start_time or new_dataset.getTimes()[0],
+            end_time or new_dataset.getTimes()[-1])
+
+    new_dataset._setLastScan(scan_time)
+
+    return new_dataset
+
+###############################################################################
+
+
+def _checkSearchArgs(directory, site_info_file):
+    """
+    Returns a tuple of the normalised paths of the search directory and site 
+    info file (which may be None). Raises IOError if either does not exist.
+    """
     # expand the paths of the directory and site info file
     directory = os.path.normpath(directory)
 
@@ -343,23 +770,53 @@ def new(directory, wavelength, filetype, site_info_file=None, recursive=False):
     if not os.path.isdir(directory):
         raise IOError("No directory called " + directory)
 
-    for i in range(len(filetype)):
-        if recursive:
-            # sweep the directory structure recursively
-            search_list = search_list + misc.findFiles(directory, "*." +
-                                                       filetype[i].lstrip("."))
+    return directory, site_info_file
 
-        else:
-            # only look in current directory
-            search_list = search_list + glob.glob(directory + os.sep + "*." +
-                                                  filetype[i].lstrip("."))
+###############################################################################
 
-    # check that some files with the specified extensions were found
-    if len(search_list) == 0:
-        raise ValueError("Unable to locate any files with extensions: " +
-                         str(filetype))
 
-    return fromList(search_list, wavelength, filetype, site_info_file)
+def _readRecordWrapper(arg_tuple):
+    """
+    Wrapper function for _readRecord, allowing it to be used with 
+    multiprocessing.Pool.map
+    """
+    return _readRecord(*arg_tuple)
+
+###############################################################################
+
+
+def _readRecord(filename, site_info_file):
+    """
+    Returns a tuple of the header fields needed to decide whether an image can
+    be put into a dataset: (creation time string, wavelength, mode, colour 
+    table, calibration factor, lens projection, radius, fov angle). If PASKIL
+    cannot open the image then None is returned.
+    """
+    # attempt to read the image metadata, if there is no plugin for it,
+    # then return None. Where the plugin supports it, only the image header is
+    # read and the pixel data is not decoded
+    try:
+        info, mode = allskyImagePlugins.read_header(filename, site_info_file)
+
+    except TypeError:
+        return None  # PASKIL cannot open the file
+    except IOError:
+        return None  # PIL cannot decode the image
+
+    try:
+        colour_table = info['processing']['applyColourTable']
+    except KeyError:
+        colour_table = None
+
+    try:
+        calib_factor = info['processing']['absoluteCalibration']
+    except KeyError:
+        calib_factor = None
+
+    return (info['header']['Creation Time'], info['header']['Wavelength'],
+            mode, colour_table, calib_factor,
+            info['camera']['lens_projection'], info['camera']['Radius'],
+            info['camera']['fov_angle'])
 
 ###############################################################################
 
@@ -393,31 +850,205 @@ class dataset:
         # multiple values allowed for any given dataset
         self.__filetypes = list(set(filetypes))
 
+        # whether to check that image files exist before opening them, see
+        # load()
+        self.__validate = "none"
+
+        # time (as returned by time.time()) of the last search of the
+        # directory containing the images, see refresh()
+        self.__last_scan = None
+
+        # optional cache of decoded images, see setImageCache()
+        self.__image_cache = None
+
+        # the lookup methods rely on the data being in chronological order
+        data = sorted(data, key=lambda x: x[0])
+
         n = list(range(len(data)))
-        self.__times = [data[i][0] for i in n]
-        self.__filenames = [data[i][1] for i in n]
-        self.__site_info_files = [data[i][2] for i in n]
-        self.__radii_list = [data[i][3] for i in n]
-        self.__fov_angles_list = [data[i][4] for i in n]
+
+        site_info_names, site_info_indices = _internSiteInfoFiles(
+            [data[i][2] for i in n])
+
+        self._setColumns(numpy.array([data[i][0] for i in n],
+                                     dtype="datetime64[us]"),
+                         numpy.array([data[i][1] for i in n], dtype=object),
+                         site_info_names, site_info_indices,
+                         numpy.array([data[i][3] for i in n], dtype=float),
+                         numpy.array([data[i][4] for i in n], dtype=float))
 
         # the dataset methods assume that there are only unique filenames
         # in the list it is unlikely that there ever wouldn't be - but it
         # is possible (maybe?!)
-        assert len(self.__filenames) == len(list(set(self.__filenames)))
+        assert len(self.__filenames) == len(set(self.__filenames.tolist()))
 
         # it is also possible that multiple images with the same capture time
         # have been put in the dataset - this will lead to unpredictable
         # behavior so we don't allow it
-        if len(self.__times) != len(list(set(self.__times))):
+        if len(self.__times) != len(numpy.unique(self.__times)):
             raise ValueError("Datasets cannot contain different images with "
                              "the same capture time")
 
+    ###########################################################################
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # image caches are local to the process
+        state['_dataset__image_cache'] = None
+
+        return state
+
+    ###########################################################################
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        if '_dataset__validate' not in state:
+            self.__validate = "none"
+
+        if '_dataset__image_cache' not in state:
+            self.__image_cache = None
+
+        if '_dataset__last_scan' not in state:
+            self.__last_scan = None
+
+        if '_dataset__site_info_files' in state:
+            # datasets pickled by older versions of PASKIL store the data as
+            # lists, so convert them to the columnar format
+            site_info_names, site_info_indices = _internSiteInfoFiles(
+                self.__dict__.pop('_dataset__site_info_files'))
+            self._setColumns(
+                numpy.array(self.__times, dtype="datetime64[us]"),
+                numpy.array(self.__filenames, dtype=object),
+                site_info_names, site_info_indices,
+                numpy.array(self.__dict__.pop('_dataset__radii_list'),
+                            dtype=float),
+                numpy.array(self.__dict__.pop('_dataset__fov_angles_list'),
+                            dtype=float))
+        else:
+            # the read-only flags are not pickled
+            self._setColumns(self.__times, self.__filenames,
+                             self.__site_info_names, self.__site_info_indices,
+                             self.__radii, self.__fov_angles)
+
+    ###########################################################################
+
+    def _setColumns(self, times, filenames, site_info_names,
+                    site_info_indices, radii, fov_angles):
+        """
+        Sets the data stored in the dataset. The times, filenames, radii and
+        fov_angles arguments should be numpy arrays, ordered chronologically.
+        The site info files are stored as a tuple of the different site info 
+        files in the dataset and an array of indices into it, one for each 
+        image (see _internSiteInfoFiles). The arrays are made read-only, so 
+        that they can be shared between datasets (for example by crop and 
+        split) and returned by the getter methods without being copied.
+        """
+        self.__times = times
+        self.__filenames = filenames
+        self.__site_info_names = tuple(site_info_names)
+        self.__site_info_indices = site_info_indices
+        self.__radii = radii
+        self.__fov_angles = fov_angles
+
+        for column in (self.__times, self.__filenames,
+                       self.__site_info_indices, self.__radii,
+                       self.__fov_angles):
+            column.flags.writeable = False
+
+    ###########################################################################
+
+    def _getColumns(self):
+        """
+        Returns a tuple (times, filenames, site_info_names, site_info_indices,
+        radii, fov_angles) of the (read-only) arrays used to store the dataset,
+        see _setColumns.
+        """
+        return (self.__times, self.__filenames, self.__site_info_names,
+                self.__site_info_indices, self.__radii, self.__fov_angles)
+
+    ###########################################################################
+
+    def _setValidate(self, validate):
+        """
+        Sets whether the dataset checks that image files exist before opening
+        them. See load() for details of the validate argument.
+        """
+        if validate not in ("none", "lazy", "full"):
+            raise ValueError("Unknown validate option \"" + str(validate) +
+                             "\", expecting \"none\", \"lazy\" or \"full\"")
+
+        self.__validate = validate
+
+    ###########################################################################
+
+    def _setLastScan(self, scan_time):
+        """
+        Sets the time (as returned by time.time()) that the directory 
+        containing the images was last searched, see refresh().
+        """
+        self.__last_scan = scan_time
+
+    ###########################################################################
+
+    def __openImage(self, filename, site_info_file):
+        """
+        Returns an allskyImage object of the image, checking that it still 
+        exists first if lazy validation is being used. The image cache is
+        used if one has been set.
+        """
+        if self.__validate == "lazy":
+            _checkExists(filename)
+
+        if self.__image_cache is not None:
+            return self.__image_cache.get(filename, site_info_file)
+
+        return allskyImage.new(filename, site_info_file)
+
+    ###########################################################################
+
+    def __subset(self, index):
+        """
+        Returns a new dataset containing the images selected by index (a slice
+        or an array of indices). If index is a slice then the new dataset 
+        shares its data with this one.
+        """
+        new_dataset = copy.copy(self)
+        new_dataset.setImageCache(self.__image_cache)  # not copied
+        new_dataset._setColumns(self.__times[index], self.__filenames[index],
+                                self.__site_info_names,
+                                self.__site_info_indices[index],
+                                self.__radii[index], self.__fov_angles[index])
+        return new_dataset
+
     ###########################################################################
     # define iterator method to allow datasets to support the iterator protocol
 
     def __iter__(self):
 
-        return datasetIterator(self.getAll())
+        return datasetIterator(self.getAll(), validate=self.__validate)
+
+    def iter(self, prefetch=8, workers=4):
+        """
+        Returns an iterator over the images in the dataset (in chronological 
+        order) which opens and decodes the next prefetch images on a pool of
+        workers threads in the background, so that reading the images from
+        disk overlaps with processing them. At most prefetch decoded images
+        are held in memory in addition to the one currently being used. Use
+        as:
+
+            for image in dataset.iter(prefetch=8, workers=4):
+                ...
+
+        If prefetch is 0 then this is the same as iterating over the dataset
+        directly. Errors raised whilst loading an image are raised when that 
+        image is reached.
+        """
+        if prefetch < 0:
+            raise ValueError("prefetch must be a positive integer")
+
+        return datasetIterator(self.getAll(), validate=self.__validate,
+                               prefetch=prefetch, workers=workers)
 
     ###########################################################################
     # define dataset comparison methods
@@ -425,18 +1056,27 @@ class dataset:
         if not isinstance(x, dataset):
             return NotImplemented
 
-        for k in list(self.__dict__.keys()):
-            if self.__dict__[k] != getattr(x, k):
-                return False
-        return True
+        if ((self.__wavelength, self.__mode, self.__colour_table,
+             self.__calib_factor, self.__lens_projection) !=
+                (x.getWavelength(), x.getMode(), x.__colour_table,
+                 x.getCalib_factor(), x.getLensProjection())):
+            return False
+
+        if set(self.__filetypes) != set(x.getFiletypes()):
+            return False
+
+        # the site info files may be stored differently in the two datasets,
+        # so compare the actual filenames
+        return (numpy.array_equal(self.__times, x.getTimesArray()) and
+                numpy.array_equal(self.__filenames, x.getFilenamesArray()) and
+                numpy.array_equal(self.__radii, x.getRadiiArray()) and
+                numpy.array_equal(self.__fov_angles, x.getFov_anglesArray()) and
+                self.getSite_info_files() == x.getSite_info_files())
 
     def __ne__(self, x):
         if not isinstance(x, dataset):
             return NotImplemented
-        for k in list(self.__dict__.keys()):
-            if self.__dict__[k] != getattr(x, k):
-                return True
-        return False
+        return not self.__eq__(x)
 
     ###########################################################################
 
@@ -449,26 +1089,33 @@ class dataset:
         need to use [start_index:end_index+1] to ensure you include the 
         end time.
         """
-        l = len(self.__times)
-        start_index = l
-        end_index = 0
-        index = 0
-        while index < l:
-            if self.__times[index] >= start_time:
-                start_index = index
-                break
-            index += 1
-        while index < l:
-            if self.__times[index] == end_time:
-                end_index = index
-                break
-            elif self.__times[index] > end_time:
-                if index == 0:
-                    index = 1
-                end_index = index - 1
-                break
-            index += 1
-        return (start_index, end_index)
+        start_index = numpy.searchsorted(self.__times,
+                                         numpy.datetime64(start_time, "us"),
+                                         side="left")
+        end_index = numpy.searchsorted(self.__times,
+                                       numpy.datetime64(end_time, "us"),
+                                       side="right") - 1
+
+        return (int(start_index), int(end_index))
+
+    ###########################################################################
+
+    def __nearestIndices(self, times):
+        """
+        Returns an array of the indices in self.__times of the times closest
+        to each of the times in the supplied sequence. Where two images are
+        equally close to a time, the earlier one is used.
+        """
+        times = numpy.array(times, dtype="datetime64[us]")
+
+        right = numpy.searchsorted(self.__times, times, side="left")
+        left = numpy.clip(right - 1, 0, len(self.__times) - 1)
+        right = numpy.clip(right, 0, len(self.__times) - 1)
+
+        left_diff = numpy.abs(times - self.__times[left])
+        right_diff = numpy.abs(self.__times[right] - times)
+
+        return numpy.where(left_diff <= right_diff, left, right)
 
     ###########################################################################
     # define getters
@@ -513,28 +1160,43 @@ class dataset:
         Returns a set (only unique values) of the radii of the images in the
         dataset in pixels.
         """
-        return set(self.__radii_list)
+        return set(numpy.unique(self.__radii).tolist())
 
     def getFov_angles(self):
         """
         Returns a set (only unique values) of field of view angles contained in
         the dataset.
         """
-        return set(self.__fov_angles_list)
+        return set(numpy.unique(self.__fov_angles).tolist())
 
     def _getRadiiList(self):
         """
         Returns a list of the  radii corresponding to each image in the dataset
         in pixels.
         """
-        return [x for x in self.__radii_list]
+        return self.__radii.tolist()
 
     def _getFov_anglesList(self):
         """
         Returns a list of field of view angles  corresponding to each image 
         contained in the dataset.
         """
-        return [x for x in self.__fov_angles_list]
+        return self.__fov_angles.tolist()
+
+    def getRadiiArray(self):
+        """
+        Returns a read-only numpy array of the radii (in pixels) of each image
+        in the dataset, ordered chronologically. The array is not a copy, so 
+        this is much faster than _getRadiiList for large datasets.
+        """
+        return self.__radii
+
+    def getFov_anglesArray(self):
+        """
+        Returns a read-only numpy array of the field of view angles of each 
+        image in the dataset, ordered chronologically. The array is not a copy.
+        """
+        return self.__fov_angles
 
     def getMode(self):
         """
@@ -558,7 +1220,23 @@ class dataset:
         contained in the dataset. The list will be ordered chronologically with
         respect to the capture times of the images.
         """
-        return [x for x in self.__filenames]
+        return self.__filenames.tolist()
+
+    def getFilenamesArray(self):
+        """
+        Returns a read-only numpy array (of dtype object) of the filenames of 
+        all the images contained in the dataset, ordered chronologically. The
+        array is not a copy, so this is much faster than getFilenames for large
+        datasets.
+        """
+        return self.__filenames
+
+    def getImageCache(self):
+        """
+        Returns the imageCache object used by the dataset, or None if images
+        are not being cached. See setImageCache().
+        """
+        return self.__image_cache
 
     def getNumImages(self):
         """
@@ -571,7 +1249,16 @@ class dataset:
         Returns a list of datetime objects corresponding to the capture times 
         of all the images in the dataset. The list will be ordered chronologically.
         """
-        return [x for x in self.__times]
+        return self.__times.tolist()
+
+    def getTimesArray(self):
+        """
+        Returns a read-only numpy array (of dtype datetime64[us]) of the 
+        capture times of all the images in the dataset, ordered 
+        chronologically. The array is not a copy, so this is much faster than
+        getTimes for large datasets.
+        """
+        return self.__times
 
     def getSite_info_files(self):
         """
@@ -582,7 +1269,22 @@ class dataset:
         images don't have site_info_files then a list of empty strings will be 
         returned.
         """
-        return [x for x in self.__site_info_files]
+        return [self.__site_info_names[i] for i in self.__site_info_indices]
+
+    def getSite_info_filesArray(self):
+        """
+        Returns a read-only numpy array (of dtype object) of the filenames of 
+        the site info files corresponding to the images in the dataset, ordered 
+        chronologically. Each different site info file is only stored once by
+        the dataset, so unlike the other array getters this creates a new 
+        array, but this is still much faster than getSite_info_files for large
+        datasets.
+        """
+        names = numpy.empty(len(self.__site_info_names), dtype=object)
+        names[:] = self.__site_info_names
+        site_info_files = names[self.__site_info_indices]
+        site_info_files.flags.writeable = False
+        return site_info_files
 
     ###########################################################################
 
@@ -597,17 +1299,9 @@ class dataset:
         if s > e:
             raise ValueError("No image files in specified range")
 
-        e += 1  # so that list slices include the image at index e
-
-        # build list of tuples
-        cropped_data = list(zip(self.__times[s:e], self.__filenames[s:e],
-                                self.__site_info_files[
-                                    s:e], self.__radii_list[s:e],
-                                self.__fov_angles_list[s:e]))
+        e += 1  # so that slices include the image at index e
 
-        return dataset(cropped_data, self.__wavelength, self.__filetypes,
-                       self.__mode, self.__colour_table, self.__calib_factor,
-                       self.__lens_projection)
+        return self.__subset(slice(s, e))
 
     ###########################################################################
 
@@ -617,7 +1311,7 @@ class dataset:
         files in the dataset and their corresponding site info files, 
         e.g. [(image1, site_info1), (image2, site_info2)...]
         """
-        return list(zip(self.__filenames, self.__site_info_files))
+        return list(zip(self.__filenames.tolist(), self.getSite_info_files()))
 
     ###########################################################################
 
@@ -634,7 +1328,8 @@ class dataset:
         s, e = self.__t_range2indices(time1, time2)
         e += 1  # so that list slices include the image at index e
 
-        return list(zip(self.__filenames[s:e], self.__site_info_files[s:e]))
+        return [(self.__filenames[i], self.__site_info_names[j])
+                for i, j in zip(range(s, e), self.__site_info_indices[s:e])]
 
     ###########################################################################
 
@@ -644,13 +1339,15 @@ class dataset:
         specified time. If no image exists for the specified time then None is
         returned. The time argument should be a datetime object.
         """
-        try:
-            index = self.__times.index(time)
-        except ValueError:
+        index = numpy.searchsorted(self.__times, numpy.datetime64(time, "us"))
+
+        if (index == len(self.__times) or
+                self.__times[index] != numpy.datetime64(time, "us")):
             return None
 
-        return allskyImage.new(self.__filenames[index],
-                               self.__site_info_files[index])
+        return self.__openImage(
+            self.__filenames[index],
+            self.__site_info_names[self.__site_info_indices[index]])
 
     ###########################################################################
 
@@ -664,7 +1361,7 @@ class dataset:
         """
         filenames = self.getFilenamesInRange(time1, time2)
 
-        return [allskyImage.new(*x) for x in filenames]
+        return [self.__openImage(*x) for x in filenames]
 
     ###########################################################################
 
@@ -672,11 +1369,16 @@ class dataset:
         """
         Returns an allskyImage object corresponding to the image in the dataset 
         which has a creation time closest to the specified time. The time 
-        argument should be a datetime object. 
+        argument should be a datetime object. Alternatively, time can be a 
+        list of datetime objects, in which case a list of allskyImage objects
+        is returned, one for each time (this is useful for resampling a dataset
+        to a fixed cadence).
         """
-        filename, site_info_filename = self.getNearestFilename(time)
+        if isinstance(time, datetime.datetime):
+            filename, site_info_filename = self.getNearestFilename(time)
+            return self.__openImage(filename, site_info_filename)
 
-        return allskyImage.new(filename, site_info_filename)
+        return [self.__openImage(*x) for x in self.getNearestFilename(time)]
 
     ###########################################################################
 
@@ -684,16 +1386,127 @@ class dataset:
         """
         Returns a (filename, site_info_file) tuple corresponding to the image 
         in the dataset which has a creation time closest to the specified time.
-        The time argument should be a datetime object. 
+        The time argument should be a datetime object. Alternatively, time can
+        be a list of datetime objects, in which case a list of tuples is 
+        returned, one for each time.
         """
-        diff = [abs(t - time) for t in self.__times]
-        index = diff.index(min(diff))
+        if isinstance(time, datetime.datetime):
+            index = self.__nearestIndices([time])[0]
+            return (self.__filenames[index],
+                    self.__site_info_names[self.__site_info_indices[index]])
+
+        return [(self.__filenames[i],
+                 self.__site_info_names[self.__site_info_indices[i]])
+                for i in self.__nearestIndices(time)]
 
-        return (self.__filenames[index], self.__site_info_files[index])
+    ###########################################################################
+
+    def refresh(self, directory, site_info_file=None, recursive=False,
+                catalog=None, workers=None, check_mtime=True):
+        """
+        Adds any new images in the directory to the dataset. This allows a 
+        dataset to be kept up to date with an archive that is still growing, 
+        without having to create a new dataset from all of the images. The 
+        arguments are the same as for new(). Only files which are not already
+        in the dataset and which have been modified since the directory was 
+        last searched (by new() or refresh()) are read, and they must have the
+        same wavelength, mode, colour table, calibration factor and lens 
+        projection as the dataset. If check_mtime is False (for example, if 
+        files are copied into the archive with their original modification 
+        times) then all files which are not already in the dataset are read. 
+        Images with the same capture time as an image already in the dataset
+        are skipped. The dataset is modified in place, and the number of images
+        that were added is returned.
+        """
+        directory, site_info_file = _checkSearchArgs(directory, site_info_file)
+
+        scan_time = time.time()
+
+        # only read files which could have been created since the last scan
+        existing_files = set(self.__filenames.tolist())
+        new_files = []
+        for filename in misc.iterFiles(directory, self.__filetypes, recursive):
+            if filename in existing_files:
+                continue
+
+            if check_mtime and self.__last_scan is not None:
+                try:
+                    if (os.stat(filename).st_mtime <
+                            self.__last_scan - MTIME_MARGIN):
+                        continue
+                except OSError:
+                    continue  # file has been removed since the search
+
+            new_files.append(filename)
+
+        if catalog == "AUTO":
+            catalog = os.path.join(directory, "paskil_catalog.db")
+
+        data = _classifyFiles(new_files, self.__wavelength, self.__filetypes,
+                              site_info_file, catalog, workers,
+                              (self.__mode, self.__colour_table,
+                               self.__calib_factor, self.__lens_projection),
+                              "allskyData.dataset.refresh()")[0]
+
+        # skip any images whose capture time is already used
+        data.sort(key=lambda x: x[0])
+        used_times = set(self.__times.tolist())
+        new_data = []
+        for entry in data:
+            if entry[0] in used_times:
+                print(("Warning! allskyData.dataset.refresh(): Skipping file " +
+                       entry[1] + ". An image with the same capture time is "
+                       "already in the dataset."))
+                continue
+            used_times.add(entry[0])
+            new_data.append(entry)
+
+        self.__last_scan = scan_time
+
+        if len(new_data) == 0:
+            return 0
+
+        # merge the new images into the data columns
+        site_info_names = self.__site_info_names
+        if site_info_file not in site_info_names:
+            site_info_names = site_info_names + (site_info_file,)
+        site_info_index = site_info_names.index(site_info_file)
+
+        n = list(range(len(new_data)))
+        times = numpy.concatenate((self.__times,
+                                   numpy.array([new_data[i][0] for i in n],
+                                               dtype="datetime64[us]")))
+        filenames = numpy.concatenate((self.__filenames,
+                                       numpy.array([new_data[i][1] for i in n],
+                                                   dtype=object)))
+        site_info_indices = numpy.concatenate(
+            (self.__site_info_indices,
+             numpy.full(len(new_data), site_info_index, dtype=numpy.int32)))
+        radii = numpy.concatenate((self.__radii,
+                                   numpy.array([new_data[i][3] for i in n],
+                                               dtype=float)))
+        fov_angles = numpy.concatenate((self.__fov_angles,
+                                        numpy.array([new_data[i][4] for i in n],
+                                                    dtype=float)))
+
+        # new images are usually later than all the existing ones, in which
+        # case the columns are already in order
+        if not numpy.all(times[1:] > times[:-1]):
+            order = numpy.argsort(times, kind="mergesort")
+            times = times[order]
+            filenames = filenames[order]
+            site_info_indices = site_info_indices[order]
+            radii = radii[order]
+            fov_angles = fov_angles[order]
+
+        self._setColumns(times, filenames, site_info_names, site_info_indices,
+                         radii, fov_angles)
+
+        return len(new_data)
 
     ###########################################################################
 
-    def save(self, filename):
+    def save(self, filename, format="pickle"):
         """
         Saves the dataset object in specified file. It can be retrieved at a 
         later date using the load() function. However, be aware that changing 
@@ -701,11 +1514,67 @@ class dataset:
         of the images stored in a dataset after it has been created may cause 
         unpredictable results. If you need to change the files somehow, then it
         is better to create a new dataset object using the new files.
+
+        The format argument can be "pickle" (the default) or "npz". The pickle
+        format is the format used by older versions of PASKIL, and can be read
+        by any version. The npz format is a numpy .npz archive of the data 
+        columns of the dataset, which is much faster to save and load than a 
+        pickle for large datasets, but can only be loaded by versions of 
+        PASKIL which support it. Note that no file extension is added to the
+        filename.
         """
-        # open file for writing
+        if format == "pickle":
+            # open file for writing
+            with open(filename, "wb") as f:
+                # pickle the dataset object and save it to the file
+                pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            return
+
+        if format != "npz":
+            raise ValueError("Unknown format \"" + str(format) +
+                             "\", expecting \"npz\" or \"pickle\"")
+
+        # the properties of the dataset are stored as a string representation
+        # of a dictionary (like the image metadata in PASKIL png files)
+        header = {'wavelength': self.__wavelength, 'mode': self.__mode,
+                  'colour_table': self.__colour_table,
+                  'calib_factor': self.__calib_factor,
+                  'lens_projection': self.__lens_projection,
+                  'filetypes': self.__filetypes,
+                  'site_info_names': self.__site_info_names,
+                  'last_scan': self.__last_scan}
+
+        # filenames cannot contain null characters, so are stored as a single
+        # null separated string
+        filenames = "\0".join(self.__filenames.tolist())
+
         with open(filename, "wb") as f:
-            # pickle the dataset object and save it to the file
-            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            numpy.savez(f, version=numpy.array(DATASET_FILE_VERSION),
+                        header=_toBytesArray(repr(header)),
+                        times=self.__times,
+                        filenames=_toBytesArray(filenames),
+                        site_info_indices=self.__site_info_indices,
+                        radii=self.__radii, fov_angles=self.__fov_angles)
+
+    ###########################################################################
+
+    def setImageCache(self, cache):
+        """
+        Sets an imageCache object to use to cache the images returned by the 
+        getImage, getImagesInRange and getNearest methods, e.g.
+
+            data.setImageCache(allskyData.imageCache(max_bytes=500 * 2**20))
+
+        The same cache can be shared between several datasets. Datasets 
+        created from this one (e.g. by crop or split) share its cache. Set to 
+        None (the default) to stop caching images. The cache is not saved or
+        pickled with the dataset.
+        """
+        if cache is not None and not isinstance(cache, imageCache):
+            raise TypeError("Incorrect type, " + str(type(cache)) +
+                            " for cache argument, expecting imageCache or None")
+
+        self.__image_cache = cache
 
     ###########################################################################
 
@@ -730,22 +1599,12 @@ class dataset:
 
         inc = int(float(length) / float(n) + 0.5)
         split_list = []
-        data = list(zip(self.__times, self.__filenames, self.__site_info_files,
-                        self.__radii_list, self.__fov_angles_list))
 
+        # the new datasets share their data with this one
         for i in range(0, n - 1):
-            data_slice = data[i * inc:i * inc + inc]
-            split_list.append(dataset(data_slice, self.__wavelength,
-                                      self.__filetypes, self.__mode,
-                                      self.__colour_table,
-                                      self.__calib_factor,
-                                      self.__lens_projection))
-
-        data_slice = data[n * inc - inc:]
-        split_list.append(dataset(data_slice, self.__wavelength,
-                                  self.__filetypes, self.__mode,
-                                  self.__colour_table, self.__calib_factor,
-                                  self.__lens_projection))
+            split_list.append(self.__subset(slice(i * inc, i * inc + inc)))
+
+        split_list.append(self.__subset(slice(n * inc - inc, None)))
 
         return tuple(split_list)
 
@@ -756,14 +1615,29 @@ class dataset:
 class datasetIterator:
     """
     Iterator class for the dataset class. Allows you to use "for image in 
-    dataset:" constructs for iterating over all images in a dataset.
+    dataset:" constructs for iterating over all images in a dataset. If 
+    prefetch is greater than zero then up to prefetch images ahead of the
+    current one are opened and decoded by a pool of worker threads while the
+    current image is being processed, see dataset.iter(). 
     """
 
-    def __init__(self, filenames):
+    def __init__(self, filenames, validate="none", prefetch=0, workers=1):
         self.__filenames = filenames
+        self.__validate = validate
         self.__current_index = 0
         self.__largest_index = len(filenames)
 
+        self.__prefetch = int(prefetch)
+        self.__pool = None
+        self.__pending = collections.deque()
+        self.__next_to_load = 0
+
+        if self.__prefetch > 0:
+            if workers < 1:
+                raise ValueError("workers must be at least 1")
+            self.__pool = ThreadPool(min(workers, self.__prefetch))
+            self.__fillQueue()
+
     ###########################################################################
 
     def __iter__(self):
@@ -775,6 +1649,42 @@ class datasetIterator:
 
     ###########################################################################
 
+    def __fillQueue(self):
+        """
+        Submits images to the thread pool until prefetch images are pending 
+        or there are no images left.
+        """
+        while (len(self.__pending) < self.__prefetch and
+               self.__next_to_load < self.__largest_index):
+            filename, site_info_file = self.__filenames[self.__next_to_load]
+            self.__pending.append(self.__pool.apply_async(
+                _loadImage, (filename, site_info_file, self.__validate)))
+            self.__next_to_load += 1
+
+    ###########################################################################
+
+    def close(self):
+        """
+        Stops any background loading of images. This only needs to be called
+        if iteration is stopped before all the images have been returned, it
+        happens automatically otherwise.
+        """
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool = None
+        self.__pending.clear()
+        self.__current_index = self.__largest_index
+
+    ###########################################################################
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    ###########################################################################
+
     def next(self):
         """ Needed to work in python 2.7"""
         return self.__next__()
@@ -787,8 +1697,18 @@ class datasetIterator:
 
         if self.__current_index < self.__largest_index:
 
-            im = allskyImage.new(self.__filenames[self.__current_index][0],
-                                 site_info_file=self.__filenames[self.__current_index][1])
+            if self.__pool is not None:
+                try:
+                    im = self.__pending.popleft().get()
+                except:
+                    self.close()
+                    raise
+                self.__fillQueue()
+
+            else:
+                im = _loadImage(self.__filenames[self.__current_index][0],
+                                self.__filenames[self.__current_index][1],
+                                self.__validate, decode=False)
             self.__current_index += 1
 
             # return image
@@ -796,7 +1716,342 @@ class datasetIterator:
 
         else:
             # all images have been returned, raise an exception from now on.
+            self.close()
             raise StopIteration
 
     ###########################################################################
 #########################################################################
+
+
+class imageCache:
+    """
+    A least recently used cache of decoded all-sky images, which can be 
+    attached to one or more datasets with dataset.setImageCache(). Images 
+    returned by the dataset's getImage, getImagesInRange and getNearest 
+    methods are then only read from file the first time that they are 
+    requested. The cache is bounded by the (approximate) number of bytes of 
+    image data it holds, rather than by the number of images, the least 
+    recently used images are discarded once max_bytes is exceeded. Cached
+    images are discarded if the image file is modified. The cache is thread
+    safe.
+    """
+
+    # number of bytes used by PIL to store one pixel in each image mode
+    __bytes_per_pixel = {"1": 1, "L": 1, "P": 1, "I;16": 2, "LA": 4,
+                         "RGB": 4, "RGBA": 4, "CMYK": 4, "I": 4, "F": 4}
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than zero")
+
+        self.__max_bytes = max_bytes
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+
+        # maps (filename, site_info_file) to (mtime, size, nbytes, image, info),
+        # where image is a PIL image, ordered from least to most recently used
+        self.__images = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    ###########################################################################
+
+    def __len__(self):
+        return len(self.__images)
+
+    ###########################################################################
+
+    def __nbytes(self, image):
+        """
+        Returns the approximate number of bytes of memory used by the image
+        data of the allskyImage.
+        """
+        width, height = image.getSize()
+        return width * height * self.__bytes_per_pixel.get(image.getMode(), 4)
+
+    ###########################################################################
+
+    def __discard(self, key):
+        self.__size -= self.__images.pop(key)[2]
+
+    ###########################################################################
+
+    def clear(self):
+        """
+        Removes all the images from the cache (the hit and miss counts are not
+        reset).
+        """
+        with self.__lock:
+            self.__images.clear()
+            self.__size = 0
+
+    ###########################################################################
+
+    def get(self, filename, site_info_file, loader=None):
+        """
+        Returns an allskyImage object of the image, from the cache if it has
+        not been modified since it was cached. Otherwise the image is opened 
+        using loader(filename, site_info_file) (allskyImage.new by default) 
+        and added to the cache. Each call returns a different allskyImage 
+        object, so their info can be modified without affecting the cache. 
+        The image data is not copied, it is shared with the cache (allskyImage
+        methods never modify the image data of an existing object).
+        """
+        key = (filename, site_info_file)
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            stat = None
+
+        with self.__lock:
+            try:
+                mtime, size, nbytes, image, info = self.__images[key]
+            except KeyError:
+                pass
+            else:
+                if (stat is not None and mtime == stat.st_mtime and
+                        size == stat.st_size):
+                    self.__images.move_to_end(key)
+                    self.__hits += 1
+                    return allskyImage.allskyImage(image, filename, info)
+                self.__discard(key)
+            self.__misses += 1
+
+        if loader is None:
+            loader = allskyImage.new
+        image = loader(filename, site_info_file)
+        image.load()
+
+        if stat is None:
+            return image  # loader could read it, but os.stat couldn't
+
+        nbytes = self.__nbytes(image)
+        if nbytes > self.__max_bytes:
+            return image  # too big to cache
+
+        # keep the PIL image and the info, so that the images returned for
+        # cache hits can be created from them without copying the image data
+        info = image.getInfo()
+        image = image.getImage()
+
+        with self.__lock:
+            if key in self.__images:
+                self.__discard(key)
+            self.__images[key] = (stat.st_mtime, stat.st_size, nbytes, image,
+                                  info)
+            self.__size += nbytes
+
+            while self.__size > self.__max_bytes:
+                self.__discard(next(iter(self.__images)))
+
+        return allskyImage.allskyImage(image, filename, info)
+
+    ###########################################################################
+
+    def getHits(self):
+        """
+        Returns the number of calls to get() which were served from the cache.
+        """
+        return self.__hits
+
+    ###########################################################################
+
+    def getMaxBytes(self):
+        """
+        Returns the maximum number of bytes of image data held in the cache.
+        """
+        return self.__max_bytes
+
+    ###########################################################################
+
+    def getMisses(self):
+        """
+        Returns the number of calls to get() which had to read the image from
+        file.
+        """
+        return self.__misses
+
+    ###########################################################################
+
+    def getSize(self):
+        """
+        Returns the (approximate) number of bytes of image data currently held 
+        in the cache.
+        """
+        return self.__size
+
+    ###########################################################################
+#########################################################################
+
+
+class headerCatalog:
+    """
+    An on-disk (SQLite) cache of the image header fields that are needed to 
+    build a dataset. Each image is keyed by its path and site information 
+    file, and the entry is only considered valid as long as the modification
+    time and size of the image (and the modification time of the site info 
+    file) are unchanged. This means that repeatedly indexing a large archive
+    only requires new or modified images to be opened. Images which PASKIL 
+    cannot open are not recorded, so that they are retried every time (they 
+    may be readable once the plugin for them has been loaded).
+    """
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__connection = sqlite3.connect(filename)
+
+        # colour tables are stored once in their own table (they can be large)
+        # and are only evaluated once per catalog object
+        self.__colour_tables = {}
+
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "filename TEXT, site_info_file TEXT, mtime REAL, size INTEGER, "
+            "site_info_mtime REAL, readable INTEGER, creation_time TEXT, "
+            "wavelength TEXT, mode TEXT, colour_table TEXT, calib_factor TEXT, "
+            "lens_projection TEXT, radius TEXT, fov_angle TEXT, "
+            "PRIMARY KEY (filename, site_info_file))")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS colour_tables ("
+            "hash TEXT PRIMARY KEY, colour_table TEXT)")
+        self.__connection.commit()
+
+    ###########################################################################
+
+    def __key(self, filename, site_info_file):
+        """
+        Returns the (filename, site_info_file, mtime, size, site_info_mtime)
+        tuple used to identify an image in the catalog.
+        """
+        stat = os.stat(filename)
+
+        if site_info_file is None:
+            site_info_file = ""
+            site_info_mtime = 0.0
+        else:
+            site_info_file = os.path.abspath(site_info_file)
+            site_info_mtime = os.stat(site_info_file).st_mtime
+
+        return (os.path.abspath(filename), site_info_file, stat.st_mtime,
+                stat.st_size, site_info_mtime)
+
+    ###########################################################################
+
+    def __getColourTable(self, ct_hash):
+        if ct_hash is None:
+            return None
+
+        try:
+            return self.__colour_tables[ct_hash]
+        except KeyError:
+            row = self.__connection.execute(
+                "SELECT colour_table FROM colour_tables WHERE hash=?",
+                (ct_hash,)).fetchone()
+            if row is None:
+                raise KeyError(ct_hash)
+            colour_table = ast.literal_eval(row[0])
+            self.__colour_tables[ct_hash] = colour_table
+            return colour_table
+
+    ###########################################################################
+
+    def close(self):
+        """
+        Commits any outstanding changes and closes the catalog file.
+        """
+        self.__connection.commit()
+        self.__connection.close()
+
+    ###########################################################################
+
+    def commit(self):
+        """
+        Writes any outstanding changes to the catalog file.
+        """
+        self.__connection.commit()
+
+    ###########################################################################
+
+    def getFilename(self):
+        """
+        Returns the filename of the catalog file.
+        """
+        return self.__filename
+
+    ###########################################################################
+
+    def lookup(self, filename, site_info_file):
+        """
+        Returns the record (see store()) held in the catalog for the specified
+        image and site info file. Raises KeyError if the image is not in the 
+        catalog or has been modified since it was catalogued. Returns None if
+        the image no longer exists (or cannot be accessed), in the same way as
+        for images which PASKIL cannot open.
+        """
+        try:
+            key = self.__key(filename, site_info_file)
+        except OSError:
+            return None
+
+        row = self.__connection.execute(
+            "SELECT mtime, size, site_info_mtime, readable, creation_time, "
+            "wavelength, mode, colour_table, calib_factor, lens_projection, "
+            "radius, fov_angle FROM images WHERE filename=? AND "
+            "site_info_file=?", key[:2]).fetchone()
+
+        # unreadable images are not catalogued, but may have been by older
+        # versions of PASKIL
+        if row is None or tuple(row[:3]) != key[2:] or not row[3]:
+            raise KeyError(filename)
+
+        return (row[4], row[5], row[6], self.__getColourTable(row[7]),
+                ast.literal_eval(row[8]), row[9], ast.literal_eval(row[10]),
+                ast.literal_eval(row[11]))
+
+    ###########################################################################
+
+    def store(self, filename, site_info_file, record):
+        """
+        Stores the record for the specified image and site info file in the 
+        catalog. The record should be a tuple of (creation time string, 
+        wavelength, mode, colour table, calibration factor, lens projection, 
+        radius, fov angle) or None if the image cannot be opened by PASKIL, in
+        which case nothing is stored (and any existing entry for the image is
+        removed). Images which no longer exist are not stored either. Changes
+        are not written to disk until commit() is called.
+        """
+        try:
+            key = self.__key(filename, site_info_file)
+        except OSError:
+            return
+
+        if record is None:
+            self.__connection.execute(
+                "DELETE FROM images WHERE filename=? AND site_info_file=?",
+                key[:2])
+            return
+
+        (creation_time, wavelength, mode, colour_table, calib_factor,
+         lens_projection, radius, fov_angle) = record
+
+        if colour_table is None:
+            ct_hash = None
+        else:
+            ct_str = repr(colour_table)
+            ct_hash = hashlib.sha1(ct_str.encode()).hexdigest()
+            if ct_hash not in self.__colour_tables:
+                self.__connection.execute(
+                    "INSERT OR IGNORE INTO colour_tables (hash, colour_table) "
+                    "VALUES (?, ?)", (ct_hash, ct_str))
+                self.__colour_tables[ct_hash] = colour_table
+
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO images VALUES "
+            "(?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (creation_time, wavelength, mode, ct_hash,
+                   repr(calib_factor), lens_projection, repr(radius),
+                   repr(fov_angle)))
+
+    ###########################################################################
+########################################################################
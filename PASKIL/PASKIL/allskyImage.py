@@ -58,8 +58,10 @@ Example:
 
 import sys
 import datetime
+import inspect
 import os
 import math
+import threading
 import warnings
 
 import numpy
@@ -83,17 +85,568 @@ def new(image_filename, site_info_file=None, force=False):
     incorrect image metadata. The default is False, which means that where possible the image metadata will be read
     from the image header, rather than an external source.
     """
-    # Load correct image plugin to open image
-    filetype = allskyImagePlugins.load(image_filename, site_info_file, force)
+    # Load correct image plugin and use it to open image
+    allsky_image = allskyImagePlugins.open_image(image_filename, site_info_file, force)
 
     # Return allskyImage object
-    allsky_image = filetype.open(image_filename, site_info_file)
-
     return allsky_image
 
 ##########################################################################
 
 
+def _fromArray(array):
+    """
+    Returns a PIL image of the pixel values in the numpy array, which should have shape 
+    (height, width, bands) (as returned by allskyImage.getArray()).
+    """
+    if array.shape[2] == 1:
+        array = array[:, :, 0]
+
+    return Image.fromarray(array)
+
+##########################################################################
+
+# cache of cameraGeometry objects, keyed by the image size and camera info
+_geometry_cache = {}
+
+# maximum number of geometries held in _geometry_cache (each can hold two
+# image sized arrays)
+_GEOMETRY_CACHE_SIZE = 4
+
+
+def _getGeometry(size, camera):
+    """
+    Returns a cameraGeometry object for images of the specified size (a (width, height) tuple) with
+    the specified camera info dict. Images with identical geometries share the same object, so that
+    its arrays are only calculated once.
+    """
+    key = (tuple(size), float(camera['x_center']), float(camera['y_center']),
+           float(camera['Radius']), float(camera['fov_angle']), camera['lens_projection'])
+
+    try:
+        return _geometry_cache[key]
+    except KeyError:
+        pass
+
+    geometry = cameraGeometry(*key)
+
+    if len(_geometry_cache) >= _GEOMETRY_CACHE_SIZE:
+        _geometry_cache.clear()
+    _geometry_cache[key] = geometry
+
+    return geometry
+
+##########################################################################
+
+# cache of flat field correction arrays used by flatFieldCorrection, keyed by
+# the image geometry and the calibration data
+_flat_field_cache = {}
+
+# maximum number of correction arrays held in _flat_field_cache
+_FLAT_FIELD_CACHE_SIZE = 8
+
+
+def _flatFieldMap(geometry, calibration_data):
+    """
+    Returns a read-only numpy array (of shape (height, width)) of the factors that the pixel values
+    of an image with the specified geometry (a cameraGeometry object) need to be multiplied by to
+    apply a flat field correction with the given calibration data. Pixels outside of the field of
+    view have a factor of 1.0. The arrays are cached, so that they only need to be calculated once
+    for a set of images with the same geometry.
+    """
+    key = (geometry, tuple(calibration_data))
+
+    try:
+        return _flat_field_cache[key]
+    except KeyError:
+        pass
+
+    angles = geometry.getZenithAngles()
+
+    # linearly interpolate the calibration data for pixels inside the field of view
+    in_fov = angles < geometry.getFov_angle()
+    angles = angles[in_fov]
+    calibration_data = numpy.asarray(calibration_data, dtype=float)
+    lower = numpy.floor(angles).astype(int)
+    gradients = calibration_data[lower + 1] - calibration_data[lower]
+
+    correction = numpy.ones(in_fov.shape)
+    correction[in_fov] = 1.0 / (calibration_data[lower] + (angles - lower) * gradients)
+    correction.flags.writeable = False
+
+    if len(_flat_field_cache) >= _FLAT_FIELD_CACHE_SIZE:
+        _flat_field_cache.clear()
+    _flat_field_cache[key] = correction
+
+    return correction
+
+##########################################################################
+
+# cache of the boolean masks used by binaryMask, keyed by image size, centre
+# and radius
+_mask_cache = {}
+
+# maximum number of masks held in _mask_cache
+_MASK_CACHE_SIZE = 8
+
+
+def _circleMask(size, x_center, y_center, radius):
+    """
+    Returns a read-only boolean numpy array (of shape (height, width)) which is True for the pixels
+    inside the circle with the specified centre and radius (in pixels) in an image of the specified
+    size (a (width, height) tuple). The circle is drawn using PIL, so it covers exactly the same 
+    pixels as an ellipse drawn with ImageDraw. The masks are cached.
+    """
+    key = (tuple(size), x_center, y_center, radius)
+
+    try:
+        return _mask_cache[key]
+    except KeyError:
+        pass
+
+    # draw white circle on a black image
+    mask_image = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask_image)
+    draw.ellipse((x_center - radius, y_center - radius, x_center + radius,
+                  y_center + radius), fill=255)
+
+    mask = numpy.asarray(mask_image) != 0
+    mask.flags.writeable = False
+
+    if len(_mask_cache) >= _MASK_CACHE_SIZE:
+        _mask_cache.clear()
+    _mask_cache[key] = mask
+
+    return mask
+
+##########################################################################
+
+
+def _centerBoxes(camera, size):
+    """
+    Returns a tuple (bounding_box, paste_box, new_size) describing how centerImage centres the field
+    of view of an image with the specified camera info dict and size. The bounding_box is the region
+    of the image which is cropped out, this is pasted into paste_box in a new (black) image of size
+    new_size, which encompasses the entire (theoretical) circular field of view.
+    """
+    # get the bounding box of the image (box around non-zero parts of the
+    # image)
+    r = int(camera['Radius'])
+    x_0 = int(camera['x_center'])
+    y_0 = int(camera['y_center'])
+    width, height = size
+
+    left = x_0 - r
+    if left < 0:
+        left = 0
+    right = x_0 + r
+    if right > (width - 1):
+        right = width - 1
+    upper = y_0 - r
+    if upper < 0:
+        upper = 0
+    lower = y_0 + r
+    if lower > height - 1:
+        lower = height
+
+    bounding_box = (left, upper, right, lower)
+
+    # position of the cropped image in the square image
+    width = right - left
+    height = lower - upper
+    paste_box = (r - int(width / 2), r - int(height / 2),
+                 r - int(width / 2) + width, r - int(height / 2) + height)
+
+    return bounding_box, paste_box, (2 * r, 2 * r)
+
+##########################################################################
+
+
+def _alignNorthSteps(info, north, orientation):
+    """
+    Works out the operations needed by alignNorth to align an image with the specified info dict
+    with north. The info dict is updated to describe the aligned image. Returns a list of the
+    operations to apply to the image in order, each of which is either ("rotate", angle) or
+    ("mirror", None).
+    """
+    steps = []
+
+    # align the image with geographic north
+    try:
+        if info['processing']['alignNorth'].count('NESW') != 0:
+            # rotate clockwise since the Image is in a NESW orientation
+            steps.append(("rotate", -float(info['camera']['cam_rot'])))
+        elif info['processing']['alignNorth'].count('NWSE') != 0:
+            # rotate anti-clockwise since the Image is in a NWSE
+            # orientation
+            steps.append(("rotate", float(info['camera']['cam_rot'])))
+        else:
+            # this image was alignedNorth using an old version of PASKIL and
+            # is therefore in a NESW orientation
+            # rotate clockwise since the Image is in a NESW orientation
+            steps.append(("rotate", -float(info['camera']['cam_rot'])))
+            info['processing']['alignNorth'] = info[
+                'processing']['alignNorth'] + "(NESW)"
+
+    except KeyError:
+        # the image hasn't been aligned North before, we assume it is in
+        # NWSE orientation and change the info to reflect this
+        info['processing']['alignNorth'] = "(NWSE)"
+        steps.append(("rotate", float(info['camera']['cam_rot'])))
+    info['camera']['cam_rot'] = "0.0"
+
+    # if the image does not already have the correct orientation then
+    # flip it east west
+    if info['processing']['alignNorth'].count(orientation) == 0:
+        steps.append(("mirror", None))
+
+    if north == "geomagnetic":
+        if orientation == 'NESW':
+            steps.append(("rotate", float(info['camera']['Magn. Bearing'])))
+        elif orientation == 'NWSE':
+            steps.append(("rotate", -float(info['camera']['Magn. Bearing'])))
+        else:
+            raise ValueError
+
+        info['camera']['cam_rot'] = info['camera']['Magn. Bearing']
+
+    elif north != "geographic":
+        raise ValueError
+
+    # update processing history
+    info['processing']['alignNorth'] = north + " (" + orientation + ")"
+
+    return steps
+
+##########################################################################
+
+
+def _rotationMatrix(angle, size):
+    """
+    Returns the 3x3 numpy array which maps pixel coordinates in an image of the specified size that
+    has been rotated by angle degrees (anti-clockwise, about its centre) back to coordinates in the
+    original image. This is the same transformation used by PIL's Image.rotate().
+    """
+    center_x, center_y = size[0] / 2.0, size[1] / 2.0
+    angle = -math.radians(angle % 360.0)
+    cos_a = round(math.cos(angle), 15)
+    sin_a = round(math.sin(angle), 15)
+
+    # the translations are calculated in the same order as in PIL, so that
+    # the floating point results are identical
+    return numpy.array([[cos_a, sin_a, cos_a * -center_x + sin_a * -center_y + center_x],
+                        [-sin_a, cos_a, -sin_a * -center_x + cos_a * -center_y + center_y],
+                        [0.0, 0.0, 1.0]])
+
+##########################################################################
+
+# cache of sampling coordinates used by getStrip, keyed by the image size, rotation, strip width
+# and interpolation method
+_strip_cache = {}
+
+# maximum number of sets of coordinates held in _strip_cache
+_STRIP_CACHE_SIZE = 16
+
+
+def _stripSampler(size, rotation, strip_width, interpolation, fixed_point):
+    """
+    Returns a tuple (rows, columns, weights) of read-only numpy arrays (each of shape 
+    (n, height, strip_width), where n is 1 for "nearest" and 4 for "bilinear" interpolation) which 
+    describe how to sample the strip of columns used by getStrip from the centre of an image of the 
+    specified size after it has been rotated by rotation degrees, without actually rotating it. The 
+    strip is the sum over the first axis of weights * image_array[rows, columns]. Samples which fall 
+    outside of the image have a weight of zero. For nearest neighbour interpolation the coordinates 
+    are calculated in exactly the same way as in PIL's Image.rotate(), fixed_point should be True 
+    unless the image is of a mode (e.g. "I;16") that PIL rotates using floating point arithmetic. The 
+    arrays are cached, so that they only need to be calculated once for a set of images.
+    """
+    key = (tuple(size), rotation, strip_width, interpolation, fixed_point)
+
+    try:
+        return _strip_cache[key]
+    except KeyError:
+        pass
+
+    width, height = size
+    centre = int((float(width) / 2.0) + 0.5) - 1
+    lower_x = centre - int(strip_width / 2)
+    upper_x = centre + int(strip_width / 2.0 + 0.5)
+
+    # pixel coordinates of the strip in the rotated image
+    y, x = numpy.ogrid[0:height, lower_x:upper_x]
+    rotation = rotation % 360.0
+
+    if interpolation == "nearest":
+        if rotation == 180.0 or (rotation in (90.0, 270.0) and width == height):
+            # PIL does these rotations by transposing the image
+            if rotation == 180.0:
+                rows, columns = height - 1 - y, width - 1 - x
+            elif rotation == 90.0:
+                rows, columns = x + 0 * y, width - 1 - y
+            else:
+                rows, columns = height - 1 - x + 0 * y, y + 0 * x
+        else:
+            a = _rotationMatrix(rotation, size)[:2].ravel()
+
+            if fixed_point:
+                # PIL uses 16.16 fixed point arithmetic for nearest neighbour affine transforms
+                def fix(v):
+                    return int(math.floor(v * 65536.0 + 0.5))
+                offset_x = fix(a[2] + a[0] * 0.5 + a[1] * 0.5)
+                offset_y = fix(a[5] + a[3] * 0.5 + a[4] * 0.5)
+                columns = (offset_x + y * fix(a[1]) + x * fix(a[0])) >> 16
+                rows = (offset_y + y * fix(a[4]) + x * fix(a[3])) >> 16
+            else:
+                columns = numpy.floor(a[0] * (x + 0.5) + a[1] * (y + 0.5) + a[2]).astype(int)
+                rows = numpy.floor(a[3] * (x + 0.5) + a[4] * (y + 0.5) + a[5]).astype(int)
+
+        rows = rows[numpy.newaxis]
+        columns = columns[numpy.newaxis]
+        weights = numpy.ones(rows.shape)
+
+    elif interpolation == "bilinear":
+        a = _rotationMatrix(rotation, size)[:2].ravel()
+        source_x = a[0] * (x + 0.5) + a[1] * (y + 0.5) + a[2] - 0.5
+        source_y = a[3] * (x + 0.5) + a[4] * (y + 0.5) + a[5] - 0.5
+        left = numpy.floor(source_x).astype(int)
+        top = numpy.floor(source_y).astype(int)
+        dx = source_x - left
+        dy = source_y - top
+
+        rows = numpy.array([top, top, top + 1, top + 1])
+        columns = numpy.array([left, left + 1, left, left + 1])
+        weights = numpy.array([(1.0 - dx) * (1.0 - dy), dx * (1.0 - dy),
+                               (1.0 - dx) * dy, dx * dy])
+
+    else:
+        raise ValueError("Unsupported interpolation method, expecting \"nearest\" or \"bilinear\"")
+
+    # samples outside of the image are black
+    outside = (rows < 0) | (rows >= height) | (columns < 0) | (columns >= width)
+    weights = numpy.where(outside, 0.0, weights)
+    rows = numpy.where(outside, 0, rows)
+    columns = numpy.where(outside, 0, columns)
+
+    for array in (rows, columns, weights):
+        array.flags.writeable = False
+
+    if len(_strip_cache) >= _STRIP_CACHE_SIZE:
+        _strip_cache.clear()
+    _strip_cache[key] = (rows, columns, weights)
+
+    return rows, columns, weights
+
+##########################################################################
+
+
+class cameraGeometry:
+    """
+    Describes the mapping between pixel coordinates and viewing angles for all-sky images of a given
+    size, centre, radius, field of view and lens projection ("equidistant" or "equisolidangle").
+    Rather than creating these directly, use the getGeometry method of allskyImage, which returns the
+    same object for all images with identical geometries. Arrays of the zenith angle and azimuth of
+    every pixel are calculated the first time they are requested and then kept, so that radial or
+    angular operations on images can be done as numpy expressions over these arrays.
+    """
+
+    def __init__(self, size, x_center, y_center, radius, fov_angle, lens_projection):
+        self.__size = tuple(size)
+        self.__x_center = float(x_center)
+        self.__y_center = float(y_center)
+        self.__radius = float(radius)
+        self.__fov_angle = float(fov_angle)
+        self.__lens_projection = lens_projection
+
+        # calculate focal length
+        if lens_projection == 'equidistant':
+            self.__focal_length = self.__radius / self.__fov_angle
+
+        elif lens_projection == 'equisolidangle':
+            self.__focal_length = self.__radius / \
+                (2.0 * math.sin(math.radians(self.__fov_angle) / 2.0))
+
+        else:
+            raise ValueError("Unsupported lens projection type")
+
+        self.__zenith_angles = None
+        self.__azimuths = None
+
+    ##########################################################################
+
+    def __key(self):
+        return (self.__size, self.__x_center, self.__y_center, self.__radius,
+                self.__fov_angle, self.__lens_projection)
+
+    def __eq__(self, x):
+        if not isinstance(x, cameraGeometry):
+            return NotImplemented
+        return self.__key() == x.__key()
+
+    def __ne__(self, x):
+        result = self.__eq__(x)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(self.__key())
+
+    ##########################################################################
+
+    # define getters
+    def getSize(self):
+        """
+        Returns a tuple (width,height) of the size in pixels of the images.
+        """
+        return self.__size
+
+    def getFov_angle(self):
+        """
+        Returns the field of view angle (in degrees from the zenith) of the images.
+        """
+        return self.__fov_angle
+
+    def getLensProjection(self):
+        """
+        Returns a string containing the lens projection of the images.
+        """
+        return self.__lens_projection
+
+    def getAzimuths(self):
+        """
+        Returns a read-only numpy array (of shape (height, width)) of the azimuth of each pixel, that
+        is the angle (in degrees, 0-360) of the pixel from the centre of the image, measured clockwise
+        from the top of the image. The orientation of the camera is not taken into account.
+        """
+        if self.__azimuths is None:
+            y, x = numpy.ogrid[0:self.__size[1], 0:self.__size[0]]
+            azimuths = numpy.degrees(numpy.arctan2(x - self.__x_center,
+                                                   self.__y_center - y)) % 360.0
+            azimuths.flags.writeable = False
+            self.__azimuths = azimuths
+
+        return self.__azimuths
+
+    def getZenithAngles(self):
+        """
+        Returns a read-only numpy array (of shape (height, width)) of the angle from the zenith (in
+        degrees) of each pixel, see xy2angle. Pixels which are too far from the centre of the image
+        to be mapped to an angle by the lens projection are set to NaN.
+        """
+        if self.__zenith_angles is None:
+            y, x = numpy.ogrid[0:self.__size[1], 0:self.__size[0]]
+            zenith_angles = self.xy2angle(x, y)
+            zenith_angles.flags.writeable = False
+            self.__zenith_angles = zenith_angles
+
+        return self.__zenith_angles
+
+    ##########################################################################
+
+    def angle2dist(self, angle):
+        """
+        Converts an angle (in degrees) from zenith into a radial distance in pixels from the image
+        centre. The angle can be a number or a numpy array of angles. Unlike allskyImage.angle2dist
+        the distance is not rounded to a whole number of pixels.
+        """
+        if self.__lens_projection == 'equidistant':
+            return self.__focal_length * numpy.asarray(angle, dtype=float)
+
+        return 2.0 * self.__focal_length * numpy.sin(numpy.radians(angle) / 2.0)
+
+    ##########################################################################
+
+    def xy2angle(self, x, y):
+        """
+        Converts x and y pixel coordinates into an angle from the zenith (from the Z axis). The angle
+        returned is in degrees. Note that (x,y)=(0,0) is the top left corner of the image. The
+        coordinates can be numbers or numpy arrays (which are broadcast together). Coordinates which
+        are too far from the centre of the image to be mapped to an angle by the lens projection
+        give NaN.
+        """
+        dist_from_center = numpy.hypot(numpy.subtract(x, self.__x_center),
+                                       numpy.subtract(y, self.__y_center))
+
+        if self.__lens_projection == 'equidistant':
+            return dist_from_center / self.__focal_length
+
+        with numpy.errstate(invalid='ignore'):
+            return numpy.degrees(2.0 * numpy.arcsin(dist_from_center /
+                                                    (2.0 * self.__focal_length)))
+
+    ##########################################################################
+##########################################################################
+
+
+class deferredImage:
+    """
+    Stands in for the PIL image passed to the allskyImage constructor, so that the image data is 
+    not read from file (and decoded) until it is first needed. The loader argument should be a 
+    function (taking no arguments) which returns the PIL image, which must have the specified mode
+    and size (a (width, height) tuple). Plugins can use this (see allskyImagePlugins.deferred_image)
+    so that allskyImage objects which are only used for their metadata never read the image data.
+    """
+
+    def __init__(self, loader, mode, size):
+        self.__loader = loader
+        self.__mode = mode
+        self.__size = tuple(size)
+        self.__image = None
+        self.__lock = threading.Lock()
+
+    ##########################################################################
+
+    def __getstate__(self):
+        # locks can't be pickled (or deep copied), so a new one is created by __setstate__
+        state = self.__dict__.copy()
+        del state['_deferredImage__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    ##########################################################################
+
+    def getMode(self):
+        """
+        Returns the mode of the image.
+        """
+        return self.__mode
+
+    def getSize(self):
+        """
+        Returns a tuple (width,height) of the size in pixels of the image.
+        """
+        return self.__size
+
+    ##########################################################################
+
+    def load(self):
+        """
+        Returns the PIL image, calling the loader and reading the image data the first time that it 
+        is called. Raises IOError if the image returned by the loader does not have the expected mode
+        and size.
+        """
+        with self.__lock:
+            if self.__image is None:
+                image = self.__loader()
+                image.load()
+
+                if image.mode != self.__mode or image.size != self.__size:
+                    raise IOError("Image data does not match the image header, expecting a " +
+                                  self.__mode + " image of size " + str(self.__size) + " got a " +
+                                  image.mode + " image of size " + str(image.size))
+
+                self.__image = image
+                self.__loader = None
+
+        return self.__image
+
+    ##########################################################################
+##########################################################################
+
+
 class allskyImage:
     """
     Holds both the image data and the image metadata associated with an all-sky image. Provides methods
@@ -106,8 +659,15 @@ class allskyImage:
 
         # set private class attributes
         self.__loaded = False  # shows if the image data has been loaded yet.
-        self.__image = image  # .copy()
-        self.__image.__info = {}
+        if isinstance(image, deferredImage):
+            # the image data is only read when it is first needed, see
+            # __getDecodedImage
+            self.__deferred_image = image
+            self.__decoded_image = None
+        else:
+            self.__deferred_image = None
+            self.__decoded_image = image  # .copy()
+        self.__array = None  # see getArray()
         self.__filename = image_file
         self.__info = {}
 
@@ -124,6 +684,23 @@ class allskyImage:
 
     ##########################################################################
 
+    def __getDecodedImage(self):
+        """
+        Returns the PIL image of the image data, reading it first if it has been deferred.
+        """
+        deferred_image = self.__deferred_image
+        if deferred_image is not None:
+            self.__decoded_image = deferred_image.load()
+            self.__deferred_image = None
+            self.__loaded = True
+
+        return self.__decoded_image
+
+    # the PIL image used by all the methods that need the image data
+    __image = property(__getDecodedImage)
+
+    ##########################################################################
+
     # define setter
 
     def setInfo(self, key, field, value):
@@ -138,8 +715,11 @@ class allskyImage:
     def getSize(self):
         """
         Returns a tuple (width,height) containing the size in pixels of the image (equivalent to 
-        self.getImage().size)"""
-        return self.__image.size
+        self.getImage().size). This does not need the image data to be read."""
+        deferred_image = self.__deferred_image
+        if deferred_image is not None:
+            return deferred_image.getSize()
+        return self.__decoded_image.size
 
     def getFilename(self):
         """
@@ -153,6 +733,22 @@ class allskyImage:
         Returns a PIL image object which is a copy of the all-sky image"""
         return self.__image.copy()
 
+    def getArray(self):
+        """
+        Returns a read-only numpy array of the pixel values of the image, with shape (height, width, 
+        bands), where bands is 1 for L and I mode images and 3 for RGB images. Unlike getImage(),
+        this does not copy the image data each time it is called - the array is created the first
+        time it is needed and is then shared by all calls. Use numpy.array(im.getArray()) to get a
+        copy which can be modified."""
+        if self.__array is None:
+            array = numpy.asarray(self.__image)
+            if array.ndim == 2:
+                array = array.reshape(array.shape + (1,))
+            array.flags.writeable = False
+            self.__array = array
+
+        return self.__array
+
     def getInfo(self):
         """
         Returns a dictionary object containing four dictionaries ('header','camera', 'processing', 'exif')
@@ -174,8 +770,17 @@ class allskyImage:
     def getMode(self):
         """
         Returns a string containing the mode of the image ("RGB","L" etc...). See PIL handbook for 
-        details of different image modes"""
-        return self.__image.mode
+        details of different image modes. This does not need the image data to be read."""
+        deferred_image = self.__deferred_image
+        if deferred_image is not None:
+            return deferred_image.getMode()
+        return self.__decoded_image.mode
+
+    def getGeometry(self):
+        """
+        Returns a cameraGeometry object describing the mapping between pixel coordinates and angles
+        for the image. This is shared between all images with the same size and camera info."""
+        return _getGeometry(self.getSize(), self.__info['camera'])
 
     def getColourTable(self):
         try:
@@ -183,6 +788,31 @@ class allskyImage:
         except KeyError:
             return None
 
+    def lazy(self):
+        """
+        Returns a lazyImage object, which records any processing methods called on it (e.g. 
+        binaryMask, centerImage, alignNorth, applyColourTable) and only runs them when the image
+        data is actually needed, see lazyImage. For example:
+
+            im = allskyImage.new("image.png").lazy()
+            im = im.binaryMask(75).centerImage().alignNorth().resize((500, 500))
+            im.save("processed.png")  # processing is done here
+        """
+        return lazyImage(self)
+
+    def load(self):
+        """
+        Reads the image data from file if it has not already been read. Images are normally only
+        read from file when their data is first needed (see deferredImage), this allows the (slow)
+        reading to be done at a time of your choosing, e.g. in a background thread."""
+        self.__image.load()
+
+    def isLoaded(self):
+        """
+        Returns True if the image data has been read from file, and False if reading it has been
+        deferred until it is needed (see deferredImage)."""
+        return self.__deferred_image is None
+
     ##########################################################################
 
     def absoluteCalibration(self, spectral_responsivity, exposure_time, const_factor=1.0):
@@ -289,56 +919,12 @@ class allskyImage:
         # copy the info dict, ready to create a new allskyImage
         new_info = self.getInfo()
 
-        # align the image with geographic north
-        try:
-            if new_info['processing']['alignNorth'].count('NESW') != 0:
-                # rotate clockwise since the Image is in a NESW orientation
-                new_image = self.__image.rotate(-
-                                                float(new_info['camera']['cam_rot']))
-            elif new_info['processing']['alignNorth'].count('NWSE') != 0:
-                # rotate anti-clockwise since the Image is in a NWSE
-                # orientation
-                new_image = self.__image.rotate(
-                    float(new_info['camera']['cam_rot']))
+        new_image = self.__image
+        for operation, angle in _alignNorthSteps(new_info, north, orientation):
+            if operation == "rotate":
+                new_image = new_image.rotate(angle)
             else:
-                # this image was alignedNorth using an old version of PASKIL and
-                # is therefore in a NESW orientation
-                # rotate clockwise since the Image is in a NESW orientation
-                new_image = self.__image.rotate(-
-                                                float(new_info['camera']['cam_rot']))
-                new_info['processing']['alignNorth'] = new_info[
-                    'processing']['alignNorth'] + "(NESW)"
-
-        except KeyError:
-            # the image hasn't been aligned North before, we assume it is in
-            # NWSE orientation and change the info to reflect this
-            new_info['processing']['alignNorth'] = "(NWSE)"
-            new_image = self.__image.rotate(
-                float(new_info['camera']['cam_rot']))
-        new_info['camera']['cam_rot'] = "0.0"
-
-        # if the image does not already have the correct orientation then
-        # flip it east west
-        if new_info['processing']['alignNorth'].count(orientation) == 0:
-            new_image = ImageOps.mirror(new_image)
-
-        if north == "geomagnetic":
-            if orientation == 'NESW':
-                new_image = new_image.rotate(
-                    float(new_info['camera']['Magn. Bearing']))
-            elif orientation == 'NWSE':
-                new_image = new_image.rotate(-
-                                             float(new_info['camera']['Magn. Bearing']))
-            else:
-                raise ValueError
-
-            new_info['camera']['cam_rot'] = new_info['camera']['Magn. Bearing']
-
-        elif north != "geographic":
-            raise ValueError
-
-        # update processing history
-        new_info['processing']['alignNorth'] = north + " (" + orientation + ")"
+                new_image = ImageOps.mirror(new_image)
 
         # return a new allskyImage instance
         return allskyImage(new_image, self.__filename, new_info)
@@ -348,35 +934,21 @@ class allskyImage:
     def angle2dist(self, angle):
         """
         Converts an angle (in degrees) from zenith into a radial distance in pixels
-        from the image centre.
+        from the image centre. The angle can also be a numpy array of angles, in which case
+        an array of distances is returned.
         """
-        if self.__info['camera']['lens_projection'] == 'equidistant':
-            # calculate focal length
-            focal_length = float(
-                self.__info['camera']['Radius']) / float(self.__info['camera']['fov_angle'])
-
-            # calculate radius for masking circle
-            radius = int(round(focal_length * angle))
-
-        elif self.__info['camera']['lens_projection'] == 'equisolidangle':
-            # calculate focal length
-            focal_length = float(self.__info['camera'][
-                                 'Radius']) / (2.0 * math.sin(math.radians(float(self.__info['camera']['fov_angle'])) / 2.0))
-
-            # calculate radius for masking circle
-            radius = int(
-                round(2.0 * focal_length * math.sin(math.radians(angle) / 2.0)))
+        dist = self.getGeometry().angle2dist(angle)
 
-        else:
-            raise ValueError("Unsupported lens projection type")
+        if numpy.ndim(dist) == 0:
+            return int(round(float(dist)))
 
-        return radius
+        return numpy.rint(dist).astype(int)
 
     ##########################################################################
 
     def applyColourTable(self, colour_table):
         """
-        Applies a colour table to the image, converting the image mode from ``L'' to ``RGB''. 
+        Applies a colour table to the image, converting the image mode from ``L'' (or ``I'') to ``RGB''. 
         The colour_table argument should be a colourTable object as defined in the allskyColour 
         module.
         """
@@ -394,26 +966,14 @@ class allskyImage:
             raise RuntimeError(
                 "A colour table has already been applied to " + self.__filename)
 
-        # get a copy of the image
-        new_image = self.getImage()
-
-        # apply colour table
-        # PIL doesn't support 16bit images, so need to use own routine if "I"
-        # mode image
-        if self.__image.mode != "I":
-            new_image.putpalette(colour_table.getColourTable())
-        else:
-            RGB_image = Image.new("RGB", new_image.size, "Black")
-            image_pix = new_image.load()
-            RGB_pix = RGB_image.load()
-
-            for x in range(RGB_image.size[0]):
-                for y in range(RGB_image.size[1]):
-                    RGB_pix[x, y] = colour_table.colour_table[image_pix[x, y]]
+        # apply colour table by using the pixel values as indices into the lookup table. PIL
+        # doesn't support palettes for 16bit images, so this is used for all modes
+        image_arr = self.getArray()[:, :, 0]
+        if not numpy.issubdtype(image_arr.dtype, numpy.integer):
+            raise ValueError("Cannot apply a colour table to a " + self.__image.mode +
+                             " mode image")
 
-            new_image = RGB_image
-
-        new_image = new_image.convert("RGB")
+        new_image = Image.fromarray(colour_table.getLookupTable()[image_arr])
 
         # copy the info
         new_info = self.getInfo()
@@ -439,53 +999,21 @@ class allskyImage:
 
         mode = self.__image.mode
 
-        if mode == "I":
+        if mode == "I" or mode == "I;16":
             white = 65535
-        elif mode == "L":
+        elif mode == "L" or mode == "RGB":
             white = 255
-        elif mode == "RGB":
-            white = (255, 255, 255)
         else:
             raise ValueError("Unsupported image mode")
 
-        # calculate bounding box for the circle
-        bb_left = int(self.__info['camera']['x_center']) - radius
-        bb_top = int(self.__info['camera']['y_center']) - radius
-        bb_right = int(self.__info['camera']['x_center']) + radius
-        bb_bottom = int(self.__info['camera']['y_center']) + radius
-
-        # create a black mask image
-        mask = Image.new(mode, self.__image.size, "Black")
+        mask = _circleMask(self.__image.size, int(self.__info['camera']['x_center']),
+                           int(self.__info['camera']['y_center']), radius)
 
-        # draw white circle
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((bb_left, bb_top, bb_right, bb_bottom), fill=white)
+        # set the pixels outside of the circle to black (or white if inverted)
+        im_pix = self.getArray().copy()
+        im_pix[~mask] = white if inverted else 0
 
-        # apply the mask to the image
-        if mode == "L" or mode == "RGB":
-            if inverted:
-                mask = ImageChops.invert(mask)
-                new_image = ImageChops.lighter(self.__image, mask)
-            else:
-                new_image = ImageChops.multiply(self.__image, mask)
-
-        elif mode == "I":
-            # if the image is 16bit then cannot use the ImageChops module, so
-            # use own multiplication routine
-            if inverted:
-                im_pix = numpy.asarray(self.__image)
-                mask_pix = numpy.asarray(mask)
-
-                new_image = Image.fromarray(
-                    numpy.maximum(im_pix, 65535 - mask_pix))
-
-            else:
-                im_pix = numpy.asarray(self.__image)
-                mask_pix = numpy.asarray(mask)
-
-                new_image = Image.fromarray(numpy.minimum(im_pix, mask_pix))
-        else:
-            raise ValueError("Unsupported image mode")
+        new_image = _fromArray(im_pix)
 
         new_info = self.getInfo()
 
@@ -515,27 +1043,7 @@ class allskyImage:
                 "Image " + self.__filename + " has already been centered")
 
         # first, the image field of view is centered in the image
-        # get the bounding box of the image (box around non-zero parts of the
-        # image)
-        r = int(self.__info['camera']['Radius'])
-        x_0 = int(self.__info['camera']['x_center'])
-        y_0 = int(self.__info['camera']['y_center'])
-        width, height = self.__image.size
-
-        left = x_0 - r
-        if left < 0:
-            left = 0
-        right = x_0 + r
-        if right > (width - 1):
-            right = width - 1
-        upper = y_0 - r
-        if upper < 0:
-            upper = 0
-        lower = y_0 + r
-        if lower > height - 1:
-            lower = height
-
-        bounding_box = (left, upper, right, lower)
+        bounding_box, paste_box, size = _centerBoxes(self.__info['camera'], self.__image.size)
 
         # crop the image to the size of the bounding box
         new_image = self.__image.crop(bounding_box)
@@ -544,14 +1052,11 @@ class allskyImage:
         # (theoretical) circular field of view. This is done to allow PASKIL to
         # cope with images taken with non-circular fields of view.
 
-        # create new square image with dimensions RadiusxRadius
-        square_image = Image.new(
-            self.__image.mode, (2 * r, 2 * r), color='black')
+        # create new square image with dimensions 2*Radiusx2*Radius
+        square_image = Image.new(self.__image.mode, size, color='black')
 
         # paste image into correct position in square image.
-        width, height = new_image.size
-        square_image.paste(new_image, (r - int(width / 2), r - int(height / 2),
-                                       r - int(width / 2) + width, r - int(height / 2) + height))
+        square_image.paste(new_image, paste_box)
 
         # create a new info dictionary
         new_info = self.getInfo()
@@ -647,25 +1152,18 @@ class allskyImage:
         if list(self.__info['processing'].keys()).count('flatFieldCorrection') != 0:
             warnings.warn("Image has already been calibrated")
 
-        new_image = self.getImage()  # copy image
-        image_pix = new_image.load()  # load pixel values
+        correction = _flatFieldMap(self.getGeometry(), calibration.calibration_data)
 
-        for x in range(new_image.size[0]):  # for x in range image width
-            for y in range(new_image.size[1]):  # for y in range image height
-                # for each x,y find the angle from the center
-                angle = self.xy2angle(x, y)
+        # apply the correction to all the pixels (and bands) at once
+        image_arr = self.getArray()
+        new_arr = image_arr * correction[:, :, numpy.newaxis]
 
-                # skip angles outside of the field of view
-                if angle >= self.__info['camera']['fov_angle']:
-                    continue
+        if numpy.issubdtype(image_arr.dtype, numpy.integer):
+            # round to nearest integer, limiting values to the range of the mode
+            limits = numpy.iinfo(image_arr.dtype)
+            new_arr = numpy.clip(numpy.floor(new_arr + 0.5), limits.min, limits.max)
 
-                # apply correction to pixels inside the field of view
-                gradient = calibration.calibration_data[
-                    int(angle) + 1] - calibration.calibration_data[int(angle)]
-                correction = 1.0 / \
-                    (calibration.calibration_data[
-                     int(angle)] + (angle - float(int(angle))) * gradient)
-                image_pix[x, y] = int((image_pix[x, y] * correction) + 0.5)
+        new_image = _fromArray(new_arr.astype(image_arr.dtype))
 
         # update processing history
         new_info = self.getInfo()
@@ -674,56 +1172,81 @@ class allskyImage:
         return allskyImage(new_image, self.__filename, new_info)
 
     ##########################################################################
-    def getStrip(self, angle, strip_width):
-
+    def getStrip(self, angle, strip_width, interpolation="nearest"):
+        """
+        Returns a numpy array (of shape (strip_width, 2*Radius, bands)) of the pixel values along the 
+        meridian of the image at the specified angle (in degrees from north). The image must have been 
+        aligned with north. Rather than rotating the whole image, only the pixels in the strip are 
+        sampled. With "nearest" interpolation (the default) the strip is identical to the one taken from
+        an image rotated with PIL, "bilinear" interpolation can also be used.
+        """
         # check that image has been aligned with north (if so then it must have
         # been centred)
         if list(self.__info['processing'].keys()).count('alignNorth') == 0:
             raise RuntimeError("Image must be aligned with North.")
 
-        # rotate image so that the slice runs from top to bottom
-        # the rotation direction depends on the orientation of the image
-        im = self.__image  # in case no rotation is needed
-        if (angle - float(self.__info['camera']['cam_rot'])) != 0.0:
-            if self.__info['processing']['alignNorth'].count('NESW') != 0:
-                im = self.__image.rotate(
-                    angle - float(self.__info['camera']['cam_rot']))
-            elif self.__info['processing']['alignNorth'].count('NWSE') != 0:
-                im = self.__image.rotate(
-                    float(self.__info['camera']['cam_rot']) - angle)
+        # work out how much the image needs to be rotated so that the slice runs
+        # from top to bottom, the rotation direction depends on the orientation
+        # of the image
+        rotation = angle - float(self.__info['camera']['cam_rot'])
+        if rotation != 0.0 and self.__info['processing']['alignNorth'].count('NESW') == 0:
+            if self.__info['processing']['alignNorth'].count('NWSE') != 0:
+                rotation = -rotation
             else:
                 raise ValueError(
                     "getStrip(): Cannot read orientation data from info dict. Try re-aligning the image with North")
 
-        # convert the rotated image to a numpy array (im is a PIL Image object)
-        im_arr = numpy.asarray(im)
+        im_arr = self.getArray()
+        width = self.getSize()[0]
 
-        # ensure the array is 3d even if we are not dealing with an RGB image
-        if len(im_arr.shape) == 2:
-            im_arr = im_arr.reshape((im_arr.shape[0], im_arr.shape[1], 1))
+        if rotation == 0.0 and interpolation == "nearest":
+            # no rotation needed, so the strip can just be sliced out of the image
+            centre = int((float(width) / 2.0) + 0.5) - 1
+            strip_arr = im_arr[:, centre - int(strip_width / 2):centre + int(strip_width / 2.0 + 0.5), :]
+        else:
+            # sample the strip directly from the unrotated image (the sampling
+            # coordinates are cached, so are only calculated once per geometry)
+            rows, columns, weights = _stripSampler(self.getSize(), rotation, strip_width, interpolation,
+                                                   not self.getMode().startswith("I;16"))
+            samples = im_arr[rows, columns]
+
+            if interpolation == "nearest":
+                strip_arr = samples[0] * (weights[0] > 0.0)[:, :, numpy.newaxis]
+            else:
+                strip_arr = (samples * weights[:, :, :, numpy.newaxis]).sum(axis=0)
+                if numpy.issubdtype(im_arr.dtype, numpy.integer):
+                    strip_arr = numpy.floor(strip_arr + 0.5)
+                strip_arr = strip_arr.astype(im_arr.dtype)
 
         radius = int(self.__info['camera']['Radius'])
-        # calculate bounding indices of slice
-        width = im.size[0]
-        centre = int((float(width) / 2.0) + 0.5) - 1
-
-        lower_x = centre - int(strip_width / 2)
-        upper_x = centre + int(strip_width / 2.0 + 0.5)
 
         # create an array of zeros to hold the strip data
         strip = numpy.zeros(
-            (2 * radius, upper_x - lower_x, im_arr.shape[2]), im_arr.dtype)
+            (2 * radius, strip_arr.shape[1], im_arr.shape[2]), im_arr.dtype)
 
         # the radius of the image may be larger than the image dimensions, in which
         # case we ensure that the strip is padded with zeros to the size of the
         # radius
         lower_y = int(((2 * radius) - im_arr.shape[0]) / 2)
         upper_y = im_arr.shape[0] + lower_y
-        strip[lower_y:upper_y, :, :] = im_arr[:, lower_x:upper_x, :]
+        strip[lower_y:upper_y, :, :] = strip_arr
         return strip.swapaxes(0, 1)
 
     ##########################################################################
 
+    def getStrips(self, angles, strip_width, interpolation="nearest"):
+        """
+        Returns a list of the strips (see getStrip) along the meridians of the image at each of the 
+        angles in the angles list. The image data is only read once, so this is faster than calling 
+        getStrip for each angle separately.
+        """
+        # read the image data before taking any of the strips
+        self.getArray()
+
+        return [self.getStrip(angle, strip_width, interpolation) for angle in angles]
+
+    ##########################################################################
+
     def histogram(self):
         """
         Returns a histogram of the image. For 'L' mode images this will be a list of 
@@ -736,7 +1259,7 @@ class allskyImage:
             # use PIL histogram method for 8bit images
             histogram = self.__image.histogram()
         elif mode == "I":
-            im_pix = numpy.asarray(self.__image)  # load pixel values
+            im_pix = self.getArray()  # load pixel values
             histogram = numpy.histogram(im_pix, bins=list(range(65537)))[0]
 
         else:
@@ -754,8 +1277,7 @@ class allskyImage:
         """
 
         # make a copy of self to draw onto
-        im = self.getImage()
-        im = im.convert("RGB")
+        im = self.__image.convert("RGB")
 
         # rotate image so that the slice runs from top to bottom
         # check that image has been aligned with north (if so then it must have
@@ -887,6 +1409,78 @@ class allskyImage:
 
     ##########################################################################
 
+    def preprocess(self, fov_angle=None, north="geographic", orientation='NESW'):
+        """
+        Equivalent to self.binaryMask(fov_angle).centerImage().alignNorth(north, orientation), but
+        much faster. Rather than creating a new image for each step, the cropping and the rotation 
+        by the camera rotation are combined into a single transformation of the (masked) image. Any 
+        mirroring and the rotation to geomagnetic north are then applied to the result in the same 
+        way as alignNorth does, so the returned image is identical to the one produced by the 
+        separate calls. If fov_angle is None (the default) then the field of view of the image is used. The
+        image must not have been centred already.
+        """
+        if 'centerImage' in self.__info['processing']:
+            raise RuntimeError("Image " + self.__filename + " has already been centered")
+
+        if fov_angle is None:
+            fov_angle = self.__info['camera']['fov_angle']
+
+        if fov_angle > self.__info['camera']['fov_angle']:
+            raise ValueError("Field of view is too large for image.")
+
+        if self.__image.mode not in ("L", "I", "I;16", "RGB"):
+            raise ValueError("Unsupported image mode")
+
+        # work out the info for the returned image (see binaryMask, centerImage and alignNorth)
+        radius = self.angle2dist(fov_angle)
+        new_info = self.getInfo()
+        new_info['camera']['Radius'] = radius
+        new_info['camera']['fov_angle'] = fov_angle
+        new_info['processing']['binaryMask'] = str(fov_angle)
+
+        bounding_box, paste_box, size = _centerBoxes(new_info['camera'], self.__image.size)
+        new_info['camera']['x_center'] = int((size[0] / 2) + 0.5)
+        new_info['camera']['y_center'] = int((size[1] / 2) + 0.5)
+        new_info['processing']['centerImage'] = ""
+
+        steps = _alignNorthSteps(new_info, north, orientation)
+
+        # mask the image, also blanking anything outside of the region that centerImage crops out
+        mask = _circleMask(self.__image.size, int(self.__info['camera']['x_center']),
+                           int(self.__info['camera']['y_center']), radius)
+        im_pix = self.getArray().copy()
+        im_pix[~mask] = 0
+        left, upper, right, lower = bounding_box
+        im_pix[:upper] = 0
+        im_pix[lower:] = 0
+        im_pix[:, :left] = 0
+        im_pix[:, right:] = 0
+
+        # build the matrix which maps pixel coordinates in the returned image back to coordinates
+        # in this one, by combining the (inverse) transformations of each step
+        matrix = numpy.array([[1.0, 0.0, float(left - paste_box[0])],
+                              [0.0, 1.0, float(upper - paste_box[1])],
+                              [0.0, 0.0, 1.0]])
+
+        # only the first rotation can be combined with the crop without changing which pixel gets
+        # picked when a coordinate is rounded, so any mirroring and the rotation to geomagnetic north
+        # are applied separately in exactly the same way as alignNorth does
+        angle = steps.pop(0)[1]
+        matrix = numpy.dot(matrix, _rotationMatrix(angle, size))
+
+        new_image = _fromArray(im_pix).transform(size, Image.AFFINE,
+                                                 tuple(matrix[:2].ravel()), Image.NEAREST)
+
+        for operation, angle in steps:
+            if operation == "rotate":
+                new_image = new_image.rotate(angle)
+            else:
+                new_image = ImageOps.mirror(new_image)
+
+        return allskyImage(new_image, self.__filename, new_info)
+
+    ##########################################################################
+
     def projectToHeight(self, height, grid_size=300, background='black'):
         """
         Returns a projection object which can be used to create map projections of the allsky image.
@@ -1245,15 +1839,15 @@ class allskyImage:
                 self.__image, background.getImage())
         else:
             # convert to numpy arrays, subtract and convert back
-            im_arr = numpy.asarray(self.__image)
-            bkgd_arr = numpy.asarray(background.getImage())
+            im_arr = self.getArray()
+            bkgd_arr = background.getArray()
 
             result = im_arr - bkgd_arr
 
             # replace negative numbers with zero
             result = result * (result > 0)
 
-            new_image = Image.fromarray(result)
+            new_image = _fromArray(result)
 
         new_info = self.getInfo()
 
@@ -1267,36 +1861,121 @@ class allskyImage:
         """
         Converts x and y pixel coordinates into an angle from the zenith (from the Z axis).
         The angle returned is in degrees. Note that (x,y)=(0,0) is the top left corner of
-        the image.
+        the image. The coordinates can also be numpy arrays, in which case an array of angles
+        is returned (with NaN for any coordinates which cannot be mapped to an angle by the 
+        lens projection), see cameraGeometry.
         """
-        x_0 = self.__info['camera']['x_center']
-        y_0 = self.__info['camera']['y_center']
+        angle = self.getGeometry().xy2angle(x, y)
 
-        dist_from_center = math.sqrt(
-            ((x - x_0) * (x - x_0)) + ((y - y_0) * (y - y_0)))
+        if numpy.ndim(angle) == 0:
+            if numpy.isnan(angle):
+                raise ValueError("Pixel coordinates are outside of the range of the lens projection")
+            return float(angle)
 
-        if self.__info['camera']['lens_projection'] == 'equidistant':
-            # calculate focal length
-            focal_length = float(
-                self.__info['camera']['Radius']) / float(self.__info['camera']['fov_angle'])
+        return angle
 
-            # calculate the angle
-            angle = dist_from_center / focal_length
+##########################################################################
 
-        elif self.__info['camera']['lens_projection'] == 'equisolidangle':
 
-            # calculate focal length
-            focal_length = float(self.__info['camera'][
-                                 'Radius']) / (2.0 * math.sin(math.radians(float(self.__info['camera']['fov_angle'])) / 2.0))
+class lazyImage:
+    """
+    Records a chain of allskyImage processing methods without running them, so that the image data
+    is only processed when it is actually needed. Create one using the lazy() method of allskyImage.
+    The processing methods (binaryMask, centerImage, alignNorth, flatFieldCorrection, 
+    applyColourTable, resize etc.) return a new lazyImage with the operation added to the chain. 
+    Calling any other method (e.g. getImage, getInfo, save or getStrip) runs the chain and then 
+    calls the method of the resulting allskyImage. Only one intermediate image is held in memory at
+    a time whilst the chain runs, and a binaryMask, centerImage, alignNorth sequence is run as a 
+    single preprocess() call. Note that any errors in the chain (e.g. aligning an image that has 
+    not been centered) are raised when the chain runs, not when the methods are called.
+    """
 
-            # calculate angle
-            angle_radians = 2.0 * \
-                math.asin(dist_from_center / (2.0 * focal_length))
-            angle = math.degrees(angle_radians)
+    # allskyImage methods which return a new allskyImage and can be recorded
+    __recordable = ("absoluteCalibration", "addTimeStamp", "alignNorth", "applyColourTable",
+                    "binaryMask", "centerImage", "convertTo8bit", "flatFieldCorrection",
+                    "medianFilter", "preprocess", "resize", "subtractBackgroundImage")
 
-        else:
-            raise ValueError("Unsupported lens projection type")
+    def __init__(self, image, operations=()):
+        self.__image = image
+        self.__operations = tuple(operations)
+        self.__result = None
 
-        return angle
+    ##########################################################################
+
+    def __getattr__(self, name):
+        # only called for attributes which are not found in the normal way
+        if name in lazyImage.__recordable:
+            def record(*args, **kwargs):
+                return lazyImage(self.__image, self.__operations + ((name, args, kwargs),))
+            return record
+
+        if name.startswith("__") or name.startswith("_lazyImage__"):
+            raise AttributeError(name)
+
+        return getattr(self.compute(), name)
+
+    ##########################################################################
+
+    def getFilename(self):
+        """
+        Returns a string containg the filename of the image (this does not need the processing to be
+        run).
+        """
+        return self.__image.getFilename()
+
+    def getOperations(self):
+        """
+        Returns a list of the names of the processing methods which have been recorded, in the order
+        that they will be run.
+        """
+        return [operation[0] for operation in self.__operations]
+
+    ##########################################################################
+
+    def compute(self):
+        """
+        Runs the recorded processing methods and returns the resulting allskyImage object. The 
+        result is kept, so the processing is only done once.
+        """
+        if self.__result is not None:
+            return self.__result
+
+        image = self.__image
+        operations = [(name, _bindArguments(name, args, kwargs))
+                      for name, args, kwargs in self.__operations]
+
+        i = 0
+        while i < len(operations):
+            name, arguments = operations[i]
+
+            if ([x[0] for x in operations[i:i + 3]] == ["binaryMask", "centerImage", "alignNorth"]
+                    and not arguments['inverted']
+                    and 'centerImage' not in image.getInfo()['processing']):
+                # do the masking, centering and alignment with a single resample
+                image = image.preprocess(arguments['fov_angle'], **operations[i + 2][1])
+                i += 3
+                continue
+
+            image = getattr(image, name)(**arguments)
+            i += 1
+
+        self.__result = image
+        return image
+
+    ##########################################################################
+##########################################################################
+
+
+def _bindArguments(name, args, kwargs):
+    """
+    Returns a dict of the values of all the arguments (including defaults) of the named allskyImage
+    method, if it were called with args and kwargs.
+    """
+    arguments = inspect.signature(getattr(allskyImage, name)).bind(None, *args, **kwargs)
+    arguments.apply_defaults()
+    arguments = dict(arguments.arguments)
+    arguments.pop('self')
+
+    return arguments
 
 ##########################################################################
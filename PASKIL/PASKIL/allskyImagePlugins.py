@@ -139,6 +139,32 @@ Writing Your Own Plugin:
     
     In order to create the exif dictionary there is a readExifData function in the misc module. This returns a dictionary
     containing the exif data stored in an image.
+    
+    Plugins may optionally also provide a read_header method, taking the same arguments as open. This should return a 
+    tuple (info, mode) of the info dictionary (in the same format as passed to the allskyImage constructor) and the 
+    mode that the image returned by open would have, without decoding the pixel data. This allows PASKIL to index large 
+    numbers of images (for example when creating a dataset) at the cost of reading their metadata rather than the cost 
+    of decoding them. Plugins which do not provide a read_header method are still supported, but their images will be 
+    fully opened when only their metadata is needed.
+    
+    To avoid testing every file with every plugin, plugins may also have a magic attribute and an extensions attribute.
+    The magic attribute should be a tuple of the byte strings that files of the type can start with (for example 
+    (b"\x89PNG\r\n\x1a\n",) for png files), and the extensions attribute a tuple of the file extensions (for example
+    (".NEF",), case is ignored) that files of the type can have. The test method of a plugin is only called for files 
+    which match these attributes. PASKIL also remembers which plugin last opened a file in each directory and tries 
+    it first for files with the same extension. The test method should still check the file fully.
+    
+    The image_filename argument passed to the plugin methods is an imageFile object. This is a subclass of str (so it 
+    can be used as a normal filename), which also provides the getImage, getExif and getHDUList methods. These return 
+    the PIL image, exif data and pyfits HDUList of the file, opening it only the first time they are called, so that 
+    the file is not re-opened by each method of the plugin. Use get_image_file(image_filename) in your plugin to get an 
+    imageFile object regardless of whether your plugin method was passed one or a plain filename.
+    
+    Rather than passing a PIL image to the allskyImage constructor, the open method of a plugin can pass an 
+    allskyImage.deferredImage object. This holds the mode and size of the image and a function to read it, and means
+    that the image data is only read if it is actually needed (many uses of allskyImage objects only need their 
+    metadata). For images that PIL can read, the deferred_image(image_filename, mode=None) function returns a 
+    deferredImage which re-opens the file with PIL (and converts it to mode if given) when the data is needed.
 
     
         
@@ -146,13 +172,22 @@ Writing Your Own Plugin:
 
 
 from PASKIL import misc
+import functools
+import numpy
 import pyfits
+import os.path
 import sys
 from gi.repository import GExiv2 as pyexiv2
 from PIL import Image, ImageOps
 
 types = []  # list to hold all available plugins
 
+# cache of the plugins that were last used to open files, keyed by the directory and extension of the file
+__plugin_cache = {}
+
+# number of bytes read from the start of a file to compare with the plugins' magic attributes
+MAGIC_LENGTH = 16
+
 
 ##########################################################################
 
@@ -179,23 +214,136 @@ def which_plugin(image_filename, info_filename=None, force=False):
 ##########################################################################
 
 
+def get_image_file(image_filename):
+    """
+    Returns an imageFile object for the specified filename. If image_filename is already an imageFile 
+    object then it is returned unchanged, so that the files it has already opened can be reused.
+    """
+    if isinstance(image_filename, imageFile):
+        return image_filename
+    return imageFile(image_filename)
+
+##########################################################################
+
+
+def deferred_image(image_filename, mode=None):
+    """
+    Returns an allskyImage.deferredImage object for the specified file, which can be passed to the 
+    allskyImage constructor in place of a PIL image. The image data is then only read (by re-opening
+    the file with PIL) when it is first needed. If mode is not None then the image is converted to 
+    the specified mode when it is read.
+    """
+    from PASKIL import allskyImage
+
+    image = get_image_file(image_filename).getImage()
+
+    if mode is None:
+        mode = image.mode
+
+    return allskyImage.deferredImage(functools.partial(_loadImage, image.filename, mode),
+                                     mode, image.size)
+
+##########################################################################
+
+
+def _loadImage(filename, mode):
+    """
+    Returns a PIL image of the file, converted to the specified mode. Used as the loader for
+    deferred images.
+    """
+    image = Image.open(filename)
+
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    return image
+
+##########################################################################
+
+# numpy data types of the (unscaled) data in FITS files for each of the BITPIX values
+__bitpix_dtypes = {8: "u1", 16: ">i2", 32: ">i4", 64: ">i8", -32: ">f4", -64: ">f8"}
+
+
+def _fitsDataType(header):
+    """
+    Returns the numpy data type that pyfits gives the data of the HDU with the specified header, without
+    reading the data. Data which is scaled (or has blank values) is converted to floating point by pyfits
+    when it is read. Note that pyfits only treats data with BZERO at the centre of its range as unsigned
+    if the file is opened with uint=True, which getHDUList doesn't do.
+    """
+    bitpix = header['BITPIX']
+
+    if header.get('BZERO', 0) == 0 and header.get('BSCALE', 1) == 1 and 'BLANK' not in header:
+        return numpy.dtype(__bitpix_dtypes[bitpix])
+
+    if bitpix > 16:
+        return numpy.dtype("float64")
+
+    return numpy.dtype("float32")
+
+##########################################################################
+
+
+def _isCandidate(plugin, image_file):
+    """
+    Returns False if the magic or extensions attributes of the plugin show that it cannot open the file,
+    True otherwise.
+    """
+    try:
+        if not image_file.getMagic().startswith(tuple(plugin.magic)):
+            return False
+    except AttributeError:
+        pass  # plugin doesn't say what its files start with
+
+    try:
+        extensions = tuple([e.lower() for e in plugin.extensions])
+        if not image_file.lower().endswith(extensions):
+            return False
+    except AttributeError:
+        pass  # plugin doesn't say what extensions its files have
+
+    return True
+
+##########################################################################
+
+
 def load(image_filename, info_filename, force):
     """    
     Returns the plugin object needed to open the image. Raises TypeError if no plugin is found. This should
     only be needed for debugging purposes.
     """
+    image_file = get_image_file(image_filename)
 
     if force:
         # skip the first three plugins in the list - these are the internal
         # ones
-        i = 3
+        candidates = types[3:]
     else:
-        i = 0
+        candidates = types[:]
+
+    # files in the same directory with the same extension are almost always the same type, so try the plugin
+    # that opened the last one first. The internal plugins are always tried before any others though
+    # (otherwise an external plugin which also accepts PASKIL files would take them over once it had been
+    # cached), so the plugin is only moved ahead of the other external plugins.
+    directory, extension = os.path.splitext(os.path.abspath(image_file))
+    cache_key = (os.path.dirname(directory), extension.lower(), info_filename, force)
 
-    while i < len(types):
-        if types[i].test(image_filename, info_filename):
-            return types[i]
-        i += 1
+    try:
+        cached_plugin = __plugin_cache[cache_key]
+        if cached_plugin in candidates and cached_plugin not in types[:3]:
+            candidates.remove(cached_plugin)
+            # the internal plugins are only in the candidates if force is False
+            candidates.insert(0 if force else 3, cached_plugin)
+    except KeyError:
+        pass
+
+    for plugin in candidates:
+        if not _isCandidate(plugin, image_file):
+            continue
+
+        if plugin.test(image_file, info_filename):
+            __plugin_cache[cache_key] = plugin
+            return plugin
 
     raise TypeError("allskyImagePlugins.load(): Unrecognised filetype for " +
                     image_filename + ". Make sure you have imported the required plugin for the image.")
@@ -203,6 +351,52 @@ def load(image_filename, info_filename, force):
 
 ##########################################################################
 
+def open_image(image_filename, info_filename=None, force=False):
+    """
+    Returns an allskyImage object (or allskyRaw object) of the image, opened using the appropriate plugin. The
+    plugin is passed an imageFile object, so that the files opened while finding the plugin are reused to open 
+    the image. Raises TypeError if no plugin is found for the image.
+    """
+    image_file = get_image_file(image_filename)
+
+    plugin = load(image_file, info_filename, force)
+
+    return plugin.open(image_file, info_filename)
+
+##########################################################################
+
+
+def read_header(image_filename, info_filename=None, force=False):
+    """
+    Returns a tuple (info, mode) containing the metadata dictionary of the image and the mode that the image would 
+    have if it were opened with allskyImage.new(). Where the plugin for the image supports it, the pixel data is not
+    decoded. Raises TypeError if no plugin is found for the image.
+    """
+    image_file = get_image_file(image_filename)
+
+    plugin = load(image_file, info_filename, force)
+
+    try:
+        read_header_method = plugin.read_header
+    except AttributeError:
+        # plugin does not support reading only the header, so open the image
+        allsky_image = plugin.open(image_file, info_filename)
+        return allsky_image.getInfo(), allsky_image.getMode()
+
+    info, mode = read_header_method(image_file, info_filename)
+
+    # make copies of the info dictionaries in the same way as the allskyImage
+    # constructor, plugins need not return exif data and may return read-only
+    # dictionaries (e.g. from misc.readSiteInfo)
+    info = {'header': dict(info['header']), 'camera': dict(info['camera']),
+            'processing': dict(info['processing']),
+            'exif': dict(info.get('exif', {}))}
+
+    return info, mode
+
+##########################################################################
+
+
 def register(plugin):
     """
     Registers a plugin. The plugin argument should be an instance of the plugin class to be registered. You
@@ -212,6 +406,94 @@ def register(plugin):
 
     types.append(plugin)
 
+    # the new plugin may be able to open files that were previously opened
+    # by other plugins
+    __plugin_cache.clear()
+
+##########################################################################
+
+
+class imageFile(str):
+    """
+    The filename of an image, which also keeps hold of the objects used to read the image so that they 
+    can be shared between the test, read_header and open methods of the plugins. Each file is only opened
+    (by PIL, pyfits or for reading exif data) the first time that it is needed. As imageFile is a subclass
+    of str, plugins which do not know about it can treat it as a normal filename.
+    
+    Note that the objects returned are not copies, plugin test methods should therefore not modify them.
+    """
+
+    def __init__(self, image_filename):
+        self.__magic = None
+        self.__image = None
+        self.__image_error = None
+        self.__exif = None
+        self.__hdulist = None
+
+    ##########################################################################
+
+    def __reduce__(self):
+        # pickle as a plain filename, the open files cannot be pickled
+        return (str, (str(self),))
+
+    ##########################################################################
+
+    def getMagic(self):
+        """
+        Returns the first MAGIC_LENGTH bytes of the file. If the file cannot be read then an empty bytes 
+        object is returned.
+        """
+        if self.__magic is None:
+            try:
+                with open(self, "rb") as ifp:
+                    self.__magic = ifp.read(MAGIC_LENGTH)
+            except (IOError, OSError):
+                self.__magic = b""
+
+        return self.__magic
+
+    ##########################################################################
+
+    def getImage(self):
+        """
+        Returns the PIL image object of the file. Raises IOError if PIL cannot open it.
+        """
+        if self.__image_error is not None:
+            raise self.__image_error
+
+        if self.__image is None:
+            try:
+                self.__image = Image.open(str(self))
+            except IOError as ex:
+                # don't keep trying to open a file that PIL can't read
+                self.__image_error = ex
+                raise
+
+        return self.__image
+
+    ##########################################################################
+
+    def getExif(self):
+        """
+        Returns a dict of the exif data stored in the file (see misc.readExifData). Note that this is the same 
+        dict each time, so plugins must copy it before modifying it.
+        """
+        if self.__exif is None:
+            self.__exif = misc.readExifData(str(self))
+
+        return self.__exif
+
+    ##########################################################################
+
+    def getHDUList(self):
+        """
+        Returns the pyfits HDUList object of the file.
+        """
+        if self.__hdulist is None:
+            self.__hdulist = pyfits.open(str(self))
+
+        return self.__hdulist
+
 ##########################################################################
 
 
@@ -229,6 +511,8 @@ class PASKIL_Allsky_Image_PNG:
     should be read from the header rather than being re-loaded from a site info file.
     """
 
+    magic = (b"\x89PNG\r\n\x1a\n",)
+
     def __init__(self):
         self.name = "PASKIL All-sky PNG Image Plugin"
 
@@ -241,7 +525,7 @@ class PASKIL_Allsky_Image_PNG:
 
         # load image
         try:
-            image = Image.open(image_filename)
+            image = get_image_file(image_filename).getImage()
         except:
             return False
 
@@ -254,13 +538,11 @@ class PASKIL_Allsky_Image_PNG:
 
     ##########################################################################
 
-    def open(self, image_filename, info_filename):
-        from PASKIL import allskyImage
+    def __readInfo(self, image):
         """
-        Returns an allskyImage object containing the image data and image metadata contained in 'image_filename'.
+        Returns the info dictionary stored in the header of the PIL image, removing the PASKIL entries
+        from the PIL image's info.
         """
-        image = Image.open(image_filename)
-
         # read image header data
         info = image.info
 
@@ -279,11 +561,35 @@ class PASKIL_Allsky_Image_PNG:
         del info['header']
 
         # create a dictionary containing all the metadata
-        info = {'header': header, 'camera': camera,
+        return {'header': header, 'camera': camera,
                 'processing': processing, 'exif': exif}
 
-        # return new allskyImage object
-        return allskyImage.allskyImage(image, image.filename, info)
+    ##########################################################################
+
+    def read_header(self, image_filename, info_filename):
+        """
+        Returns a tuple (info, mode) of the metadata stored in the tEXt chunks of 'image_filename' and the
+        image mode. The pixel data is not decoded.
+        """
+        # PIL only reads the chunks preceding the image data when opening a
+        # png file
+        image = get_image_file(image_filename).getImage()
+
+        return self.__readInfo(image), image.mode
+
+    ##########################################################################
+
+    def open(self, image_filename, info_filename):
+        from PASKIL import allskyImage
+        """
+        Returns an allskyImage object containing the image data and image metadata contained in 'image_filename'.
+        """
+        image = get_image_file(image_filename).getImage()
+
+        info = self.__readInfo(image)
+
+        # return new allskyImage object, the image data is read when needed
+        return allskyImage.allskyImage(deferred_image(image_filename), image.filename, info)
 
     ##########################################################################
 ##########################################################################
@@ -299,6 +605,8 @@ class PASKIL_Allsky_Image_JPEG:
     should be read from the exif rather than being re-loaded from a site info file.
     """
 
+    magic = (b"\xff\xd8",)
+
     def __init__(self):
         self.name = "PASKIL All-sky JPEG Image Plugin"
 
@@ -310,7 +618,7 @@ class PASKIL_Allsky_Image_JPEG:
         """
         # check exif
 #         exif = pyexiv2.Metadata(image_filename)
-        exif_data = misc.readExifData(image_filename)
+        exif_data = get_image_file(image_filename).getExif()
 #         exif.read()
         try:
             if exif_data['Exif.Image.ProcessingSoftware'] == "PASKIL":
@@ -322,20 +630,45 @@ class PASKIL_Allsky_Image_JPEG:
 
     ##########################################################################
 
-    def open(self, image_filename, info_filename):
-        from PASKIL import allskyImage
+    def __readInfo(self, image_filename):
         """
-        Returns an allskyImage object containing the image data and image metadata contained in 'image_filename'.
+        Returns the info dictionary stored in the exif data of 'image_filename'.
         """
-        image = Image.open(image_filename)
-        exif_data = misc.readExifData(image_filename)
+        exif_data = get_image_file(image_filename).getExif().copy()
 
         info_str = exif_data.pop("Exif.Photo.UserComment")
         info = eval(info_str)
         info['exif'] = exif_data
 
-        # return new allskyImage object
-        return allskyImage.allskyImage(image, image.filename, info)
+        return info
+
+    ##########################################################################
+
+    def read_header(self, image_filename, info_filename):
+        """
+        Returns a tuple (info, mode) of the metadata stored in the exif data of 'image_filename' and the 
+        image mode. The pixel data is not decoded.
+        """
+        # opening the file with PIL only parses the jpeg markers, the image
+        # is not decoded until its pixels are accessed
+        image_file = get_image_file(image_filename)
+        mode = image_file.getImage().mode
+
+        return self.__readInfo(image_file), mode
+
+    ##########################################################################
+
+    def open(self, image_filename, info_filename):
+        from PASKIL import allskyImage
+        """
+        Returns an allskyImage object containing the image data and image metadata contained in 'image_filename'.
+        """
+        image_file = get_image_file(image_filename)
+        image = image_file.getImage()
+        info = self.__readInfo(image_file)
+
+        # return new allskyImage object, the image data is read when needed
+        return allskyImage.allskyImage(deferred_image(image_file), image.filename, info)
 
     ##########################################################################
 ##########################################################################
@@ -354,6 +687,8 @@ class PASKIL_Allsky_Image_FITS:
     should be read from the header rather than being re-loaded from a site info file.
     """
 
+    magic = (b"SIMPLE",)
+
     def __init__(self):
         self.name = "PASKIL All-sky FITS Image Plugin"
 
@@ -363,19 +698,19 @@ class PASKIL_Allsky_Image_FITS:
         """
         Returns true if image_filename is in the PASKIL FITS format, false otherwise.
         """
-        try:
-            image = Image.open(image_filename)
-        except:
-            return False
+        image_file = get_image_file(image_filename)
 
         # check image has fits format
-        if image.format != 'FITS':
+        if not image_file.getMagic().startswith(self.magic):
             return False
 
         # if it is a FITS image, then check if it is a PASKIL fits image
 
         # open fits file using pyfits
-        hdulist = pyfits.open(image_filename)
+        try:
+            hdulist = image_file.getHDUList()
+        except:
+            return False
 
         # look in the header of the primary hdu for the PASKIL tag
         try:
@@ -391,19 +726,15 @@ class PASKIL_Allsky_Image_FITS:
 
     ##########################################################################
 
-    def open(self, image_filename, info_filename):
-        from PASKIL import allskyImage
+    def __readInfo(self, hdulist):
         """
-        Returns an allskyImage object containing the image data and image metadata contained in 'image'.
+        Returns the info dictionary stored in the extension HDUs of the FITS file.
         """
         header = {}
         camera = {}
         processing = {}
         exif = {}
 
-        # open fits file using pyfits
-        hdulist = pyfits.open(image_filename)
-
         # read header data locations from header
         header_hdu = hdulist[hdulist[0].header['PSKHEAD']]
         camera_hdu = hdulist[hdulist[0].header['PSKCAM']]
@@ -437,9 +768,44 @@ class PASKIL_Allsky_Image_FITS:
             except:
                 exif[exif_hdu.data[i][0]] = exif_hdu.data[i][1]
 
-        info = {'header': header, 'camera': camera,
+        return {'header': header, 'camera': camera,
                 'processing': processing, 'exif': exif}
 
+    ##########################################################################
+
+    def read_header(self, image_filename, info_filename):
+        """
+        Returns a tuple (info, mode) of the metadata stored in the FITS file and the image mode. Only the
+        header of the primary HDU and the (small) metadata table HDUs are read, the image data is not.
+        """
+        # open fits file using pyfits
+        hdulist = get_image_file(image_filename).getHDUList()
+
+        info = self.__readInfo(hdulist)
+
+        if hdulist[0].header['PSKMODE'] == "RGB":
+            mode = "RGB"
+        else:
+            # work out what mode PIL will give the image data in open(), this
+            # depends on the byte order and scaling of the data, as well as the
+            # number of bits per pixel
+            data_type = _fitsDataType(hdulist[0].header)
+            mode = Image.fromarray(numpy.zeros((1, 1), dtype=data_type)).mode
+
+        return info, mode
+
+    ##########################################################################
+
+    def open(self, image_filename, info_filename):
+        from PASKIL import allskyImage
+        """
+        Returns an allskyImage object containing the image data and image metadata contained in 'image'.
+        """
+        # open fits file using pyfits
+        hdulist = get_image_file(image_filename).getHDUList()
+
+        info = self.__readInfo(hdulist)
+
         mode = hdulist[0].header['PSKMODE']
 
         # load image data
@@ -458,7 +824,7 @@ class PASKIL_Allsky_Image_FITS:
             new_image = ImageOps.flip(
                 Image.merge("RGB", [red_image, green_image, blue_image]))
 
-        return allskyImage.allskyImage(new_image, image_filename, info)
+        return allskyImage.allskyImage(new_image, str(image_filename), info)
 
     ##########################################################################
 ##########################################################################
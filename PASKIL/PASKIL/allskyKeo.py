@@ -89,7 +89,10 @@ import matplotlib.cm
 import warnings
 from PIL import Image, ImageFilter
 import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.pool import ThreadPool
 import copy
+import os
 
 from pylab import MinuteLocator, DateFormatter, date2num, num2date
 from pylab import FixedLocator, FixedFormatter
@@ -97,6 +100,17 @@ from pylab import FixedLocator, FixedFormatter
 from PASKIL import allskyImage, allskyColour, allskyPlot, misc, stats
 from PASKIL.extensions import cKeo
 
+# executor used to create keograms from datasets when new() is not passed one,
+# see setDefaultExecutor()
+_default_executor = None
+
+# start the resource tracker (which cleans up the shared memory that keograms
+# are created in) now, so that worker processes forked later on (e.g. by an
+# executor created before the first keogram) share it with this process,
+# rather than each starting their own one, see _attach_shared_memory()
+if os.name == "posix":
+    resource_tracker.ensure_running()
+
 ###############################################################################
 # "public" function definitions
 ###############################################################################
@@ -226,7 +240,8 @@ def combine(keograms, data_spacing="AUTO"):
 ###############################################################################
 
 def new(data, angle, start_time=None, end_time=None, strip_width=5,
-        data_spacing="AUTO", keo_type="CopyPaste", keo_fov_angle=None):
+        data_spacing="AUTO", keo_type="CopyPaste", keo_fov_angle=None,
+        executor=None):
     """
     Returns a keogram object. The data argument can be either an
     allskyData.dataset object or a list of allskyImage.allskyImage objects -
@@ -256,14 +271,48 @@ def new(data, angle, start_time=None, end_time=None, strip_width=5,
 
     For keograms produced from dataset objects, this function uses the
     multiprocessing module to split keogram creation over multiple CPUs
-    (where available). This can significantly speed up creating keograms -
-    however, this is not possible to do when creating keograms from a list
-    of allskyImage objects.
+    (where available). This can significantly speed up creating keograms.
+    Keograms produced from lists of allskyImage objects (which cannot be
+    passed to other processes) are instead split between multiple threads
+    in this process. By default a new pool of processes is created
+    for each keogram. If many keograms are being created, then a long lived
+    pool can be passed as the executor argument (or set using
+    setDefaultExecutor) instead, so that the processes are only started once.
 
     Keogram objects (as returned by this function) can be visualised using
     the allskyPlot module. See allskyPlot.plot and allskyKeo.keogram for
-    details.
+    details. To create keograms at several angles from the same data, use
+    new_multi.
     """
+    return new_multi(data, [angle], start_time=start_time, end_time=end_time,
+                     strip_width=strip_width, data_spacing=data_spacing,
+                     keo_type=keo_type, keo_fov_angle=keo_fov_angle,
+                     executor=executor)[angle]
+
+
+###############################################################################
+
+def new_multi(data, angles, start_time=None, end_time=None, strip_width=5,
+              data_spacing="AUTO", keo_type="CopyPaste", keo_fov_angle=None,
+              executor=None):
+    """
+    Returns a dict of keogram objects, one for each angle in the angles list
+    (the angles from geographic North that the slices are taken at), keyed by
+    angle. The other arguments are the same as for new(). This gives the same
+    keograms as calling new() for each of the angles, but each image is only
+    read and preprocessed once, with the strips for all of the angles being
+    taken from it in one go.
+    """
+    # remove any duplicate angles (keeping the order)
+    unique_angles = []
+    for angle in angles:
+        if angle not in unique_angles:
+            unique_angles.append(angle)
+    angles = unique_angles
+
+    if len(angles) == 0:
+        raise ValueError("At least one angle must be specified")
+
     # the strip width has to be odd otherwise life is too difficult
     if strip_width % 2 == 0:
         strip_width += 1
@@ -290,10 +339,10 @@ def new(data, angle, start_time=None, end_time=None, strip_width=5,
               'strip_width': strip_width, 'data_spacing': data_spacing,
               'keo_type': keo_type, 'keo_fov_angle': keo_fov_angle}
 
-    # if data is a list of allskyImages, then we can't process it asyncronously
-    #(can't pickle a PIL Image object)
+    # if data is a list of allskyImages, then we can't process it in other
+    # processes (can't pickle a PIL Image object), so __fromList uses threads
     if type(data) is list:
-        return __fromList(data, angle, **kwargs)
+        return dict(zip(angles, __fromList(data, angles, **kwargs)))
 
     # otherwise we assume that it is a dataset object and we can process it
     # asyncronously
@@ -310,35 +359,54 @@ def new(data, angle, start_time=None, end_time=None, strip_width=5,
         num_chunks = int(num_images // 2)
     # else num_chunks remains as 1
 
-    # create argument tuples
-#     if sys.version_info[0] > 2:
-#         args = None, data.split(num_chunks), [angle] * num_chunks)
-#         arg_tuples = map(None, args, [kwargs] * num_chunks)
-#
-#     else:
-    kwargs['interpolate'] = False  # don't want to interpolate the sections
-    arg_tuples = list(
-        zip(data.split(num_chunks), [angle] * num_chunks, [kwargs] * num_chunks))
+    if executor is None:
+        executor = _default_executor
 
-    # create processing pool
-    try:
+    if executor is not None:
+        # put the data into the keograms using the existing worker processes,
+        # which are left running afterwards
+        keograms = __fromDataset(data, angles, executor, num_chunks, **kwargs)
+
+    else:
+        # create processing pool
         processing_pool = multiprocessing.Pool(processes=num_chunks)
+        try:
+            keograms = __fromDataset(data, angles, processing_pool, num_chunks,
+                                     **kwargs)
+        except Exception as ex:
+            # if anything goes wrong, kill the child processes
+            processing_pool.terminate()
+            raise ex
 
-        # create the keogram segments
+        processing_pool.close()
+        processing_pool.join()
 
-        results = processing_pool.map(
-            __fromDatasetWrapper, arg_tuples, chunksize=1)
-# results = [__fromDatasetWrapper(tup) for tup in arg_tuples] # Non
-# threaded test version
-    except Exception as ex:
-        # if anything goes wrong, kill the child processes
-        processing_pool.terminate()
-        raise ex
+    return dict(zip(angles, keograms))
 
-    processing_pool.close()
 
-    # put the pieces of keogram together in a new keogram
-    return combine(results, data_spacing=data_spacing)
+###############################################################################
+
+def setDefaultExecutor(executor):
+    """
+    Sets the executor used by new() and new_multi() to create keograms from
+    datasets when they are not passed one. The executor can be any object with
+    a map method that runs functions in other processes, for example a
+    multiprocessing.Pool or a concurrent.futures.ProcessPoolExecutor. Using a
+    long lived executor avoids starting (and importing PASKIL into) a new set
+    of processes for every keogram. PASKIL never shuts the executor down, this
+    is left to the caller. Set to None (the default) to create a new pool of
+    processes for each keogram.
+    """
+    global _default_executor
+    _default_executor = executor
+
+
+def getDefaultExecutor():
+    """
+    Returns the executor set by setDefaultExecutor(), or None if one has not
+    been set.
+    """
+    return _default_executor
 
 
 ###############################################################################
@@ -526,6 +594,72 @@ def _generate_keo_arr(mode, keo_width, keo_height):
     return keo_arr
 
 
+###############################################################################
+
+def _generate_shared_keo_arrs(shared_block, num_arrs, mode, keo_width,
+                              keo_height):
+    """
+    Returns a list of num_arrs keogram arrays (see _generate_keo_arr) which
+    store their data in the shared memory block (a
+    multiprocessing.shared_memory.SharedMemory object) one after the other,
+    rather than allocating their own memory.
+    """
+    template = _generate_keo_arr(mode, 1, 1)
+    shape = (keo_width, keo_height, template.shape[2])
+    arr_nbytes = template.nbytes * keo_width * keo_height
+
+    return [numpy.ndarray(shape, dtype=template.dtype, buffer=shared_block.buf,
+                          offset=i * arr_nbytes) for i in range(num_arrs)]
+
+
+###############################################################################
+
+def _attach_shared_memory(name):
+    """
+    Returns the existing shared memory block with the specified name. The
+    block belongs to (and is unlinked by) the process that created it. Until
+    Python 3.13 attaching to a block always registers it with the resource
+    tracker, which is harmless as long as this process shares the tracker of
+    the process that created the block (registering it again has no effect),
+    which is started when this module is imported.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # the track argument is only available from Python 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+###############################################################################
+
+def _unlink_shared_memory(shared_block):
+    """
+    Unlinks the shared memory block (created by this process). A worker
+    process which started its own resource tracker (rather than sharing the
+    one of this process) may have unlinked the block already, when the worker
+    exited, in which case the block is just unregistered from the tracker of
+    this process.
+    """
+    try:
+        shared_block.unlink()
+    except FileNotFoundError:
+        resource_tracker.unregister("/" + shared_block.name, "shared_memory")
+
+
+###############################################################################
+
+def _close_shared_memory(shared_block):
+    """
+    Closes the shared memory block. If there are still arrays using the memory
+    (e.g. referenced by the traceback of an exception) then it cannot be
+    closed yet, and is released when it is garbage collected instead.
+    """
+    try:
+        shared_block.close()
+    except BufferError:
+        pass
+
+
 ###############################################################################
 
 def _estimate_data_spacing(times):
@@ -611,21 +745,115 @@ def _calc_keo_width(times, start_time, end_time, strip_width, keo_type,
 
 ###############################################################################
 
-def __fromDatasetWrapper(args_tuple):
+def __putDatasetData(args_tuple):
+    """
+    Puts the strips from all the images in a dataset into keogram arrays which
+    are held in shared memory, so that several processes can fill the same
+    keograms at once. The args_tuple is (data, angles, shared memory name,
+    mode, keo_width, keo_height, kwargs), where kwargs are the arguments for
+    _putMultiData. Returns a list of the x-coordinates of where the strips
+    were put.
+    """
+    data, angles, shared_name, mode, keo_width, keo_height, kwargs = args_tuple
+
+    shared_keo_arrs = _attach_shared_memory(shared_name)
+    keo_arrs = None
+    try:
+        keo_arrs = _generate_shared_keo_arrs(shared_keo_arrs, len(angles),
+                                             mode, keo_width, keo_height)
+
+        # images are read in the background whilst the strips are being taken
+        data_points = []
+        for image in data.iter(prefetch=4, workers=2):
+            data_points.append(_putMultiData(image, keo_arrs,
+                                             kwargs['strip_width'], angles,
+                                             kwargs['keo_fov_angle'],
+                                             kwargs['start_time'],
+                                             kwargs['end_time'],
+                                             keo_type=kwargs['keo_type']))
+    finally:
+        keo_arrs = None
+        _close_shared_memory(shared_keo_arrs)
+
+    return data_points
+
+
+###############################################################################
+
+def __putListData(args_tuple):
+    """
+    Puts the strips from a list of images into keogram arrays. The args_tuple
+    is (images, keo_arrs, angles, kwargs), where kwargs are the arguments for
+    _putMultiData. Returns a list of the x-coordinates of where the strips
+    were put. This is run by the threads used to create keograms from lists
+    of images.
+    """
+    images, keo_arrs, angles, kwargs = args_tuple
+
+    data_points = []
+    for image in images:
+        data_points.append(_putMultiData(image, keo_arrs, kwargs['strip_width'],
+                                         angles, kwargs['keo_fov_angle'],
+                                         kwargs['start_time'],
+                                         kwargs['end_time'],
+                                         keo_type=kwargs['keo_type']))
+    return data_points
+
+
+###############################################################################
+
+def _stripColumns(times, start_time, end_time, keo_width, strip_width,
+                  keo_type):
     """
-    Simple wrapper function to allow the __fromDataset function to be called
-    using an argument tuple (args, kwargs).
+    Returns a tuple (columns, put_width), where columns is a list of the
+    x-coordinates of where the strips from images captured at the specified
+    times will be put into a keogram, and put_width is the number of columns
+    that each strip fills.
     """
-    return __fromDataset(args_tuple[0], args_tuple[1], **args_tuple[2])
+    if keo_type == "Average":
+        time2pix = _generate_time2pix_converter(start_time, end_time,
+                                                keo_width, 5)
+        put_width = 1
+    else:
+        time2pix = _generate_time2pix_converter(start_time, end_time,
+                                                keo_width, strip_width)
+        put_width = strip_width
+
+    return [int(round(time2pix(t))) for t in times], put_width
+
+
+###############################################################################
+
+def _disjointChunks(columns, strip_width, num_chunks):
+    """
+    Splits the indices of the columns list (the x-coordinates of where strips
+    will be put into a keogram) into at most num_chunks lists of roughly equal
+    length, such that strips (of strip_width pixels) with indices in
+    different lists never overlap. Each list contains the indices in
+    ascending order.
+    """
+    order = sorted(range(len(columns)), key=lambda i: columns[i])
+    chunk_length = len(columns) / float(num_chunks)
+
+    chunks = [[]]
+    for n in range(len(order)):
+        # only start a new chunk where there is a gap between the strips
+        if (len(chunks[-1]) >= chunk_length and len(chunks) < num_chunks and
+                columns[order[n]] - columns[order[n - 1]] >= strip_width):
+            chunks.append([])
+        chunks[-1].append(order[n])
+
+    return [sorted(chunk) for chunk in chunks]
 
 
 ###############################################################################
 
-def __fromList(data, angle, start_time=None, end_time=None, strip_width=5,
+def __fromList(data, angles, start_time=None, end_time=None, strip_width=5,
                data_spacing="AUTO", keo_type="CopyPaste", interpolate=True,
                keo_fov_angle=None):
     """
-    Creates a keogram object from a list of allskyImage objects.
+    Creates a list of keogram objects (one for each angle in angles) from a
+    list of allskyImage objects.
     """
     # TODO - there is no need for this function to have kwargs - they
     # all have to specified when it is called anyway. The kwargs should
@@ -723,52 +951,95 @@ def __fromList(data, angle, start_time=None, end_time=None, strip_width=5,
                                                   90 + max_im_fov), lens_proj)
     min_pix = im_angle2pix(keo_fov_angle[0])
     max_pix = im_angle2pix(keo_fov_angle[1])
-    keo_height = max_pix - min_pix + 2
+    keo_height = int(max_pix - min_pix + 2)
 
-    # create new array to hold keogram data
-    keo_arr = _generate_keo_arr(mode, keo_width, keo_height)
+    # create new arrays to hold keogram data
+    keo_arrs = [_generate_keo_arr(mode, keo_width, keo_height)
+                for angle in angles]
 
-    # put data into keogram
-    data_points = []
-    for image in data:
-        data_points.append(_putData(image, keo_arr, strip_width, angle,
-                                    keo_fov_angle, start_time, end_time,
-                                    keo_type=keo_type))
+    # work out where in the keograms the strips from each image will go
+    columns, put_width = _stripColumns(times, start_time, end_time, keo_width,
+                                       strip_width, keo_type)
+
+    # put data into keograms. The images are split between a pool of threads,
+    # such that the strips put into the keograms by different threads never
+    # overlap (so the result is the same as doing it in one thread)
+    num_threads = 1
+    num_cpus = multiprocessing.cpu_count()
+
+    # need at least 2 images per thread, and no point in creating more threads
+    # than cpus
+    if len(data) >= 2 * num_cpus:
+        num_threads = num_cpus
+    elif int(len(data) // 2) >= 2:
+        num_threads = int(len(data) // 2)
+
+    put_kwargs = {'start_time': start_time, 'end_time': end_time,
+                  'strip_width': strip_width, 'keo_type': keo_type,
+                  'keo_fov_angle': keo_fov_angle}
+    chunks = _disjointChunks(columns, put_width, num_threads)
+    arg_tuples = [([data[i] for i in chunk], keo_arrs, angles, put_kwargs)
+                  for chunk in chunks]
+
+    if len(arg_tuples) == 1:
+        results = [__putListData(arg_tuples[0])]
+    else:
+        thread_pool = ThreadPool(len(arg_tuples))
+        try:
+            results = thread_pool.map(__putListData, arg_tuples, chunksize=1)
+        except Exception as ex:
+            thread_pool.terminate()
+            raise ex
+
+        thread_pool.close()
+        thread_pool.join()
+
+    # return the data points to the order of the images
+    data_points = [None] * len(data)
+    for chunk, chunk_data_points in zip(chunks, results):
+        for i, x in zip(chunk, chunk_data_points):
+            data_points[i] = x
 
     # convert data points to integer pixel coordinates
     int_data_points = [int(round(x)) for x in data_points]
 
     # interpolate the data
     if interpolate:
-        if keo_type == "CopyPaste":
-            # 1.5 factor allows some flexibility in data spacing without
-            # interpolating across large gaps
-            keo_arr = _interpolateData(int_data_points, keo_arr, mode,
-                                       colour_table, strip_width,
-                                       int(1.5 * mean_data_spacing_pix))
-        elif keo_type == "Average":
-            #+5 is effective strip width - used in calculating the
-            # width of the keogram
-            keo_arr = _interpolateData(int_data_points, keo_arr, mode,
-                                       colour_table, 1,
-                                       int(1.5 * (mean_data_spacing_pix + 5)))
+        for i in range(len(keo_arrs)):
+            if keo_type == "CopyPaste":
+                # 1.5 factor allows some flexibility in data spacing without
+                # interpolating across large gaps
+                keo_arrs[i] = _interpolateData(int_data_points, keo_arrs[i],
+                                               mode, colour_table, strip_width,
+                                               int(1.5 * mean_data_spacing_pix))
+            elif keo_type == "Average":
+                #+5 is effective strip width - used in calculating the
+                # width of the keogram
+                keo_arrs[i] = _interpolateData(int_data_points, keo_arrs[i],
+                                               mode, colour_table, 1,
+                                               int(1.5 * (mean_data_spacing_pix + 5)))
 
     if keo_type == "Average":
         strip_width = 5
 
-    # create keogram object
-    return keogram(keo_arr, colour_table, start_time, end_time, angle,
-                   keo_fov_angle, strip_width, keo_type, data_points,
-                   data_spacing, calib_factor, lens_proj)
+    # create keogram objects
+    return [keogram(keo_arr, colour_table, start_time, end_time, angle,
+                    keo_fov_angle, strip_width, keo_type, data_points,
+                    data_spacing, calib_factor, lens_proj)
+            for angle, keo_arr in zip(angles, keo_arrs)]
 
 
 ###############################################################################
 
-def __fromDataset(data, angle, start_time=None, end_time=None, strip_width=5,
-                  data_spacing="AUTO", keo_type="CopyPaste", interpolate=True,
-                  keo_fov_angle=None):
+def __fromDataset(data, angles, executor, num_chunks, start_time=None,
+                  end_time=None, strip_width=5, data_spacing="AUTO",
+                  keo_type="CopyPaste", interpolate=True, keo_fov_angle=None):
     """
-    Creates a keogram object from a dataset.
+    Creates a list of keogram objects (one for each angle in angles) from a
+    dataset. The dataset is split into at most num_chunks pieces whose strips
+    don't overlap, which are put into the keograms by the executor's worker
+    processes. The keogram arrays are held in shared memory, so the workers
+    write their strips straight into them.
     """
     # TODO - there is no need for this function to have kwargs - they
     # all have to specified when it is called anyway. The kwargs should
@@ -842,43 +1113,73 @@ def __fromDataset(data, angle, start_time=None, end_time=None, strip_width=5,
 
     min_pix = im_angle2pix(keo_fov_angle[0])
     max_pix = im_angle2pix(keo_fov_angle[1])
-    keo_height = numpy.int(max_pix - min_pix + 2)
-
-    # create new array to hold keogram data
-    keo_arr = _generate_keo_arr(mode, keo_width, keo_height)
-
-    # put data into keogram
-    data_points = []
-    for image in data:
-        data_points.append(_putData(image, keo_arr, strip_width, angle,
-                                    keo_fov_angle, start_time, end_time,
-                                    keo_type=keo_type))
-
-    # interpolate the data
-    if interpolate:
-        # convert data points to integer pixel coordinates
-        int_data_points = [int(round(x)) for x in data_points]
-
-        if keo_type == "CopyPaste":
-            # 1.5 factor allows some flexibility in data spacing without
-            # interpolating across large gaps
-            keo_arr = _interpolateData(int_data_points, keo_arr, mode,
-                                       colour_table, strip_width,
-                                       int(1.5 * mean_data_spacing_pix))
-        elif keo_type == "Average":
-            #+5 is effective strip width - used in calculating the width
-            # of the keogram
-            keo_arr = _interpolateData(int_data_points, keo_arr, mode,
-                                       colour_table, 1,
-                                       int(1.5 * (mean_data_spacing_pix + 5)))
-
-    if keo_type == "Average":
-        strip_width = 5
+    keo_height = int(max_pix - min_pix + 2)
+
+    # create the keogram arrays in shared memory (new shared memory is always
+    # filled with zeros)
+    arr_nbytes = _generate_keo_arr(mode, 1, 1).nbytes * keo_width * keo_height
+    shared_keo_arrs = shared_memory.SharedMemory(
+        create=True, size=max(1, len(angles) * arr_nbytes))
+    keo_arrs = None
+    try:
+        keo_arrs = _generate_shared_keo_arrs(shared_keo_arrs, len(angles),
+                                             mode, keo_width, keo_height)
+
+        # put data into keograms, splitting the dataset between the worker
+        # processes such that the strips put into the keograms by different
+        # workers never overlap (so the result is the same as doing it in one
+        # process). The dataset is in chronological order, so each chunk is a
+        # continuous run of images and can be cropped out of the dataset
+        image_times = data.getTimes()
+        columns, put_width = _stripColumns(image_times, start_time, end_time,
+                                           keo_width, strip_width, keo_type)
+        chunks = _disjointChunks(columns, put_width, num_chunks)
+
+        kwargs = {'start_time': start_time, 'end_time': end_time,
+                  'strip_width': strip_width, 'keo_type': keo_type,
+                  'keo_fov_angle': keo_fov_angle}
+        arg_tuples = [(data.crop(image_times[chunk[0]], image_times[chunk[-1]]),
+                       angles, shared_keo_arrs.name, mode, keo_width,
+                       keo_height, kwargs) for chunk in chunks]
+
+        data_points = []
+        for chunk_data_points in executor.map(__putDatasetData, arg_tuples):
+            data_points += chunk_data_points
 
-    # create keogram object
-    return keogram(keo_arr, colour_table, start_time, end_time, angle,
-                   keo_fov_angle, strip_width, keo_type, data_points,
-                   mean_data_spacing_pix, calib_factor, lens_proj)
+        # interpolate the data
+        if interpolate:
+            # convert data points to integer pixel coordinates
+            int_data_points = [int(round(x)) for x in data_points]
+
+            for i in range(len(keo_arrs)):
+                if keo_type == "CopyPaste":
+                    # 1.5 factor allows some flexibility in data spacing without
+                    # interpolating across large gaps
+                    keo_arrs[i] = _interpolateData(int_data_points, keo_arrs[i],
+                                                   mode, colour_table, strip_width,
+                                                   int(1.5 * mean_data_spacing_pix))
+                elif keo_type == "Average":
+                    #+5 is effective strip width - used in calculating the width
+                    # of the keogram
+                    keo_arrs[i] = _interpolateData(int_data_points, keo_arrs[i],
+                                                   mode, colour_table, 1,
+                                                   int(1.5 * (mean_data_spacing_pix + 5)))
+
+        if keo_type == "Average":
+            strip_width = 5
+
+        # create keogram objects (these copy the data out of the shared
+        # memory)
+        keograms = [keogram(keo_arr, colour_table, start_time, end_time, angle,
+                            keo_fov_angle, strip_width, keo_type, data_points,
+                            data_spacing, calib_factor, lens_proj)
+                    for angle, keo_arr in zip(angles, keo_arrs)]
+    finally:
+        keo_arrs = None
+        _unlink_shared_memory(shared_keo_arrs)
+        _close_shared_memory(shared_keo_arrs)
+
+    return keograms
 
 
 ###############################################################################
@@ -963,14 +1264,28 @@ def _putData(image, keo_arr, strip_width, angle, keo_fov_angle, start_time,
     """
     Takes a strip from the image and puts it into the keogram array.
     """
+    return _putMultiData(image, [keo_arr], strip_width, [angle], keo_fov_angle,
+                         start_time, end_time, keo_type=keo_type)
+
+
+###############################################################################
+
+def _putMultiData(image, keo_arrs, strip_width, angles, keo_fov_angle,
+                  start_time, end_time, keo_type="CopyPaste"):
+    """
+    Takes a strip from the image at each of the angles and puts it into the
+    corresponding keogram array in keo_arrs. The image is only preprocessed
+    (and its data read) once, however many angles there are. Returns the
+    x-coordinate of where the strips were put.
+    """
     # TODO - there is no need for this function to have kwargs - they
     # all have to specified when it is called anyway. The kwargs should
     # only be available for new(), here they should be ordinary args
 
     current_image = _imagePreProcess(image)
 
-    width = keo_arr.shape[0]
-    height = keo_arr.shape[1]
+    width = keo_arrs[0].shape[0]
+    height = keo_arrs[0].shape[1]
 
     if keo_type == "Average":
         real_strip_width = strip_width
@@ -982,47 +1297,11 @@ def _putData(image, keo_arr, strip_width, angle, keo_fov_angle, start_time,
     im_lens_proj = current_image_info['camera']['lens_projection']
     mode = current_image.getMode()
 
-    # get strip from image
+    # get strips from image
     if keo_type == "Average":
-        strip = current_image.getStrip(angle, real_strip_width)
-    else:
-        strip = current_image.getStrip(angle, strip_width)
-
-    # slice out field of view section of strip that we are interested in,
-    # filling missing data i.e. data outside of the image's fov with black
-    # pixels
-    strip_a2p = _generate_angle2pix_converter(strip.shape[1],
-                                              (90 - im_fov_angle,
-                                               90 + im_fov_angle),
-                                              im_lens_proj)
-
-    min_fov_pix = numpy.int(numpy.floor(strip_a2p(keo_fov_angle[0])))
-    max_fov_pix = numpy.int(numpy.ceil(strip_a2p(keo_fov_angle[1])))
-
-    fov_corrected_strip = numpy.zeros((strip.shape[0],
-                                       (max_fov_pix - min_fov_pix +
-                                        2),  # +2 because it includes end points
-                                       strip.shape[2]), dtype=strip.dtype)
-
-    corr_strip_a2p = _generate_angle2pix_converter(fov_corrected_strip.shape[1],
-                                                   keo_fov_angle, im_lens_proj)
-
-    if keo_fov_angle[0] <= 90 - im_fov_angle:
-        strip_lower_pix = 0
-        corr_lower_pix = int(round(corr_strip_a2p(90 - im_fov_angle)))
-    else:
-        strip_lower_pix = int(round(strip_a2p(keo_fov_angle[0])))
-        corr_lower_pix = 0
-
-    if keo_fov_angle[1] >= 90 + im_fov_angle:
-        strip_upper_pix = strip.shape[1] - 1
-        corr_upper_pix = corr_lower_pix + (strip_upper_pix - strip_lower_pix)
+        strips = current_image.getStrips(angles, real_strip_width)
     else:
-        corr_upper_pix = fov_corrected_strip.shape[1] - 1
-        strip_upper_pix = strip_lower_pix + (corr_upper_pix - corr_lower_pix)
-
-    fov_corrected_strip[:, corr_lower_pix:corr_upper_pix + 1,
-                        :] = strip[:, strip_lower_pix:strip_upper_pix + 1, :]
+        strips = current_image.getStrips(angles, strip_width)
 
     # read time data from image and convert to seconds
     try:
@@ -1042,42 +1321,80 @@ def _putData(image, keo_arr, strip_width, angle, keo_fov_angle, start_time,
                                             strip_width)
     x_coordinate = time2pix(capture_time)
 
-    if fov_corrected_strip.shape[1] != height:
-        # if strip taken from image is a different size to the keogram, then
-        # resize it. This is done by creating an image of the strip and then
-        # resizing the image - a slightly odd way of doing it, but saves me
-        # having to worry about the interpolation problems
-        if mode != "RGB":
-            # if it's not rgb then only want a 2d array.
-            fov_corrected_strip = fov_corrected_strip[:, :, 0]
-
-        strip_image = Image.fromarray(fov_corrected_strip)
-        strip_image = strip_image.resize(
-            (height, fov_corrected_strip.shape[0]))
-        size_corrected_strip = numpy.asarray(strip_image).copy()
-
-        # convert back to a 3d array
-        if len(size_corrected_strip.shape) == 2:
-            size_corrected_strip = size_corrected_strip.reshape(size_corrected_strip.shape[0],
-                                                                size_corrected_strip.shape[1], 1)
-    else:
-        size_corrected_strip = fov_corrected_strip
     # convert x_coordinate into integer pixel coordinate
     int_x_coordinate = int(round(x_coordinate))
 
-    # store data in keogram
-    if keo_type == "CopyPaste":
-        # just copy the pixel data from the image into the keogram
-        keo_arr[int_x_coordinate + (-strip_width // 2 + 1):int_x_coordinate +
-                (strip_width // 2 + 1), :, :] = size_corrected_strip[:, :, :]
+    for keo_arr, strip in zip(keo_arrs, strips):
+        # slice out field of view section of strip that we are interested in,
+        # filling missing data i.e. data outside of the image's fov with black
+        # pixels
+        strip_a2p = _generate_angle2pix_converter(strip.shape[1],
+                                                  (90 - im_fov_angle,
+                                                   90 + im_fov_angle),
+                                                  im_lens_proj)
+
+        min_fov_pix = int(numpy.floor(strip_a2p(keo_fov_angle[0])))
+        max_fov_pix = int(numpy.ceil(strip_a2p(keo_fov_angle[1])))
+
+        fov_corrected_strip = numpy.zeros((strip.shape[0],
+                                           (max_fov_pix - min_fov_pix +
+                                            2),  # +2 because it includes end points
+                                           strip.shape[2]), dtype=strip.dtype)
+
+        corr_strip_a2p = _generate_angle2pix_converter(fov_corrected_strip.shape[1],
+                                                       keo_fov_angle, im_lens_proj)
+
+        if keo_fov_angle[0] <= 90 - im_fov_angle:
+            strip_lower_pix = 0
+            corr_lower_pix = int(round(corr_strip_a2p(90 - im_fov_angle)))
+        else:
+            strip_lower_pix = int(round(strip_a2p(keo_fov_angle[0])))
+            corr_lower_pix = 0
 
-    elif keo_type == "Average":
-        keo_arr[int_x_coordinate, :, :] = size_corrected_strip.mean(
-            axis=0)[:, :]
+        if keo_fov_angle[1] >= 90 + im_fov_angle:
+            strip_upper_pix = strip.shape[1] - 1
+            corr_upper_pix = corr_lower_pix + (strip_upper_pix - strip_lower_pix)
+        else:
+            corr_upper_pix = fov_corrected_strip.shape[1] - 1
+            strip_upper_pix = strip_lower_pix + (corr_upper_pix - corr_lower_pix)
+
+        fov_corrected_strip[:, corr_lower_pix:corr_upper_pix + 1,
+                            :] = strip[:, strip_lower_pix:strip_upper_pix + 1, :]
+
+        if fov_corrected_strip.shape[1] != height:
+            # if strip taken from image is a different size to the keogram, then
+            # resize it. This is done by creating an image of the strip and then
+            # resizing the image - a slightly odd way of doing it, but saves me
+            # having to worry about the interpolation problems
+            if mode != "RGB":
+                # if it's not rgb then only want a 2d array.
+                fov_corrected_strip = fov_corrected_strip[:, :, 0]
+
+            strip_image = Image.fromarray(fov_corrected_strip)
+            strip_image = strip_image.resize(
+                (height, fov_corrected_strip.shape[0]))
+            size_corrected_strip = numpy.asarray(strip_image).copy()
+
+            # convert back to a 3d array
+            if len(size_corrected_strip.shape) == 2:
+                size_corrected_strip = size_corrected_strip.reshape(size_corrected_strip.shape[0],
+                                                                    size_corrected_strip.shape[1], 1)
+        else:
+            size_corrected_strip = fov_corrected_strip
 
-    else:
-        raise ValueError("Unknown keogram type. Expecting \"CopyPaste\" or"
-                         " \"Average\", got " + type)
+        # store data in keogram
+        if keo_type == "CopyPaste":
+            # just copy the pixel data from the image into the keogram
+            keo_arr[int_x_coordinate + (-strip_width // 2 + 1):int_x_coordinate +
+                    (strip_width // 2 + 1), :, :] = size_corrected_strip[:, :, :]
+
+        elif keo_type == "Average":
+            keo_arr[int_x_coordinate, :, :] = size_corrected_strip.mean(
+                axis=0)[:, :]
+
+        else:
+            raise ValueError("Unknown keogram type. Expecting \"CopyPaste\" or"
+                             " \"Average\", got " + type)
 
     # return the x-coordinate of where we just put the data
     return x_coordinate
@@ -1094,6 +1411,12 @@ def _imagePreProcess(image):
     """
     info = image.getInfo()
 
+    if ('binaryMask' not in info['processing'] and
+            'centerImage' not in info['processing'] and
+            'alignNorth' not in info['processing']):
+        # do all the processing in one go
+        return image.preprocess(float(info['camera']['fov_angle']))
+
     if 'binaryMask' not in info['processing']:
         image = image.binaryMask(float(info['camera']['fov_angle']))
 
@@ -1516,30 +1839,11 @@ class keogram:
         # if there is a colour table which has not yet been applied, then
         # apply it!
         if self.__colour_table is not None and self.__mode != "RGB":
-            # PIL doesn't support 16bit images, so need to use own routine
-            # if "I" mode image
-            if self.__mode != "I":
-                im_arr = self.__data.flatten()  # remove 3rd dimension
-                im_arr = im_arr.reshape((self.__width,
-                                         self.__height)).swapaxes(0, 1)
-                keo_image = Image.fromarray(im_arr)
-                keo_image.putpalette(self.__colour_table.getColourTable())
-
-            else:
-                keo_image = Image.new("RGB", (self.__width, self.__height),
-                                      "Black")
-                keo_image_pix = keo_image.load()
-
-                data = self.__data
-
-                ct = self.__colour_table.colour_table
-
-                for x in range(keo_image.size[0]):
-                    for y in range(keo_image.size[1]):
-
-                        keo_image_pix[x, y] = ct[data[x, y]]
-
-            keo_image = keo_image.convert("RGB")
+            # use the pixel values as indices into the colour table (PIL
+            # doesn't support palettes for 16bit images)
+            keo_image = Image.fromarray(
+                self.__colour_table.getLookupTable()[
+                    self.__data[:, :, 0].swapaxes(0, 1)])
 
         elif self.__mode == "RGB":
             keo_image = Image.fromarray(self.__data.swapaxes(0, 1))
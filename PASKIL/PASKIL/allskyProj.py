@@ -110,6 +110,12 @@ class projection:
             if image_info['processing']['alignNorth'] != 'geographic (NESW)':
                 im = im.alignNorth(north='geographic', orientation='NESW')
 
+        elif ('binaryMask' not in image_info['processing'] and
+              'centerImage' not in image_info['processing']):
+            # do all the processing in one go
+            im = im.preprocess(float(image_info['camera']['fov_angle']),
+                               north='geographic')
+
         else:
             if 'binaryMask' not in image_info['processing']:
                 im = im.binaryMask(float(image_info['camera']['fov_angle']))
@@ -150,19 +156,9 @@ class projection:
         image_map = Basemap(projection=globals()['__proj_codes'][
                             lens_projection], lat_0=self.site_lat, lon_0=self.site_lon, width=2 * self.fov_distance, height=2 * self.fov_distance, resolution='l', area_thresh=100)
 
-        image = im.getImage()
-
-        # convert the image to a numpy array
-        im_array = numpy.asarray(image).copy()
-        im_array = im_array.swapaxes(1, 0)
-        im_array = numpy.array(
-            im_array, dtype=globals()['__data_types'][self.__mode])
-
-        # if the original image was not RGB then need to add a dimension to the
-        # array (even though it only has length 1), later code requires a 3D
-        # array
-        if im.getMode() != 'RGB':
-            im_array.shape = (im_array.shape[0], im_array.shape[1], 1)
+        # convert the image to a (3D) numpy array
+        im_array = numpy.array(im.getArray().swapaxes(1, 0),
+                               dtype=globals()['__data_types'][self.__mode])
 
         # create an array of x,y pixel coordinates corresponding to a lat long
         # grid
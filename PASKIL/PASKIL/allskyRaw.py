@@ -25,7 +25,7 @@ import datetime
 import numpy
 from PIL import Image, ImageChops
 
-from . import allskyImage
+from . import allskyImage, misc
 import rawkit
 from rawkit.raw import Raw
 
@@ -125,22 +125,8 @@ def new(filename, site_info_file):
     # load image data
     (ch1, ch2, ch3, ch4) = getRawData(filename)
 
-    # open site info file
-    info_file = open(site_info_file, 'r')
-    camera = {}
-
-    # read in data from site info file and store in info dictionary
-    for line in info_file:  # read file line by line
-        if line.isspace():
-            continue  # ignore blank lines
-        words = line.split("=")  # split the line at the = sign
-
-        if len(words) != 2:
-            raise ValueError(
-                "Cannot read site info file, too many words per line")
-
-        # store the values (minus white space) in a dictionary
-        camera[words[0].lstrip().rstrip()] = words[1].lstrip().rstrip()
+    # read in data from site info file
+    camera = misc.readSiteInfo(site_info_file)
 
     creation_time = getTimeStamp(filename)
 
@@ -53,7 +53,7 @@ def createQuicklookVideo(dataset, filename, images_per_sec=2):
     encoder = vcodec.Encoder( params )
         
     with open(filename, 'wb') as ofp:
-        for im in dataset:
+        for im in dataset.iter():
             ql = im.createQuicklook()
             
             if ql.size != size:
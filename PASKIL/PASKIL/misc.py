@@ -22,11 +22,17 @@ Module containing miscellaneous functions used internally by PASKIL
 
 """
 
+import datetime
+import fnmatch
 import math
 import os
-import glob
+import types
 from gi.repository import GExiv2 as pyexiv2
 
+# range of years recognised as YYYY directory names by iterFiles
+MIN_DIRECTORY_YEAR = 1900
+MAX_DIRECTORY_YEAR = 2100
+
 ##########################################################################
 
 
@@ -36,21 +42,143 @@ def findFiles(directory, search_string):
     all files that matched the search string
     """
     found_files = []
-    found_files = found_files + glob.glob(directory + os.sep + search_string)
-
-    for filename in glob.glob(directory + os.sep + "*"):
-        if os.path.isdir(filename):
-            found_files = found_files + findFiles(filename, search_string)
 
-    # remove empty items
-    while found_files.count([]) != 0:
-        found_files.remove([])
+    for dirpath, filenames in _walkDirectory(directory, True, None, None):
+        found_files += [os.path.join(dirpath, f) for f in fnmatch.filter(filenames, search_string)]
 
     return found_files
 
 ##########################################################################
 
 
+def iterFiles(directory, extensions, recursive=True, start_time=None, end_time=None):
+    """
+    Generator function which yields the filenames of all the files in the specified directory which have one 
+    of the extensions in the extensions list (e.g. ["png","jpg"]). The directory tree is only walked once,
+    however many extensions are given. If recursive is False then subdirectories are not searched. Hidden
+    files and directories (starting with ".") are ignored. 
+    
+    If start_time and/or end_time (datetime objects) are given then directories whose names show that they 
+    only contain data from outside of this time range are not searched. Directories are recognised as being 
+    date-named if they are named "YYYYMMDD", "YYYY-MM-DD" or "YYYY_MM_DD", or if they are part of a 
+    "YYYY/MM/DD" (or "YYYY/MM") structure, where only years from 1900 to 2100 are recognised (so that other
+    numerically named directories, such as "5577" for a wavelength, are still searched). Note that files in 
+    directories which are searched are returned regardless of their capture time.
+    """
+    suffixes = tuple(["." + e.lstrip(".") for e in extensions])
+
+    for dirpath, filenames in _walkDirectory(directory, recursive, start_time, end_time):
+        for filename in filenames:
+            if filename.endswith(suffixes):
+                yield os.path.join(dirpath, filename)
+
+##########################################################################
+
+
+def _walkDirectory(directory, recursive, start_time, end_time):
+    """
+    Generator function which yields a (dirpath, filenames) tuple for each directory in the tree (similar to
+    os.walk), where filenames is a sorted list of the names of the (non-hidden) files in the directory. Date 
+    named directories outside of the time range are skipped (see iterFiles).
+    """
+    # stack of (dirpath, date range of parent directory) tuples still to
+    # search, the date range is used to recognise YYYY/MM/DD structures
+    stack = [(directory, None)]
+
+    while stack:
+        dirpath, parent_range = stack.pop()
+
+        filenames = []
+        subdirectories = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            subdirectories.append(entry.name)
+                        else:
+                            filenames.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            continue  # can't read directory
+
+        filenames.sort()
+        yield dirpath, filenames
+
+        if not recursive:
+            continue
+
+        # push subdirectories in reverse order so that they are searched in
+        # alphabetical order
+        for name in sorted(subdirectories, reverse=True):
+            date_range = _dateRange(name, parent_range)
+
+            if date_range is not None:
+                if start_time is not None and date_range[1] <= start_time:
+                    continue
+                if end_time is not None and date_range[0] > end_time:
+                    continue
+
+            stack.append((os.path.join(dirpath, name), date_range))
+
+##########################################################################
+
+
+def _dateRange(name, parent_range):
+    """
+    Returns a (start, end) tuple of datetime objects of the time range covered by a directory with the
+    specified name, or None if the name is not a date. parent_range is the date range of the parent
+    directory (or None) which is used to recognise the month and day levels of YYYY/MM/DD structures.
+    """
+    try:
+        # directories named YYYYMMDD, YYYY-MM-DD or YYYY_MM_DD
+        for date_format in ("%Y%m%d", "%Y-%m-%d", "%Y_%m_%d"):
+            if len(name) == len(datetime.date(2000, 1, 1).strftime(date_format)):
+                try:
+                    start = datetime.datetime.strptime(name, date_format)
+                except ValueError:
+                    continue
+                if MIN_DIRECTORY_YEAR <= start.year <= MAX_DIRECTORY_YEAR:
+                    return start, start + datetime.timedelta(days=1)
+
+        if not name.isdigit():
+            return None
+
+        if parent_range is None:
+            # YYYY, other four digit names (e.g. wavelengths) are not dates
+            if len(name) == 4 and MIN_DIRECTORY_YEAR <= int(name) <= MAX_DIRECTORY_YEAR:
+                year = int(name)
+                return datetime.datetime(year, 1, 1), datetime.datetime(year + 1, 1, 1)
+            return None
+
+        parent_start, parent_end = parent_range
+
+        if len(name) != 2 and len(name) != 1:
+            return None
+
+        if parent_end - parent_start > datetime.timedelta(days=31):
+            # MM in a YYYY directory
+            start = datetime.datetime(parent_start.year, int(name), 1)
+            if start.month == 12:
+                return start, datetime.datetime(start.year + 1, 1, 1)
+            return start, datetime.datetime(start.year, start.month + 1, 1)
+
+        if parent_end - parent_start > datetime.timedelta(days=1):
+            # DD in a YYYY/MM directory
+            start = datetime.datetime(parent_start.year, parent_start.month, int(name))
+            return start, start + datetime.timedelta(days=1)
+
+    except ValueError:
+        pass  # not a valid date
+
+    return None
+
+##########################################################################
+
+
 def pngsave(im, file_):
     """
     Function saves a PIL image as a PNG file, preserving the header data
@@ -121,3 +249,46 @@ def readExifData(filename):
 
 
 ##########################################################################
+
+# cache of parsed site info files used by readSiteInfo, keyed by filename
+_site_info_cache = {}
+
+
+def readSiteInfo(filename):
+    """
+    Returns a read-only dict of the values stored in a site information file. Each non-blank line of the
+    file should be of the form "key = value", leading and trailing white space is removed from both keys 
+    and values, which are returned as strings. Raises ValueError if the file is incorrectly formatted. The parsed 
+    file is cached, and is only re-read if it has been modified since it was last read. Use the copy method
+    of the returned dict to get a copy that can be modified.
+    """
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+
+    try:
+        mtime, size, site_info = _site_info_cache[filename]
+        if mtime == stat.st_mtime and size == stat.st_size:
+            return site_info
+    except KeyError:
+        pass
+
+    site_info = {}
+    with open(filename, "r") as info_file:
+        for line in info_file:  # read file line by line
+            if line.isspace():
+                continue  # ignore blank lines
+            words = line.split("=")  # split the line at the = sign
+
+            if len(words) != 2:
+                raise ValueError("Cannot read site info file " + filename +
+                                 ", too many words per line")
+
+            # store the values (minus white space) in a dictionary
+            site_info[words[0].strip()] = words[1].strip()
+
+    site_info = types.MappingProxyType(site_info)
+    _site_info_cache[filename] = (stat.st_mtime, stat.st_size, site_info)
+
+    return site_info
+
+##########################################################################
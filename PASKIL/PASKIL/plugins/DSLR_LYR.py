@@ -19,14 +19,15 @@ Plugin for loading images taken using the Nikon D80 DSLR allsky camera at KHO. T
 the PPM files produced by decoding the raw NEF files using dcraw.
 """
 
-from PASKIL import allskyImage, allskyImagePlugins
-import sys
+from PASKIL import allskyImage, allskyImagePlugins, misc
 import datetime
 import Image
 
 
 class DSLR_LYR:
 
+    magic = (b"P1", b"P2", b"P3", b"P4", b"P5", b"P6")
+
     def __init__(self):
         self.name = "Jeff and Nial's DSLR camera at KHO"
 
@@ -35,7 +36,7 @@ class DSLR_LYR:
     def test(self, image_filename, info_filename):
 
         try:
-            image = Image.open(image_filename)
+            image = allskyImagePlugins.get_image_file(image_filename).getImage()
         except:
             return False
 
@@ -46,27 +47,13 @@ class DSLR_LYR:
 
     ##########################################################################
 
-    def open(self, image_filename, info_filename):
-
-        image = Image.open(image_filename)
-
+    def __readInfo(self, image, info_filename):
+        """
+        Returns the info dictionary built from the image filename and the site info file.
+        """
         # Read site info file
-        camera = {}
+        camera = misc.readSiteInfo(info_filename)
         processing = {}
-        header = image.info
-
-        with open(info_filename, "r") as info_file:
-            for line in info_file:  # read file line by line
-                if line.isspace():
-                    continue  # ignore blank lines
-                words = line.split("=")  # split the line at the = sign
-
-                if len(words) != 2:
-                    print("Error! allskyImagePlugins.DSLR_LYR.open(): Cannot read site info file, too many words per line")
-                    sys.exit()
-
-                # store the values (minus white space) in a dictionary
-                camera[words[0].lstrip().rstrip()] = words[1].lstrip().rstrip()
 
         # Read creation time from filename
         filename = image.filename
@@ -76,10 +63,28 @@ class DSLR_LYR:
         creation_time = creation_time.strftime("%d %b %Y %H:%M:%S %Z")
         header = {'Wavelength': "Visible", 'Creation Time': creation_time}
 
-        info = {'header': header, 'camera': camera, 'processing': processing}
+        return {'header': header, 'camera': camera, 'processing': processing}
+
+    ##########################################################################
+
+    def read_header(self, image_filename, info_filename):
+        # opening the image with PIL only reads the PPM header, the image
+        # data is not decoded
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
+
+        return self.__readInfo(image, info_filename), image.mode
+
+    ##########################################################################
+
+    def open(self, image_filename, info_filename):
+
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
+
+        info = self.__readInfo(image, info_filename)
 
         # return new allskyImage object
-        return allskyImage.allskyImage(image, image.filename, info)
+        return allskyImage.allskyImage(allskyImagePlugins.deferred_image(image_filename),
+                                       image.filename, info)
 
     ##########################################################################
 ##########################################################################
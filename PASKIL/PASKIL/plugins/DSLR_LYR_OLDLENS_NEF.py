@@ -19,12 +19,14 @@ Plugin for loading images taken using the Nikon D80 DSLR allsky camera at KHO us
 diagonal fish-eye lens. This plugin is for opening the raw NEF files.
 """
 
-from PASKIL import allskyImage, allskyImagePlugins, allskyRaw
-import sys,datetime
+from PASKIL import allskyImage, allskyImagePlugins, allskyRaw, misc
+import datetime
 import Image
 
 class DSLR_LYR_OL_NEF:
 
+    extensions = (".NEF",)
+
     def __init__(self):
         self.name = ""
         
@@ -42,21 +44,8 @@ class DSLR_LYR_OL_NEF:
     def open(self,image_filename, info_filename):
         
         #Read site info file
-        camera={}
+        camera=misc.readSiteInfo(info_filename)
         processing={}
-        header={}
-        
-        with open(info_filename,"r") as info_file:
-            for line in info_file: #read file line by line
-                if line.isspace(): 
-                    continue #ignore blank lines
-                words=line.split("=") #split the line at the = sign
-                
-                if len(words) != 2:
-                    print("Error! allskyImagePlugins.DSLR_LYR.open(): Cannot read site info file, too many words per line")
-                    sys.exit()
-                    
-                camera[words[0].lstrip().rstrip()] = words[1].lstrip().rstrip() #store the values (minus white space) in a dictionary
             
         #Read creation time from filename
         filename = image_filename
@@ -17,7 +17,7 @@
 
 
 #import required modules
-from PASKIL import allskyImage, allskyImagePlugins,allskyRaw
+from PASKIL import allskyImage, allskyImagePlugins, allskyRaw, misc
 import datetime,os
 #start plugin class definition
 class NEF_Format:
@@ -25,6 +25,8 @@ class NEF_Format:
     An plugin for NEF files - this is still under construction and is only being used for testing 
     at the moment.
     """
+    extensions = (".NEF",)
+    
     def __init__(self):
         """
         This method is run when the class is instanciated and is used to set up class attributes
@@ -59,21 +61,8 @@ class NEF_Format:
         None.
         """
         #Read site info file
-        camera={}
+        camera=misc.readSiteInfo(info_filename)
         processing={}
-        header={}
-        
-        with open(info_filename,"r") as info_file:
-            for line in info_file: #read file line by line
-                if line.isspace(): 
-                    continue #ignore blank lines
-                words=line.split("=") #split the line at the = sign
-                
-                if len(words) != 2:
-                    print("Error! allskyImagePlugins.DSLR_LYR.open(): Cannot read site info file, too many words per line")
-                    sys.exit()
-                    
-                camera[words[0].lstrip().rstrip()] = words[1].lstrip().rstrip() #store the values (minus white space) in a dictionary
         
         #Read creation time from filename
         filename = os.path.basename(image_filename)
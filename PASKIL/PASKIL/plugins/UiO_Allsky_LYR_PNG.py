@@ -19,13 +19,14 @@ PASKIL plugin for opening PNG files created by the UiO allsky camera in Longyear
 """
 
 #import required modules
-from PASKIL import allskyImage, allskyImagePlugins
+from PASKIL import allskyImage, allskyImagePlugins, misc
 import Image
-import sys
 
 #start plugin class definition
 class UiO_Allsky_LYR_PNG:
 
+    magic = (b"\x89PNG\r\n\x1a\n",)
+
     def __init__(self):
         self.name = "UiO LYR allsky camera png image" #This is not used anywhere in the code yet, but is probably a good idea
     
@@ -43,7 +44,7 @@ class UiO_Allsky_LYR_PNG:
             return False
         
         try:
-            image = Image.open(image_filename)
+            image = allskyImagePlugins.get_image_file(image_filename).getImage()
         except:
             return False
         
@@ -58,34 +59,35 @@ class UiO_Allsky_LYR_PNG:
             
     ###################################################################################    
         
-    def open(self,image_filename, info_filename):
-        image = Image.open(image_filename)
-        
-        #read image header data
-        info=image.info
-
+    def __readInfo(self,image, info_filename):
+        """
+        Returns the info dictionary built from the png header of the image and the site info file.
+        """
         #Read site info file
-        camera={}
+        camera=misc.readSiteInfo(info_filename)
         processing={}
         header=image.info.copy() #copy header data stored in image
         
-        with open(info_filename,"r") as info_file:
-            for line in info_file: #read file line by line
-                if line.isspace(): 
-                    continue #ignore blank lines
-                words=line.split("=") #split the line at the = sign
-                
-                if len(words) != 2:
-                    print("Error! allskyImagePlugins.UiO_Allsky_LYR.open(): Cannot read site info file, too many words per line")
-                    sys.exit()
-                    
-                camera[words[0].lstrip().rstrip()] = words[1].lstrip().rstrip() #store the values (minus white space) in a dictionary
-        
         #create a dictionary containing all the metadata
-        info={'header':header,'camera':camera,'processing':processing}
+        return {'header':header,'camera':camera,'processing':processing}
+        
+    ###################################################################################
+    
+    def read_header(self,image_filename, info_filename):
+        #PIL only reads the png chunks preceding the image data when opening the file
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
+        
+        return self.__readInfo(image, info_filename), image.mode
+        
+    ###################################################################################    
+        
+    def open(self,image_filename, info_filename):
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
+        
+        info = self.__readInfo(image, info_filename)
     
         #return new allskyImage object
-        return allskyImage.allskyImage(image,image.filename,info)
+        return allskyImage.allskyImage(allskyImagePlugins.deferred_image(image_filename),image.filename,info)
         
     ###################################################################################
 ###################################################################################
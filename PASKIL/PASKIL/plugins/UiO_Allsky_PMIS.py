@@ -19,7 +19,8 @@ PASKIL plugin for opening PMIS files created by the UiO allsky cameras in Longye
 """
 
 from PASKIL.allskyImage import allskyImage
-from PASKIL.allskyImagePlugins import register
+from PASKIL import misc
+from PASKIL.allskyImagePlugins import register, get_image_file, deferred_image
 from . import PmisImagePlugin
 import datetime
 import Image
@@ -27,6 +28,8 @@ import Image
 
 class UiO_Allsky_PMIS:
 
+    magic = (b"PMIS",)
+
     def __init__(self):
         self.name = "UiO allsky camera PMIS image"
 
@@ -36,7 +39,7 @@ class UiO_Allsky_PMIS:
 
         # load image
         try:
-            image = Image.open(image_filename)
+            image = get_image_file(image_filename).getImage()
 
         except:
             return False
@@ -48,67 +51,70 @@ class UiO_Allsky_PMIS:
 
     ##########################################################################
 
+    def __readInfo(self, image, info_filename):
+        """
+        Returns the info dictionary built from the PMIS header of the image and the site info file.
+        """
+        # check that a site info file was specified
+        if info_filename is None:
+            raise ValueError(
+                "You must specify a site information file for this type of image")
+
+        processing = {}
+        header = image.info.copy()
+
+        # check that the wavelength in the header matches the wavelength in
+        # the file extension
+        if image.filename.endswith(("r", "s", "t", "u", "v")) and header['Wavelength'] != "630.0nm":
+            raise ValueError(
+                "Wavelength in header does not match wavelength denoted by file extension")
+
+        if image.filename.endswith(("g", "h", "i", "j", "k")) and header['Wavelength'] != "557.7nm":
+            raise ValueError(
+                "Wavelength in header does not match wavelength denoted by file extension")
+
+        if image.filename.endswith(("b", "c", "d", "e", "f")) and header['Wavelength'] != "427.8nm":
+            raise ValueError(
+                "Wavelength in header does not match wavelength denoted by file extension")
+
+        # Read site info file
+        camera = misc.readSiteInfo(info_filename)
+
+        # convert the creation time data stored in the PMIS header into the
+        # PASKIL format
+        try:
+            creation_time = datetime.datetime.strptime(
+                header['Creation Time'], "%Y-%m-%d_%H:%M:%S")
+        except:
+            # different date format for 1997
+            creation_time = datetime.datetime.strptime(
+                header['Creation Time'], "%Y-%m-%d_%H.%M.%S")
+
+        header['Creation Time'] = creation_time.strftime(
+            "%d %b %Y %H:%M:%S %Z")
+
+        return {
+            'header': header, 'camera': camera, 'processing': processing}
+
+    ##########################################################################
+
+    def read_header(self, image_filename, info_filename):
+        # opening the image only reads the PMIS header, the image data is not
+        # decoded
+        image = get_image_file(image_filename).getImage()
+
+        return self.__readInfo(image, info_filename), "I"
+
+    ##########################################################################
+
     def open(self, image_filename, info_filename):
-        image = Image.open(image_filename)
-
-        with open(info_filename, "r") as info_file:
-
-            camera = {}
-            processing = {}
-            header = image.info.copy()
-
-            # check that a site info file was specified
-            if info_file == None:
-                raise ValueError(
-                    "You must specify a site information file for this type of image")
-
-            # check that the wavelength in the header matches the wavelength in
-            # the file extension
-            if image.filename.endswith(("r", "s", "t", "u", "v")) and header['Wavelength'] != "630.0nm":
-                raise ValueError(
-                    "Wavelength in header does not match wavelength denoted by file extension")
-
-            if image.filename.endswith(("g", "h", "i", "j", "k")) and header['Wavelength'] != "557.7nm":
-                raise ValueError(
-                    "Wavelength in header does not match wavelength denoted by file extension")
-
-            if image.filename.endswith(("b", "c", "d", "e", "f")) and header['Wavelength'] != "427.8nm":
-                raise ValueError(
-                    "Wavelength in header does not match wavelength denoted by file extension")
-
-            # Read site info file
-            with open(info_filename, "r") as info_file:
-                for line in info_file:  # read file line by line
-                    if line.isspace():
-                        continue  # ignore blank lines
-                    words = line.split("=")  # split the line at the = sign
-
-                    if len(words) != 2:
-                        raise ValueError(
-                            "Error! allskyImagePlugins.UiO_Allsky_PMIS.open(): Cannot read site info file, too many words per line")
-
-                    # store the values (minus white space) in a dictionary
-                    camera[words[0].lstrip().rstrip()] = words[
-                        1].lstrip().rstrip()
-
-            # convert the creation time data stored in the PMIS header into the
-            # PASKIL format
-            try:
-                creation_time = datetime.datetime.strptime(
-                    header['Creation Time'], "%Y-%m-%d_%H:%M:%S")
-            except:
-                # different date format for 1997
-                creation_time = datetime.datetime.strptime(
-                    header['Creation Time'], "%Y-%m-%d_%H.%M.%S")
-
-            header['Creation Time'] = creation_time.strftime(
-                "%d %b %Y %H:%M:%S %Z")
-
-            info = {
-                'header': header, 'camera': camera, 'processing': processing}
-
-            # return new allskyImage object
-            return allskyImage(image.convert("I"), image.filename, info)
+        image = get_image_file(image_filename).getImage()
+
+        info = self.__readInfo(image, info_filename)
+
+        # return new allskyImage object
+        # the image data is only read (and converted to "I" mode) when needed
+        return allskyImage(deferred_image(image_filename, "I"), image.filename, info)
 
     ##########################################################################
 ##########################################################################
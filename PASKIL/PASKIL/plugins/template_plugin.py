@@ -30,6 +30,11 @@ class Example_AllskyImage_Format:
     """
     A template plugin class.
     """
+    #Optional attributes listing the bytes that files of this type start with and the extensions they can have.
+    #The test method is only called for files that match these, which avoids opening every file with every plugin
+    magic = (b"\x89PNG\r\n\x1a\n",)
+    extensions = (".png",)
+    
     def __init__(self):
         """
         This method is run when the class is instanciated and is used to set up class attributes
@@ -49,7 +54,7 @@ class Example_AllskyImage_Format:
         image types and do not overlap with other plugins.
         """
         try:
-            image = Image.open(image_filename)
+            image = allskyImagePlugins.get_image_file(image_filename).getImage()
         except:
             return False
         
@@ -66,6 +71,22 @@ class Example_AllskyImage_Format:
             
     ###################################################################################    
         
+    def read_header(self, image_filename, info_filename):
+        """
+        This method is optional. If it is present, it should return a tuple (info, mode) of the metadata 
+        dictionary for the image (in the same format as would be passed to the allskyImage constructor by 
+        the open method) and the mode of the image that open would return. It should do this without 
+        decoding the image data, which allows large numbers of images to be indexed quickly (for example 
+        when creating a dataset). If your plugin does not define this method then the image will be opened
+        using the open method instead whenever only its metadata is needed.
+        """
+        #PIL only reads the image header when the file is opened, the image data is not decoded until it is used
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
+        
+        return image.info, image.mode
+        
+    ###################################################################################    
+        
     def open(self, image_filename, info_filename):
         """
         This method should return an instance of the allskyImage.allskyImage class. The method needs to 
@@ -73,12 +94,13 @@ class Example_AllskyImage_Format:
         data should be stored in dictionaries in the format specified in the allskyImagePlugins documentation.
         The info_filename argument can be either the filename of the site information file or None.
         """
-        image = Image.open(image_filename)
+        image = allskyImagePlugins.get_image_file(image_filename).getImage()
         #read image header data, here we assume that the image header already contains all the metadata in the correct format
         info = image.info
     
-        #return new allskyImage object
-        return allskyImage.allskyImage(image, image.filename, info)
+        #return new allskyImage object. Passing a deferred image rather than the PIL image itself means that the
+        #image data is only read from the file if it is needed
+        return allskyImage.allskyImage(allskyImagePlugins.deferred_image(image_filename), image.filename, info)
         
     ###################################################################################
 ###################################################################################
@@ -0,0 +1,63 @@
+"""
+Helper functions for creating synthetic all-sky images for the PASKIL tests.
+"""
+
+import datetime
+import os
+
+import numpy
+from PIL import Image
+
+from PASKIL import allskyImage
+
+START_TIME = datetime.datetime(2003, 2, 4, 18, 30)
+
+
+def makeImage(mode="L", size=(64, 48), seed=0, time=START_TIME,
+              cam_rot="10", wavelength="630"):
+    """
+    Returns an allskyImage of random noise with the specified mode and size,
+    with the camera centre offset from the centre of the image.
+    """
+    rng = numpy.random.RandomState(seed)
+
+    if mode == "RGB":
+        array = rng.randint(0, 255, (size[1], size[0], 3)).astype('uint8')
+    elif mode == "I":
+        array = rng.randint(0, 65535, (size[1], size[0])).astype('int32')
+    else:
+        array = rng.randint(0, 255, (size[1], size[0])).astype('uint8')
+
+    info = {'header': {'Creation Time': time.strftime("%d %b %Y %H:%M:%S GMT"),
+                       'Wavelength': wavelength},
+            'camera': {'Magn. Bearing': '-33', 'cam_rot': cam_rot,
+                       'x_center': size[0] // 2 + 1,
+                       'y_center': size[1] // 2 - 1, 'Radius': 22,
+                       'fov_angle': 80, 'lens_projection': 'equidistant',
+                       'lat': '78', 'lon': '16'},
+            'processing': {}, 'exif': {}}
+
+    return allskyImage.allskyImage(Image.fromarray(array), "synthetic", info)
+
+
+def saveImages(directory, times, mode="L", size=(64, 48), seed=0):
+    """
+    Saves a synthetic image (with different noise) into directory as a png
+    for each of the datetime objects in times. Returns a list of the
+    filenames.
+    """
+    filenames = []
+    for i, time in enumerate(times):
+        filename = os.path.join(directory, "image%03d.png" % i)
+        makeImage(mode, size, seed + i, time).save(filename)
+        filenames.append(filename)
+
+    return filenames
+
+
+def regularTimes(num_images, spacing=60, start_time=START_TIME):
+    """
+    Returns a list of num_images datetime objects, spacing seconds apart.
+    """
+    return [start_time + datetime.timedelta(seconds=spacing * i)
+            for i in range(num_images)]
@@ -0,0 +1,48 @@
+"""
+Tests for the colour table classes.
+"""
+
+import pickle
+import unittest
+
+import numpy
+
+from PASKIL import allskyColour
+
+
+class lookupTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.colour_table = allskyColour.basicColourTable(
+            [(i, 255 - i, i // 2) for i in range(256)])
+
+    def testCached(self):
+        lookup_table = self.colour_table.getLookupTable()
+
+        self.assertEqual(lookup_table.shape, (256, 3))
+        self.assertEqual(lookup_table.dtype, numpy.uint8)
+        self.assertFalse(lookup_table.flags.writeable)
+        self.assertEqual([tuple(x) for x in lookup_table.tolist()],
+                         self.colour_table.colour_table)
+
+        # the table is not compared entry by entry on each call
+        self.assertIs(self.colour_table.getLookupTable(), lookup_table)
+
+    def testNewColourTable(self):
+        lookup_table = self.colour_table.getLookupTable()
+
+        self.colour_table.colour_table = [(0, 0, 0), (255, 255, 255)]
+        new_lookup_table = self.colour_table.getLookupTable()
+        self.assertIsNot(new_lookup_table, lookup_table)
+        self.assertEqual(new_lookup_table.tolist(), [[0, 0, 0], [255, 255, 255]])
+
+    def testPickle(self):
+        lookup_table = self.colour_table.getLookupTable()
+
+        copied = pickle.loads(pickle.dumps(self.colour_table))
+        self.assertEqual(copied, self.colour_table)
+        self.assertTrue(numpy.array_equal(copied.getLookupTable(), lookup_table))
+
+
+if __name__ == "__main__":
+    unittest.main()
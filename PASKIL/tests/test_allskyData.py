@@ -0,0 +1,178 @@
+"""
+Tests for creating, saving and loading datasets, and for the image cache.
+"""
+
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+from PIL import Image
+
+from PASKIL import allskyData
+
+import synthetic
+
+
+class fromListTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        # the names of the files are not in the same order as their times
+        times = synthetic.regularTimes(12)
+        random.Random(0).shuffle(times)
+        self.filenames = synthetic.saveImages(self.directory, times)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def patchPool(self):
+        # keep hold of the pools that are created, so that they are not
+        # cleaned up by the garbage collector instead
+        self.pools = []
+        make_pool = multiprocessing.Pool
+
+        def makePool(*args, **kwargs):
+            self.pools.append(make_pool(*args, **kwargs))
+            return self.pools[-1]
+
+        return mock.patch("multiprocessing.Pool", side_effect=makePool)
+
+    def testWorkersMatchSerial(self):
+        # use several chunks, so that one is read whilst the next is found
+        with mock.patch.object(allskyData, "CLASSIFY_CHUNK_SIZE", 5):
+            serial = allskyData.fromList(self.filenames, "630", ["png"])
+            with self.patchPool():
+                pooled = allskyData.fromList(self.filenames, "630", ["png"],
+                                             workers=2)
+
+        self.assertEqual(len(self.pools), 1)
+
+        self.assertEqual(pooled.getFilenames(), serial.getFilenames())
+        self.assertEqual(pooled.getTimes(), serial.getTimes())
+        self.assertEqual(pooled.getTimes(), sorted(pooled.getTimes()))
+        self.assertEqual(pooled.getMode(), serial.getMode())
+        self.assertEqual(pooled.getColourTable(), serial.getColourTable())
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def testStoppingEarlyKillsWorkers(self):
+        with mock.patch.object(allskyData, "CLASSIFY_CHUNK_SIZE", 5), \
+                self.patchPool():
+            records = allskyData._iterRecords(self.filenames, None, None, 2)
+            filename, record = next(records)
+            self.assertEqual(filename, self.filenames[0])
+            records.close()
+
+        self.assertEqual(len(self.pools), 1)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+class datasetFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        synthetic.saveImages(self.directory, synthetic.regularTimes(5))
+        self.data = allskyData.new(self.directory, "630", ["png"])
+        self.filename = os.path.join(self.directory, "dataset")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertDatasetsEqual(self, data1, data2):
+        self.assertEqual(data1.getFilenames(), data2.getFilenames())
+        self.assertEqual(data1.getTimes(), data2.getTimes())
+        self.assertEqual(data1.getSite_info_files(), data2.getSite_info_files())
+        self.assertEqual(data1.getMode(), data2.getMode())
+        self.assertEqual(data1.getColourTable(), data2.getColourTable())
+        self.assertEqual(data1.getRadii(), data2.getRadii())
+        self.assertEqual(data1.getFov_angles(), data2.getFov_angles())
+
+    def testPickleIsDefault(self):
+        # older versions of PASKIL load dataset files by unpickling them
+        self.data.save(self.filename)
+        with open(self.filename, "rb") as f:
+            self.assertDatasetsEqual(pickle.load(f), self.data)
+
+        self.assertDatasetsEqual(allskyData.load(self.filename), self.data)
+
+    def testNpz(self):
+        self.data.save(self.filename, format="npz")
+        with open(self.filename, "rb") as f:
+            self.assertEqual(f.read(4), b"PK\x03\x04")
+
+        self.assertDatasetsEqual(allskyData.load(self.filename), self.data)
+
+    def testUnknownFormat(self):
+        self.assertRaises(ValueError, self.data.save, self.filename, "csv")
+
+
+class imageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = synthetic.saveImages(self.directory,
+                                             synthetic.regularTimes(1))[0]
+        self.cache = allskyData.imageCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertCounts(self, hits, misses):
+        self.assertEqual((self.cache.getHits(), self.cache.getMisses()),
+                         (hits, misses))
+
+    def testHitsAndMisses(self):
+        first = self.cache.get(self.filename, None)
+        self.assertCounts(0, 1)
+
+        # a hit must not copy the image data
+        with mock.patch.object(Image.Image, "copy",
+                               side_effect=AssertionError("image copied")):
+            second = self.cache.get(self.filename, None)
+        self.assertCounts(1, 1)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.cache), 1)
+        self.assertTrue(numpy.array_equal(first.getArray(), second.getArray()))
+        self.assertEqual(first.getInfo(), second.getInfo())
+
+        # changing the info of a returned image doesn't change the cache
+        second.setInfo('header', 'Wavelength', "557.7")
+        self.assertEqual(self.cache.get(self.filename, None).getInfo(),
+                         first.getInfo())
+        self.assertCounts(2, 1)
+
+    def testModifiedTime(self):
+        self.cache.get(self.filename, None)
+        mtime = os.stat(self.filename).st_mtime
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+
+        self.cache.get(self.filename, None)
+        self.assertCounts(0, 2)
+        self.cache.get(self.filename, None)
+        self.assertCounts(1, 2)
+
+    def testModifiedSize(self):
+        self.cache.get(self.filename, None)
+        stat = os.stat(self.filename)
+
+        # rewrite the file with different data, but the same mtime
+        image = synthetic.makeImage(size=(80, 60), seed=5)
+        image.save(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime))
+        self.assertNotEqual(os.stat(self.filename).st_size, stat.st_size)
+
+        self.assertEqual(self.cache.get(self.filename, None).getSize(),
+                         (80, 60))
+        self.assertCounts(0, 2)
+        self.assertEqual(len(self.cache), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Tests for the allskyImage class.
+"""
+
+import copy
+import functools
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from PIL import Image
+
+from PASKIL import allskyImage
+
+import synthetic
+
+# filenames passed to loadImage, so that the tests can see when deferred
+# images are read
+loaded_files = []
+
+
+def loadImage(filename):
+    loaded_files.append(filename)
+    return Image.open(filename)
+
+
+class deferredImageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.image = synthetic.makeImage()
+        self.filename = os.path.join(self.directory, "image.png")
+        self.image.getImage().save(self.filename)
+        del loaded_files[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeDeferred(self):
+        deferred = allskyImage.deferredImage(
+            functools.partial(loadImage, self.filename), "L", (64, 48))
+        return allskyImage.allskyImage(deferred, self.filename,
+                                       self.image.getInfo())
+
+    def testInfoDoesNotLoad(self):
+        image = self.makeDeferred()
+
+        self.assertEqual(image.getInfo(), self.image.getInfo())
+        self.assertEqual(image.getSize(), (64, 48))
+        self.assertEqual(image.getMode(), "L")
+        self.assertFalse(image.isLoaded())
+        self.assertEqual(loaded_files, [])
+
+        self.assertTrue(numpy.array_equal(image.getArray(),
+                                          self.image.getArray()))
+        self.assertTrue(image.isLoaded())
+        self.assertEqual(loaded_files, [self.filename])
+
+    def testPickle(self):
+        image = self.makeDeferred()
+
+        for copied in [pickle.loads(pickle.dumps(image)), copy.deepcopy(image)]:
+            self.assertFalse(copied.isLoaded())
+            self.assertEqual(copied.getInfo(), self.image.getInfo())
+            self.assertEqual(loaded_files, [])
+
+            self.assertTrue(numpy.array_equal(copied.getArray(),
+                                              self.image.getArray()))
+            self.assertEqual(loaded_files, [self.filename])
+            del loaded_files[:]
+
+        # the original is still deferred
+        self.assertFalse(image.isLoaded())
+
+
+class preprocessTestCase(unittest.TestCase):
+
+    def assertImagesEqual(self, image1, image2):
+        self.assertEqual(image1.getImage().mode, image2.getImage().mode)
+        self.assertEqual(image1.getSize(), image2.getSize())
+        self.assertTrue(numpy.array_equal(image1.getArray(), image2.getArray()))
+        self.assertEqual(image1.getInfo(), image2.getInfo())
+
+    def testMatchesChainedCalls(self):
+        # the camera centre is off the centre of the synthetic images, and
+        # both cam_rot and the magnetic bearing are nonzero
+        for mode, size, cam_rot, aligned, orientation, north in itertools.product(
+                ["L", "I", "RGB"], [(64, 48), (81, 81)], ["10", "-176", "33.3"],
+                [None, "(NWSE)"], ["NESW", "NWSE"], ["geographic", "geomagnetic"]):
+            with self.subTest(mode=mode, size=size, cam_rot=cam_rot,
+                              aligned=aligned, orientation=orientation,
+                              north=north):
+                image = synthetic.makeImage(mode, size, cam_rot=cam_rot)
+                if aligned is not None:
+                    image.setInfo('processing', 'alignNorth', aligned)
+
+                chained = image.binaryMask(70).centerImage().alignNorth(
+                    north, orientation)
+                self.assertImagesEqual(image.preprocess(70, north, orientation),
+                                       chained)
+
+    def testDefaultFovAngle(self):
+        image = synthetic.makeImage("RGB", cam_rot="-176")
+        self.assertImagesEqual(image.preprocess(),
+                               image.binaryMask(80).centerImage().alignNorth())
+
+
+def rotatedStrip(image, angle, strip_width):
+    """
+    Returns the strip that getStrip used to return, by rotating the whole
+    image with PIL and then cutting the strip out of the middle of it.
+    """
+    info = image.getInfo()
+    rotation = angle - float(info['camera']['cam_rot'])
+    if info['processing']['alignNorth'].count('NWSE') != 0:
+        rotation = -rotation
+
+    im_arr = numpy.asarray(image.getImage().rotate(rotation))
+    if len(im_arr.shape) == 2:
+        im_arr = im_arr.reshape((im_arr.shape[0], im_arr.shape[1], 1))
+
+    radius = int(info['camera']['Radius'])
+    centre = int((float(im_arr.shape[1]) / 2.0) + 0.5) - 1
+    lower_x = centre - int(strip_width / 2)
+    upper_x = centre + int(strip_width / 2.0 + 0.5)
+
+    strip = numpy.zeros((2 * radius, upper_x - lower_x, im_arr.shape[2]),
+                        im_arr.dtype)
+    lower_y = int(((2 * radius) - im_arr.shape[0]) / 2)
+    strip[lower_y:lower_y + im_arr.shape[0], :, :] = im_arr[:, lower_x:upper_x, :]
+    return strip.swapaxes(0, 1)
+
+
+class getStripTestCase(unittest.TestCase):
+
+    angles = [-176, 0, 10, 33.3, 45, 90, 123.25, 180, 271.5]
+
+    def alignedImages(self):
+        for mode, size, orientation in itertools.product(
+                ["L", "I", "RGB"], [(64, 48), (81, 81)], ["NESW", "NWSE"]):
+            image = synthetic.makeImage(mode, size, cam_rot="33.3")
+            yield (mode, size, orientation), image.preprocess(
+                orientation=orientation)
+
+    def testMatchesRotatedImage(self):
+        for params, image in self.alignedImages():
+            for angle, strip_width in itertools.product(self.angles, [1, 2, 5]):
+                with self.subTest(params=params, angle=angle,
+                                  strip_width=strip_width):
+                    strip = image.getStrip(angle, strip_width)
+                    expected = rotatedStrip(image, angle, strip_width)
+
+                    self.assertEqual(strip.dtype, expected.dtype)
+                    self.assertTrue(numpy.array_equal(strip, expected))
+
+    def testGetStrips(self):
+        for params, image in self.alignedImages():
+            with self.subTest(params=params):
+                strips = image.getStrips(self.angles, 3)
+
+                self.assertEqual(len(strips), len(self.angles))
+                for angle, strip in zip(self.angles, strips):
+                    self.assertTrue(numpy.array_equal(
+                        strip, rotatedStrip(image, angle, 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
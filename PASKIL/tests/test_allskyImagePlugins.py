@@ -0,0 +1,104 @@
+"""
+Tests for finding the plugin used to open an image, and for reading image headers.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from PIL import Image
+
+from PASKIL import allskyImagePlugins
+
+import synthetic
+
+
+class anyPNGPlugin:
+    """
+    External plugin which accepts any png file, including PASKIL ones.
+    """
+
+    magic = (b"\x89PNG\r\n\x1a\n",)
+
+    def __init__(self):
+        self.name = "Test plugin"
+
+    def test(self, image_filename, info_filename):
+        return True
+
+
+class pluginCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.raw_files = []
+        for i in range(2):
+            filename = os.path.join(self.directory, "raw%d.png" % i)
+            Image.fromarray(numpy.zeros((4, 4), dtype='uint8')).save(filename)
+            self.raw_files.append(filename)
+
+        self.paskil_file = os.path.join(self.directory, "paskil.png")
+        synthetic.makeImage().save(self.paskil_file)
+
+        self.plugin = anyPNGPlugin()
+        allskyImagePlugins.register(self.plugin)
+
+    def tearDown(self):
+        allskyImagePlugins.types.remove(self.plugin)
+        self.clearCache()
+        shutil.rmtree(self.directory)
+
+    def clearCache(self):
+        getattr(allskyImagePlugins, "__plugin_cache").clear()
+
+    def testCachedLookupMatchesUncached(self):
+        uncached = allskyImagePlugins.load(self.paskil_file, None, False)
+        self.assertIs(type(uncached), allskyImagePlugins.PASKIL_Allsky_Image_PNG)
+
+        # the external plugin opens the raw file, so it is cached for the
+        # directory, but must not take over the PASKIL file
+        self.clearCache()
+        self.assertIs(allskyImagePlugins.load(self.raw_files[0], None, False),
+                      self.plugin)
+        self.assertIs(allskyImagePlugins.load(self.paskil_file, None, False),
+                      uncached)
+        self.assertIs(allskyImagePlugins.load(self.raw_files[1], None, False),
+                      self.plugin)
+
+    def testForce(self):
+        # with force set the internal plugins are never used
+        self.assertIs(allskyImagePlugins.load(self.paskil_file, None, True),
+                      self.plugin)
+        self.assertIs(allskyImagePlugins.load(self.raw_files[0], None, True),
+                      self.plugin)
+
+
+class fitsDataTypeTestCase(unittest.TestCase):
+
+    def testUnscaled(self):
+        for bitpix, dtype in [(8, "u1"), (16, ">i2"), (32, ">i4"), (-32, ">f4"),
+                              (-64, ">f8")]:
+            self.assertEqual(allskyImagePlugins._fitsDataType({'BITPIX': bitpix}),
+                             numpy.dtype(dtype))
+
+        self.assertEqual(allskyImagePlugins._fitsDataType(
+            {'BITPIX': 16, 'BZERO': 0, 'BSCALE': 1}), numpy.dtype(">i2"))
+
+    def testScaled(self):
+        # pyfits converts scaled data (e.g. unsigned 16 bit data, which is
+        # stored with BZERO=32768) to floating point
+        self.assertEqual(allskyImagePlugins._fitsDataType(
+            {'BITPIX': 16, 'BZERO': 32768, 'BSCALE': 1}), numpy.dtype("float32"))
+        self.assertEqual(allskyImagePlugins._fitsDataType(
+            {'BITPIX': 8, 'BSCALE': 2.0}), numpy.dtype("float32"))
+        self.assertEqual(allskyImagePlugins._fitsDataType(
+            {'BITPIX': 32, 'BZERO': 10}), numpy.dtype("float64"))
+        self.assertEqual(allskyImagePlugins._fitsDataType(
+            {'BITPIX': 16, 'BLANK': -1}), numpy.dtype("float32"))
+
+
+if __name__ == "__main__":
+    unittest.main()
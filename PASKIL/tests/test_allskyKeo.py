@@ -0,0 +1,229 @@
+"""
+Tests for creating keograms in several processes or threads, which must give
+the same result as creating them in one.
+"""
+
+import datetime
+from multiprocessing import shared_memory
+from multiprocessing.pool import ThreadPool
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+
+from PASKIL import allskyData, allskyImage, allskyKeo
+
+import synthetic
+
+
+class reverseExecutor:
+    """
+    Executor which runs the function on each of the items in this process,
+    starting with the last one, so that any strips that overlap between chunks
+    end up with the values from the earlier chunk.
+    """
+
+    def __init__(self):
+        self.num_calls = 0
+
+    def map(self, function, iterable):
+        items = list(iterable)
+        self.num_calls += len(items)
+        return [function(item) for item in reversed(items)][::-1]
+
+
+def pairedTimes(num_pairs):
+    """
+    Returns the times of pairs of images 3 seconds apart, with the pairs a
+    minute apart, so that the strips of each pair overlap in the keogram.
+    """
+    times = []
+    for time in synthetic.regularTimes(num_pairs):
+        times += [time, time + datetime.timedelta(seconds=3)]
+    return times
+
+
+class datasetKeogramTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertKeogramsEqual(self, keo1, keo2):
+        self.assertTrue(numpy.array_equal(keo1.getData(), keo2.getData()))
+        self.assertEqual(keo1.getDataPoints(), keo2.getDataPoints())
+
+    def makeKeogram(self, data, num_cpus, **kwargs):
+        with mock.patch("multiprocessing.cpu_count", return_value=num_cpus):
+            return allskyKeo.new(data, 33, data_spacing=60, **kwargs)
+
+    def testWorkersMatchSingleProcess(self):
+        # 13 images per chunk, so the naive split would separate a pair
+        synthetic.saveImages(self.directory, pairedTimes(20))
+        data = allskyData.new(self.directory, "630", ["png"])
+
+        for keo_type in ["CopyPaste", "Average"]:
+            with self.subTest(keo_type=keo_type):
+                serial = self.makeKeogram(data, 1, keo_type=keo_type)
+                pooled = self.makeKeogram(data, 3, keo_type=keo_type)
+                self.assertKeogramsEqual(serial, pooled)
+
+                executor = reverseExecutor()
+                reversed_keo = self.makeKeogram(data, 3, keo_type=keo_type,
+                                                executor=executor)
+                self.assertEqual(executor.num_calls, 3)
+                self.assertKeogramsEqual(serial, reversed_keo)
+
+    def testRGBWorkersMatchSingleProcess(self):
+        synthetic.saveImages(self.directory, pairedTimes(8), mode="RGB")
+        data = allskyData.new(self.directory, "630", ["png"])
+
+        self.assertKeogramsEqual(self.makeKeogram(data, 1),
+                                 self.makeKeogram(data, 4))
+
+    def testSingleImage(self):
+        # the keogram data must be copied out of the shared memory, since
+        # there is no interpolation to do that for a single image
+        filenames = synthetic.saveImages(self.directory,
+                                         synthetic.regularTimes(1))
+        data = allskyData.new(self.directory, "630", ["png"])
+        keo = self.makeKeogram(data, 1)
+
+        list_keo = allskyKeo.new([allskyImage.new(filenames[0])], 33,
+                                 data_spacing=60)
+
+        self.assertTrue(keo.getData().any())
+        self.assertKeogramsEqual(keo, list_keo)
+
+
+class stubExecutor(reverseExecutor):
+    """
+    Executor which records whether anything tries to shut it down.
+    """
+
+    def __init__(self):
+        reverseExecutor.__init__(self)
+        self.shut_down = False
+
+    def close(self):
+        self.shut_down = True
+
+    terminate = join = shutdown = close
+
+
+class executorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        synthetic.saveImages(self.directory, synthetic.regularTimes(8))
+        self.data = allskyData.new(self.directory, "630", ["png"])
+
+    def tearDown(self):
+        allskyKeo.setDefaultExecutor(None)
+        shutil.rmtree(self.directory)
+
+    def makeKeogram(self, **kwargs):
+        with mock.patch("multiprocessing.cpu_count", return_value=2):
+            return allskyKeo.new(self.data, 33, **kwargs)
+
+    def testExecutorIsUsedAndLeftRunning(self):
+        executor = stubExecutor()
+        with mock.patch("multiprocessing.Pool",
+                        side_effect=AssertionError("pool created")):
+            self.makeKeogram(executor=executor)
+
+        self.assertEqual(executor.num_calls, 2)
+        self.assertFalse(executor.shut_down)
+
+    def testDefaultExecutor(self):
+        executor = stubExecutor()
+        allskyKeo.setDefaultExecutor(executor)
+        self.assertIs(allskyKeo.getDefaultExecutor(), executor)
+
+        with mock.patch("multiprocessing.Pool",
+                        side_effect=AssertionError("pool created")):
+            self.makeKeogram()
+
+        self.assertEqual(executor.num_calls, 2)
+        self.assertFalse(executor.shut_down)
+
+    def testPoolCreationError(self):
+        # the error from creating the pool must not be hidden
+        with mock.patch("multiprocessing.Pool", side_effect=OSError("no pool")):
+            self.assertRaises(OSError, self.makeKeogram)
+
+
+class listKeogramTestCase(unittest.TestCase):
+
+    def setUp(self):
+        times = pairedTimes(15)
+        self.images = [synthetic.makeImage(seed=i, time=time)
+                       for i, time in enumerate(times)]
+
+        # the data points are returned in the order of the images, not the
+        # order of their times
+        random.Random(0).shuffle(self.images)
+
+    def makeKeogram(self, num_cpus, **kwargs):
+        with mock.patch("multiprocessing.cpu_count", return_value=num_cpus):
+            # new() removes any images outside of the time range from the list
+            return allskyKeo.new(list(self.images), 33, data_spacing=60,
+                                 **kwargs)
+
+    def testThreadsMatchSerial(self):
+        for keo_type in ["CopyPaste", "Average"]:
+            with self.subTest(keo_type=keo_type):
+                serial = self.makeKeogram(1, keo_type=keo_type)
+
+                with mock.patch.object(allskyKeo, "ThreadPool",
+                                       wraps=ThreadPool) as thread_pool:
+                    threaded = self.makeKeogram(4, keo_type=keo_type)
+                thread_pool.assert_called_once_with(4)
+
+                self.assertTrue(numpy.array_equal(serial.getData(),
+                                                  threaded.getData()))
+                self.assertEqual(serial.getDataPoints(),
+                                 threaded.getDataPoints())
+
+    def capturedDataPoints(self, num_cpus):
+        # the keogram sorts its data points, so capture the ones passed to it
+        with mock.patch.object(allskyKeo, "keogram",
+                               wraps=allskyKeo.keogram) as keogram:
+            self.makeKeogram(num_cpus)
+        return keogram.call_args[0][8]
+
+    def testDataPointsInImageOrder(self):
+        times = [datetime.datetime.strptime(
+            image.getInfo()['header']['Creation Time'], "%d %b %Y %H:%M:%S %Z")
+            for image in self.images]
+        data_points = self.capturedDataPoints(4)
+
+        self.assertEqual(data_points, self.capturedDataPoints(1))
+        self.assertEqual(len(data_points), len(self.images))
+        for i in range(len(times)):
+            for j in range(len(times)):
+                if times[i] < times[j]:
+                    self.assertLessEqual(data_points[i], data_points[j])
+
+
+class sharedMemoryTestCase(unittest.TestCase):
+
+    def testUnlinkAlreadyUnlinked(self):
+        # a worker with its own resource tracker may have unlinked the block
+        # already when it exited
+        shared_block = shared_memory.SharedMemory(create=True, size=16)
+        other = shared_memory.SharedMemory(name=shared_block.name)
+        other.unlink()
+        other.close()
+
+        allskyKeo._unlink_shared_memory(shared_block)
+        shared_block.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Tests for the directory searching functions in the PASKIL misc module.
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from PASKIL import misc
+
+
+class iterFilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeFile(self, *path):
+        filename = os.path.join(self.directory, *path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        open(filename, "w").close()
+        return filename
+
+    def testNonDateNumericParentDirectory(self):
+        # a wavelength directory above a YYYY/MM/DD structure must not be
+        # mistaken for a year and pruned
+        inside = self.makeFile("5577", "2020", "01", "01", "image.png")
+        outside = self.makeFile("5577", "2020", "02", "01", "image.png")
+
+        found = list(misc.iterFiles(self.directory, ["png"],
+                                    start_time=datetime.datetime(2020, 1, 1),
+                                    end_time=datetime.datetime(2020, 1, 2)))
+
+        self.assertEqual(found, [inside])
+        self.assertNotIn(outside, found)
+
+    def testYearDirectoriesArePruned(self):
+        inside = self.makeFile("2020", "image.png")
+        self.makeFile("2019", "image.png")
+
+        found = list(misc.iterFiles(self.directory, ["png"],
+                                    start_time=datetime.datetime(2020, 6, 1)))
+
+        self.assertEqual(found, [inside])
+
+    def testDateRange(self):
+        self.assertIsNone(misc._dateRange("5577", None))
+        self.assertIsNone(misc._dateRange("55770101", None))
+        self.assertEqual(misc._dateRange("2020", None),
+                         (datetime.datetime(2020, 1, 1),
+                          datetime.datetime(2021, 1, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()